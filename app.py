@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timezone
 import hashlib 
 import sqlite3 
 
 # Importar nuestro módulo de base de datos
 import database as db 
+import asignacion
+import instrumentation
+import sla
 
 # --- Configuración de la página ---
 st.set_page_config(
@@ -31,13 +34,173 @@ def display_message(message, type="info"):
         st.info(message)
 
 # --- Inicializar la Base de Datos ---
-db.initialize_database() 
+@st.cache_resource
+def init_database():
+    """Aplica las migraciones pendientes una sola vez por proceso, no en cada rerun."""
+    return db.initialize_database()
+
+if not init_database():
+    st.error("No se pudo inicializar la base de datos. Revisa la consola para más detalles.")
+
+# --- Capa de datos cacheada ---
+# Los DataFrames y catálogos se comparten entre sesiones (st.cache_data) y su clave incluye la versión
+# de las tablas de las que dependen (db.get_data_versions(), que sube con cada escritura). Mientras nadie
+# escriba, cada rerun cuesta una sola consulta; una escritura desde cualquier proceso cambia la
+# versión y la siguiente lectura vuelve a la base de datos.
+data_versions = db.get_data_versions()
+
+def table_versions(*tables):
+    return tuple(data_versions.get(table, 0) for table in tables)
+
+def rows_to_dataframe(rows):
+    """Convierte filas sqlite3.Row en un DataFrame con los nombres de columna."""
+    return pd.DataFrame([tuple(row) for row in rows], columns=rows[0].keys() if rows else None)
+
+# Columnas que muestran los listados de técnicos y clientes (más el id para las acciones)
+TABLE_COLUMNS = {
+    'tecnicos': ('id_tecnico', 'nombre', 'apellido', 'email', 'login', 'especialidad', 'activo', 'fecha_ingreso'),
+    'clientes': ('id_cliente', 'nombre_empresa', 'contacto_principal', 'email', 'telefono', 'ciudad', 'pais', 'activo'),
+}
+
+# Las fechas llegan como datetime64: se formatean al mostrarlas, sin convertirlas a texto
+DATETIME_COLUMN = st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm")
+DATE_COLUMN = st.column_config.DateColumn(format="YYYY-MM-DD")
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def load_tickets_page(versions, after=None, limit=db.TICKETS_PAGE_SIZE, filters=None, include_archive=False):
+    return db.get_tickets_frame(after=after, limit=limit, filters=filters, include_archive=include_archive)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_search_results(versions, query, filters=None):
+    return [dict(row) for row in db.search_tickets(query, filters=filters)]
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_table(versions, table):
+    return db.get_table_frame(table, TABLE_COLUMNS[table])
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_catalog(versions, name, table):
+    # Solo se llega aquí si cambió la versión: se descarta también la copia de database.py
+    db.invalidate_catalog(table)
+    return getattr(db, f"get_{name}_catalog")()
+
+def catalog(name, table=None):
+    """Catálogo {id: nombre} de db.get_<name>_catalog(); `table` si la tabla no se llama igual."""
+    table = table or name
+    return load_catalog(table_versions(table), name, table)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_lookup(versions, name, table, none_option=False):
+    # Una vez por versión del catálogo: los selectores no recorren listas para buscar la posición
+    labels = load_catalog(versions, name, table)
+    options = ([None] if none_option else []) + list(labels)
+    return {'options': options, 'labels': labels, 'positions': {key: i for i, key in enumerate(options)}}
+
+def lookup(name, table=None, none_option=False):
+    """Índice de un catálogo para un selector: {'options': [...], 'labels': {id: nombre}, 'positions': {id: i}}."""
+    table = table or name
+    return load_lookup(table_versions(table), name, table, none_option)
+
+# Tablas de las que dependen los resultados de cada selector con búsqueda
+PICKER_TABLES = {
+    'tecnicos': ('tecnicos',),
+    'clientes': ('clientes',),
+    'tickets': ('tickets', 'registros_actividad'), # La búsqueda incluye los registros de actividad
+}
+PICKER_PLACEHOLDERS = {
+    'tecnicos': "Nombre, login o email",
+    'clientes': "Empresa, contacto o email",
+    'tickets': "Número (p. ej. TK-001) o texto del ticket",
+}
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_picker_options(versions, kind, text):
+    return dict(db.search_entities(kind, text))
+
+def entity_picker(kind, label, key, default_options=None):
+    """Selector con búsqueda: lo escrito se busca en la base de datos y solo se cargan las coincidencias.
+
+    Sin texto se ofrecen `default_options` ({id: etiqueta}) o las primeras filas de db.search_entities.
+    Devuelve el id elegido o None.
+    """
+    texto = st.text_input(f"Buscar ({PICKER_PLACEHOLDERS[kind].lower()})", key=f"{key}_busqueda",
+                          placeholder=PICKER_PLACEHOLDERS[kind]).strip()
+    if texto or default_options is None:
+        options = load_picker_options(table_versions(*PICKER_TABLES[kind]), kind, texto)
+    else:
+        options = default_options
+    if not options:
+        st.info("No hay coincidencias.")
+        return None
+    if texto and len(options) >= db.PICKER_LIMIT:
+        st.caption(f"Se muestran las {db.PICKER_LIMIT} primeras coincidencias; escribe más para acotar.")
+    return st.selectbox(label, options=list(options), format_func=lambda x: options.get(x, f"ID {x}"), key=key)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_activity_page(versions, kind, key, after=None, include_archive=False):
+    loader = db.get_registros_ticket_page if kind == 'ticket' else db.get_registros_tecnico_page
+    rows, next_cursor = loader(key, after=after, include_archive=include_archive)
+    return rows_to_dataframe(rows), next_cursor
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_ticket_totales(versions, id_ticket):
+    return db.get_ticket_totales(id_ticket)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_summary(versions, kind):
+    loader = db.get_resumen_tecnicos if kind == 'tecnicos' else db.get_resumen_clientes
+    return rows_to_dataframe(loader())
+
+@st.cache_data(show_spinner="Calculando métricas de SLA...", max_entries=8)
+def load_sla_metrics(versions, hora):
+    # `hora` entra en la clave: los tickets abiertos pasan a estar vencidos aunque nadie escriba
+    return sla.compute_sla_metrics()
+
+ACTIVITY_TABLES = ('registros_actividad', 'tickets', 'tecnicos', 'modalidades_trabajo')
+
+def show_ticket_totales(id_ticket):
+    """Métricas de horas dedicadas frente a estimadas (leídas de totales_ticket, sin agregar)."""
+    totales = load_ticket_totales(table_versions('registros_actividad', 'tickets'), id_ticket)
+    if not totales:
+        return
+    col1, col2, col3, col4 = st.columns(4)
+    estimado = totales['tiempo_estimado_horas']
+    col1.metric("Horas dedicadas", f"{totales['horas_dedicadas']:.2f}")
+    col2.metric("Horas estimadas", f"{estimado:.2f}" if estimado is not None else "—")
+    col3.metric("Horas restantes", f"{totales['horas_restantes']:.2f}" if totales['horas_restantes'] is not None else "—")
+    col4.metric("Registros", totales['num_registros'], help=f"Última actividad: {totales['ultima_actividad'] or '—'}")
+    if estimado:
+        st.progress(min(totales['horas_dedicadas'] / estimado, 1.0))
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_ticket_timeline(versions, id_ticket):
+    # historial_cambios solo crece con un UPDATE de tickets: basta la versión de tickets
+    return db.get_ticket_timeline(id_ticket)
+
+def show_ticket_timeline(id_ticket, catalogos):
+    """Cambios del ticket (historial_cambios), con los ids traducidos con `catalogos` {campo: {id: nombre}}."""
+    timeline = load_ticket_timeline(table_versions('tickets'), id_ticket)
+    if not timeline:
+        st.caption("Sin cambios registrados.")
+        return
+    def nombre(campo, valor):
+        if valor is None:
+            return "—"
+        return catalogos[campo].get(valor, valor) if campo in catalogos else valor
+    st.dataframe(pd.DataFrame([{
+        'fecha': cambio['fecha'], 'campo': cambio['campo'],
+        'antes': nombre(cambio['campo'], cambio['antes']), 'después': nombre(cambio['campo'], cambio['despues']),
+    } for cambio in timeline]).astype({'antes': str, 'después': str}), use_container_width=True)
 
 # --- Sidebar ---
 st.sidebar.title("Navegación")
+menu_options = ["Dashboard", "Técnicos", "Clientes", "Tickets", "Actividad"]
+# Página de administración oculta: solo aparece abriendo la app con ?admin=1
+if st.query_params.get("admin") == "1":
+    menu_options.append("Administración")
 menu_selection = st.sidebar.radio(
     "Ir a:",
-    ("Dashboard", "Técnicos", "Clientes", "Tickets")
+    menu_options
 )
 
 st.sidebar.markdown("---")
@@ -49,76 +212,75 @@ if menu_selection == "Dashboard":
     st.title("Dashboard")
     st.write("Bienvenido al sistema de gestión de tickets.")
 
-    conn = db.get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT COUNT(*) FROM tickets")
-            total_tickets = cursor.fetchone()[0]
-
-            cursor.execute("""
-                SELECT COUNT(*) FROM tickets
-                WHERE id_estado NOT IN (SELECT id_estado FROM estados_ticket WHERE es_final = 1)
-            """)
-            tickets_abiertos = cursor.fetchone()[0]
-
-            cursor.execute("SELECT COUNT(*) FROM tecnicos WHERE activo = 1")
-            tecnicos_activos = cursor.fetchone()[0]
-
-            cursor.execute("SELECT COUNT(*) FROM clientes WHERE activo = 1")
-            clientes_activos = cursor.fetchone()
-            clientes_activos = clientes_activos[0] if clientes_activos else 0
-
+    # Contadores mantenidos por triggers: una sola consulta O(1) en lugar de cuatro COUNT(*)
+    counters = db.get_dashboard_counters()
+    if counters:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Total Tickets", counters.get('total_tickets', 0))
+        col2.metric("Tickets Abiertos", counters.get('tickets_abiertos', 0))
+        col3.metric("Técnicos Activos", counters.get('tecnicos_activos', 0))
+        col4.metric("Clientes Activos", counters.get('clientes_activos', 0))
+    else:
+        st.error("No se pudieron cargar los contadores del dashboard.")
 
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Total Tickets", total_tickets)
-            col2.metric("Tickets Abiertos", tickets_abiertos)
-            col3.metric("Técnicos Activos", tecnicos_activos)
-            col4.metric("Clientes Activos", clientes_activos)
+    st.subheader("Tickets recientes")
+    recent_tickets_df, _ = load_tickets_page(table_versions(*db.TICKET_LIST_TABLES), limit=10)
 
-            st.subheader("Tickets recientes")
-            recent_tickets_raw = db.get_tickets() 
-            recent_tickets_df = pd.DataFrame(recent_tickets_raw)
+    if not recent_tickets_df.empty:
+        try:
+            columnas_esperadas_dashboard = ['numero_ticket', 'titulo', 'tipo_tarea', 'estado', 'fecha_creacion']
+            columnas_validas = [col for col in columnas_esperadas_dashboard if col in recent_tickets_df.columns]
 
-            # --- DEPURACIÓN: Imprimir columnas ---
-            print("\n--- Columnas RECIENTES en recent_tickets_df (Dashboard) ---")
-            if not recent_tickets_df.empty:
-                print(recent_tickets_df.columns.tolist())
+            if len(columnas_validas) == len(columnas_esperadas_dashboard):
+                st.dataframe(recent_tickets_df[columnas_esperadas_dashboard], column_config={'fecha_creacion': DATETIME_COLUMN})
             else:
-                print("DataFrame de tickets recientes está vacío.")
-            print("--- Fin de columnas ---")
-            # --- Fin de Depuración ---
-
-            if not recent_tickets_df.empty:
-                try:
-                    columnas_esperadas_dashboard = ['numero_ticket', 'titulo', 'tipo_tarea', 'estado', 'fecha_creacion']
-                    columnas_validas = [col for col in columnas_esperadas_dashboard if col in recent_tickets_df.columns]
-                    
-                    if len(columnas_validas) == len(columnas_esperadas_dashboard):
-                        st.dataframe(recent_tickets_df[columnas_esperadas_dashboard])
-                    else:
-                        st.warning("No todas las columnas esperadas están presentes en los tickets recientes.")
-                        st.write("Columnas disponibles:")
-                        st.write(recent_tickets_df.columns.tolist())
-                        if columnas_validas:
-                            st.dataframe(recent_tickets_df[columnas_validas])
-
-                except KeyError as e:
-                    st.error(f"Error al mostrar tickets recientes: {e}. Las columnas esperadas pueden no estar disponibles.")
-                    st.write("Columnas disponibles:")
-                    st.write(recent_tickets_df.columns.tolist())
+                st.warning("No todas las columnas esperadas están presentes en los tickets recientes.")
+                st.write("Columnas disponibles:")
+                st.write(recent_tickets_df.columns.tolist())
+                if columnas_validas:
+                    st.dataframe(recent_tickets_df[columnas_validas])
 
-            else:
-                st.write("No hay tickets registrados aún.")
+        except KeyError as e:
+            st.error(f"Error al mostrar tickets recientes: {e}. Las columnas esperadas pueden no estar disponibles.")
+            st.write("Columnas disponibles:")
+            st.write(recent_tickets_df.columns.tolist())
 
-        except sqlite3.Error as e:
-            st.error(f"Error al cargar datos del dashboard: {e}")
-        finally:
-            if conn:
-                conn.close()
     else:
-        st.error("No se pudo conectar a la base de datos para el dashboard.")
+        st.write("No hay tickets registrados aún.")
+
+    # Resúmenes mantenidos por triggers (resumen_tecnico / resumen_cliente): no se agrega la actividad al pintar
+    summary_versions = table_versions(*db.SUMMARY_SOURCE_TABLES)
+    col_tecnicos, col_clientes = st.columns(2)
+    with col_tecnicos:
+        st.subheader("Carga por técnico")
+        resumen_tecnicos_df = load_summary(summary_versions, 'tecnicos')
+        if not resumen_tecnicos_df.empty:
+            st.dataframe(resumen_tecnicos_df[['tecnico', 'total_tickets', 'tickets_abiertos', 'total_horas']])
+    with col_clientes:
+        st.subheader("Resumen por cliente")
+        resumen_clientes_df = load_summary(summary_versions, 'clientes')
+        if not resumen_clientes_df.empty:
+            st.dataframe(resumen_clientes_df[['nombre_empresa', 'total_tickets', 'tickets_abiertos', 'total_horas', 'tipo_tarea_mas_frecuente']])
+
+
+    st.subheader("Cumplimiento de SLA")
+    sla_metrics = load_sla_metrics(table_versions(*sla.SLA_TABLES), datetime.now(timezone.utc).strftime('%Y-%m-%d %H'))
+    if sla_metrics and sla_metrics['tickets']:
+        total = sla_metrics['global'][0]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Asignación p50 (h)", f"{total['asignacion_p50_h']:.1f}" if total['asignacion_p50_h'] is not None else "—")
+        col2.metric("Resolución p90 (h)", f"{total['resolucion_p90_h']:.1f}" if total['resolucion_p90_h'] is not None else "—")
+        col3.metric("Incumplimiento", f"{100 * total['tasa_incumplimiento']:.1f}%" if total['tasa_incumplimiento'] is not None else "—")
+        sla_columns = ['nombre', 'tickets', 'cerrados', 'asignacion_p50_h', 'asignacion_p90_h', 'resolucion_p50_h',
+                       'resolucion_p90_h', 'resolucion_p95_h', 'incumplidos', 'abiertos_vencidos', 'tasa_incumplimiento']
+        st.dataframe(pd.DataFrame(sla_metrics['prioridad'])[['objetivo_h'] + sla_columns].set_index('nombre'))
+        agrupar_por = st.selectbox("Detalle por", ["cliente", "tecnico"], format_func=lambda key: "Cliente" if key == "cliente" else "Técnico", key="sla_agrupar")
+        detalle_df = pd.DataFrame(sla_metrics[agrupar_por])[sla_columns]
+        st.dataframe(detalle_df.sort_values('tasa_incumplimiento', ascending=False).set_index('nombre'))
+        st.caption(f"Plazos de resolución por nivel de prioridad: {sla.OBJETIVOS_RESOLUCION_HORAS}. "
+                   f"Calculado sobre {sla_metrics['tickets']} tickets a las {sla_metrics['referencia']} (UTC).")
+    else:
+        st.write("No hay tickets para calcular el SLA.")
 
 
 # --- CRUD para Técnicos ---
@@ -127,7 +289,7 @@ elif menu_selection == "Técnicos":
 
     st.subheader("Añadir/Editar Técnico")
 
-    tecnicos_catalog_for_select = db.get_tecnicos_catalog() 
+    tecnicos_catalog_for_select = catalog('tecnicos')
     if not tecnicos_catalog_for_select:
         st.warning("No hay técnicos activos para mostrar en selecciones.")
 
@@ -162,33 +324,18 @@ elif menu_selection == "Técnicos":
     st.markdown("---")
 
     st.subheader("Listado de Técnicos")
-    tecnicos_data = db.get_tecnicos()
-    tecnicos_df = pd.DataFrame(tecnicos_data)
+    tecnicos_df = load_table(table_versions('tecnicos'), 'tecnicos')
 
     if not tecnicos_df.empty:
-        if 'fecha_ingreso' in tecnicos_df.columns:
-            tecnicos_df['fecha_ingreso'] = pd.to_datetime(tecnicos_df['fecha_ingreso']).dt.strftime('%Y-%m-%d')
-        if 'created_at' in tecnicos_df.columns:
-            tecnicos_df['created_at'] = pd.to_datetime(tecnicos_df['created_at']).dt.strftime('%Y-%m-%d %H:%M')
-        if 'updated_at' in tecnicos_df.columns:
-            tecnicos_df['updated_at'] = pd.to_datetime(tecnicos_df['updated_at']).dt.strftime('%Y-%m-%d %H:%M')
-
         cols_to_show = ['nombre', 'apellido', 'email', 'login', 'especialidad', 'activo', 'fecha_ingreso']
         cols_to_show_presentes = [col for col in cols_to_show if col in tecnicos_df.columns]
-        st.dataframe(tecnicos_df[cols_to_show_presentes])
+        st.dataframe(tecnicos_df[cols_to_show_presentes], column_config={'fecha_ingreso': DATE_COLUMN})
 
         st.subheader("Acciones sobre Técnicos")
         with st.expander("Editar/Eliminar Técnico"):
             # Verificar si 'id_tecnico' existe antes de usarlo
             if 'id_tecnico' in tecnicos_df.columns:
-                tecnico_ids_list = tecnicos_df['id_tecnico'].tolist()
-                
-                tecnico_id_to_manage = st.selectbox(
-                    "Selecciona un técnico para editar/eliminar", 
-                    options=tecnico_ids_list, 
-                    format_func=lambda x: f"{tecnicos_df.loc[tecnicos_df['id_tecnico'] == x, 'nombre'].iloc[0]} {tecnicos_df.loc[tecnicos_df['id_tecnico'] == x, 'apellido'].iloc[0]} (ID: {x})" if x in tecnico_ids_list and not tecnicos_df.empty else "Selecciona un técnico",
-                    key="manage_tecnico_select"
-                )
+                tecnico_id_to_manage = entity_picker('tecnicos', "Selecciona un técnico para editar/eliminar", "manage_tecnico_select")
 
                 if tecnico_id_to_manage:
                     tecnico_data = db.get_tecnico_by_id(tecnico_id_to_manage)
@@ -242,13 +389,7 @@ elif menu_selection == "Clientes":
 
     st.subheader("Añadir/Editar Cliente")
 
-    clientes_catalog_list = db.get_clientes() 
-    clientes_catalog_dict = {c['id_cliente']: c['nombre_empresa'] for c in clientes_catalog_list} 
-    
-    tecnicos_catalog = db.get_tecnicos_catalog() 
-    tipos_tarea_catalog = db.get_tipos_tarea_catalog() 
-    prioridades_catalog = db.get_prioridades_catalog() 
-    estados_ticket_catalog = db.get_estados_ticket_catalog() 
+    clientes_catalog_dict = catalog('clientes')
 
     with st.form("add_cliente_form", clear_on_submit=True):
         st.write("**Datos del Cliente**")
@@ -275,15 +416,9 @@ elif menu_selection == "Clientes":
     st.markdown("---")
 
     st.subheader("Listado de Clientes")
-    clientes_data = db.get_clientes()
-    clientes_df = pd.DataFrame(clientes_data)
+    clientes_df = load_table(table_versions('clientes'), 'clientes')
 
     if not clientes_df.empty:
-        if 'created_at' in clientes_df.columns:
-            clientes_df['created_at'] = pd.to_datetime(clientes_df['created_at']).dt.strftime('%Y-%m-%d %H:%M')
-        if 'updated_at' in clientes_df.columns:
-            clientes_df['updated_at'] = pd.to_datetime(clientes_df['updated_at']).dt.strftime('%Y-%m-%d %H:%M')
-
         cols_to_show = ['nombre_empresa', 'contacto_principal', 'email', 'telefono', 'ciudad', 'pais', 'activo']
         cols_to_show_presentes = [col for col in cols_to_show if col in clientes_df.columns]
         st.dataframe(clientes_df[cols_to_show_presentes])
@@ -292,14 +427,7 @@ elif menu_selection == "Clientes":
         with st.expander("Editar/Eliminar Cliente"):
             # Verificar si 'id_cliente' existe antes de usarlo
             if 'id_cliente' in clientes_df.columns:
-                cliente_ids_list = clientes_df['id_cliente'].tolist()
-                
-                cliente_id_to_manage = st.selectbox(
-                    "Selecciona un cliente para editar/eliminar", 
-                    options=cliente_ids_list, 
-                    format_func=lambda x: clientes_catalog_dict.get(x, f"Cliente ID {x}") if x in clientes_catalog_dict and not clientes_df.empty else "Selecciona un cliente",
-                    key="manage_cliente_select"
-                )
+                cliente_id_to_manage = entity_picker('clientes', "Selecciona un cliente para editar/eliminar", "manage_cliente_select")
 
                 if cliente_id_to_manage:
                     cliente_data = db.get_cliente_by_id(cliente_id_to_manage)
@@ -347,13 +475,17 @@ elif menu_selection == "Clientes":
 elif menu_selection == "Tickets":
     st.title("Gestión de Tickets")
 
-    clientes_catalog_list = db.get_clientes() 
-    clientes_catalog_dict = {c['id_cliente']: c['nombre_empresa'] for c in clientes_catalog_list} 
+    clientes_catalog_dict = catalog('clientes')
     
-    tecnicos_catalog = db.get_tecnicos_catalog() 
-    tipos_tarea_catalog = db.get_tipos_tarea_catalog() 
-    prioridades_catalog = db.get_prioridades_catalog() 
-    estados_ticket_catalog = db.get_estados_ticket_catalog() 
+    tecnicos_catalog = catalog('tecnicos')
+    tipos_tarea_catalog = catalog('tipos_tarea')
+    prioridades_catalog = catalog('prioridades')
+    estados_ticket_catalog = catalog('estados_ticket')
+    clientes_lookup = lookup('clientes')
+    tecnicos_lookup = lookup('tecnicos', none_option=True)
+    tipos_tarea_lookup = lookup('tipos_tarea')
+    prioridades_lookup = lookup('prioridades')
+    estados_ticket_lookup = lookup('estados_ticket')
 
     # --- Crear Ticket ---
     st.subheader("Crear Nuevo Ticket")
@@ -368,10 +500,11 @@ elif menu_selection == "Tickets":
             key="ticket_cliente"
         )
 
+        AUTO_ASIGNAR = 'auto'
         tecnico_asignado_id = st.selectbox(
             "Técnico Asignado",
-            options=[None] + list(tecnicos_catalog.keys()), 
-            format_func=lambda x: "Sin asignar" if x is None else tecnicos_catalog.get(x, "Desconocido"),
+            options=[None, AUTO_ASIGNAR] + list(tecnicos_catalog.keys()), 
+            format_func=lambda x: "Sin asignar" if x is None else "Automático (menor carga de su especialidad)" if x == AUTO_ASIGNAR else tecnicos_catalog.get(x, "Desconocido"),
             key="ticket_tecnico_asignado"
         )
 
@@ -406,75 +539,171 @@ elif menu_selection == "Tickets":
             if not all([numero_ticket, cliente_seleccionado_id, tipo_tarea_id, prioridad_id, estado_id, titulo]):
                 st.error("Por favor, complete los campos obligatorios (Número de Ticket, Cliente, Tipo Tarea, Prioridad, Estado, Título).")
             else:
+                if tecnico_asignado_id == AUTO_ASIGNAR:
+                    tecnico_asignado_id = asignacion.suggest_tecnico(tipo_tarea_id)
                 if db.add_ticket(numero_ticket, cliente_seleccionado_id, tecnico_asignado_id, tipo_tarea_id, prioridad_id, estado_id, titulo, descripcion, tiempo_estimado_horas):
                     display_message("Ticket creado con éxito.", "success")
                     st.experimental_rerun()
                 else:
                     display_message("Error al crear ticket. Verifique el número de ticket (debe ser único).", "error")
 
+    with st.expander("Asignación automática"):
+        cargas = asignacion.get_engine().snapshot()
+        if cargas:
+            cargas_df = pd.DataFrame(cargas)
+            cargas_df.insert(0, 'tecnico', cargas_df['id_tecnico'].map(tecnicos_catalog))
+            st.dataframe(cargas_df[['tecnico', 'especialidad', 'tickets_abiertos', 'carga']])
+        limite_backlog = st.number_input("Máximo de tickets a asignar", min_value=1, value=100, step=50, key="asignacion_limite")
+        if st.button("Asignar tickets abiertos sin técnico", key="asignacion_backlog"):
+            asignados = asignacion.assign_backlog(limit=int(limite_backlog))
+            if asignados is None:
+                display_message("Error al asignar los tickets sin técnico.", "error")
+            else:
+                display_message(f"{len(asignados)} tickets asignados.", "success")
+                st.rerun()
+
     st.markdown("---")
 
     # --- Listar Tickets ---
     st.subheader("Listado de Tickets")
-    tickets_data = db.get_tickets()
-    tickets_df = pd.DataFrame(tickets_data)
 
-    if not tickets_df.empty:
-        for col in ['fecha_creacion']: 
-            if col in tickets_df.columns:
-                tickets_df[col] = pd.to_datetime(tickets_df[col]).dt.strftime('%Y-%m-%d %H:%M')
+    with st.expander("Filtros"):
+        col1, col2 = st.columns(2)
+        with col1:
+            filtro_clientes = st.multiselect("Cliente", options=list(clientes_catalog_dict.keys()), format_func=lambda x: clientes_catalog_dict.get(x, f"Cliente ID {x}"), key="filtro_clientes")
+            filtro_tecnicos = st.multiselect("Técnico", options=list(tecnicos_catalog.keys()), format_func=lambda x: tecnicos_catalog.get(x, f"Técnico ID {x}"), key="filtro_tecnicos")
+            filtro_por_fecha = st.checkbox("Filtrar por fecha de creación", key="filtro_por_fecha")
+            filtro_abiertos = st.checkbox("Solo tickets abiertos", key="filtro_abiertos")
+            filtro_archivados = st.checkbox("Incluir tickets archivados", key="filtro_archivados", help="Tickets cerrados hace tiempo que se movieron al archivo. Solo lectura.")
+        with col2:
+            filtro_estados = st.multiselect("Estado", options=list(estados_ticket_catalog.keys()), format_func=lambda x: estados_ticket_catalog.get(x, f"Estado ID {x}"), key="filtro_estados")
+            filtro_prioridades = st.multiselect("Prioridad", options=list(prioridades_catalog.keys()), format_func=lambda x: prioridades_catalog.get(x, f"Prioridad ID {x}"), key="filtro_prioridades")
+            filtro_fechas = st.date_input("Rango de fechas", value=(datetime.now().date(), datetime.now().date()), key="filtro_fechas", disabled=not filtro_por_fecha)
+        page_size = st.selectbox("Tickets por página", options=[25, 50, 100, 200], index=1, key="tickets_page_size")
+
+    ticket_filters = {
+        'id_cliente': filtro_clientes, 'id_tecnico': filtro_tecnicos,
+        'id_estado': filtro_estados, 'id_prioridad': filtro_prioridades,
+        'abiertos': filtro_abiertos,
+    }
+    if filtro_por_fecha and len(filtro_fechas) == 2:
+        ticket_filters['fecha_desde'], ticket_filters['fecha_hasta'] = filtro_fechas
+
+    # --- Búsqueda de texto completo ---
+    search_text = st.text_input("🔍 Buscar en título, descripción y actividad", key="tickets_search", placeholder="Ej: impresora red")
+    if search_text.strip():
+        search_results = load_search_results(table_versions(*db.TICKET_LIST_TABLES, 'registros_actividad'), search_text, ticket_filters)
+        if search_results:
+            st.caption(f"{len(search_results)} resultados más relevantes (se aplican también los filtros)")
+            for result in search_results:
+                st.markdown(f"**{result['numero_ticket']}** · {result['titulo_resaltado']} — _{result['estado']}, {result['nombre_empresa']}_")
+                if result['fragmento'] and result['fragmento'] != result['titulo_resaltado']:
+                    st.caption(result['fragmento'])
+        else:
+            st.info("Ningún ticket coincide con la búsqueda.")
+        st.markdown("---")
+
+    # Pila de cursores de las páginas visitadas; se reinicia si cambian los filtros o el tamaño de página
+    filters_signature = repr((ticket_filters, page_size, filtro_archivados))
+    if st.session_state.get("tickets_filters_signature") != filters_signature:
+        st.session_state["tickets_filters_signature"] = filters_signature
+        st.session_state["tickets_page_cursors"] = [None]
+    page_cursors = st.session_state["tickets_page_cursors"]
+
+    tickets_df, next_cursor = load_tickets_page(table_versions(*db.TICKET_LIST_TABLES), after=page_cursors[-1], limit=page_size, filters=ticket_filters, include_archive=filtro_archivados)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅ Anterior", disabled=len(page_cursors) == 1, key="tickets_prev_page"):
+            page_cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Página {len(page_cursors)} · {len(tickets_df)} tickets")
+    with col_next:
+        if st.button("Siguiente ➡", disabled=next_cursor is None, key="tickets_next_page"):
+            page_cursors.append(next_cursor)
+            st.rerun()
+
+    if tickets_df.empty:
+        st.info("No hay tickets que coincidan con los filtros.")
 
+    if not tickets_df.empty:
         columnas_esperadas_lista = ['numero_ticket', 'nombre_empresa', 'tecnico_asignado', 'tipo_tarea', 'prioridad', 'estado', 'titulo', 'fecha_creacion']
         
-        # --- DEPURACIÓN: Verificar qué columnas están realmente disponibles ---
-        print("\n--- Columnas en tickets_df (Listado de Tickets) ---")
-        if not tickets_df.empty:
-            print(tickets_df.columns.tolist())
-        else:
-            print("DataFrame de tickets está vacío.")
-        print("--- Fin de columnas ---")
-        # --- Fin de Depuración ---
-
         columnas_presentes_lista = [col for col in columnas_esperadas_lista if col in tickets_df.columns]
         
+        if 'archivado' in tickets_df.columns:
+            columnas_esperadas_lista.append('archivado')
+            columnas_presentes_lista.append('archivado')
+        
         if len(columnas_presentes_lista) == len(columnas_esperadas_lista):
-            st.dataframe(tickets_df[columnas_esperadas_lista], use_container_width=True)
+            st.dataframe(tickets_df[columnas_esperadas_lista], use_container_width=True, column_config={'fecha_creacion': DATETIME_COLUMN})
         else:
             st.warning("No todas las columnas esperadas están presentes en el listado de tickets.")
             st.write("Columnas disponibles:")
             st.write(tickets_df.columns.tolist()) 
             if columnas_presentes_lista:
-                st.dataframe(tickets_df[columnas_presentes_lista], use_container_width=True)
+                st.dataframe(tickets_df[columnas_presentes_lista], use_container_width=True, column_config={'fecha_creacion': DATETIME_COLUMN})
 
         # --- Editar/Eliminar Ticket ---
+        # Los tickets archivados solo se consultan: las acciones se aplican a los vivos
+        if 'archivado' in tickets_df.columns:
+            tickets_df = tickets_df[tickets_df['archivado'] == 0]
+        # Etiquetas de los tickets de la página, construidas una vez para todos los selectores
+        page_ticket_labels = dict(zip(tickets_df['id_ticket'].tolist(),
+                                      (tickets_df['numero_ticket'].astype(str) + " - " + tickets_df['titulo'].astype(str)).tolist()))
         st.subheader("Acciones sobre Tickets")
+        with st.expander("Acciones masivas"):
+            st.caption("Cambia estado, técnico o prioridad de varios tickets en una sola transacción.")
+            bulk_all = st.checkbox("Aplicar a todos los tickets que cumplen los filtros (no solo a esta página)", key="bulk_all_filtered")
+            bulk_ids = st.multiselect(
+                "Tickets de esta página",
+                options=list(page_ticket_labels),
+                format_func=lambda x: page_ticket_labels.get(x, f"Ticket ID {x}"),
+                key="bulk_ticket_ids",
+                disabled=bulk_all
+            )
+            bulk_actions = {
+                "Cambiar estado": ('id_estado', list(estados_ticket_catalog.keys()), lambda x: estados_ticket_catalog.get(x, f"Estado ID {x}")),
+                "Reasignar técnico": ('id_tecnico_asignado', [None] + list(tecnicos_catalog.keys()), lambda x: "Sin asignar" if x is None else tecnicos_catalog.get(x, f"Técnico ID {x}")),
+                "Cambiar prioridad": ('id_prioridad', list(prioridades_catalog.keys()), lambda x: prioridades_catalog.get(x, f"Prioridad ID {x}")),
+            }
+            col1, col2 = st.columns(2)
+            with col1:
+                bulk_action = st.selectbox("Acción", options=list(bulk_actions.keys()), key="bulk_action")
+            bulk_field, bulk_options, bulk_format = bulk_actions[bulk_action]
+            with col2:
+                bulk_value = st.selectbox("Nuevo valor", options=bulk_options, format_func=bulk_format, key=f"bulk_value_{bulk_field}")
+            if st.button("Aplicar", key="bulk_apply", disabled=not (bulk_all or bulk_ids)):
+                if bulk_all:
+                    result = db.bulk_update_tickets({bulk_field: bulk_value}, filters=ticket_filters)
+                else:
+                    result = db.bulk_update_tickets({bulk_field: bulk_value}, ids=bulk_ids)
+                if result is None:
+                    display_message("Error en la operación masiva. Con 'todos los tickets' hace falta al menos un filtro.", "error")
+                else:
+                    display_message(f"{result['modificados']} de {result['seleccionados']} tickets modificados.", "success")
+                    st.rerun()
+
         with st.expander("Editar/Eliminar Ticket"):
             
-            # Primero, verifica si 'id_ticket' está en el DataFrame antes de usarlo
+            # Sin texto se ofrecen los tickets de esta página; al escribir se busca en todos
             if 'id_ticket' in tickets_df.columns:
-                ticket_ids = tickets_df['id_ticket'].tolist()
-                
-                if ticket_ids:
-                    ticket_display_map = {}
-                    for index, row in tickets_df.iterrows():
-                        display_text = f"Ticket ID {row['id_ticket']}" 
-                        if 'numero_ticket' in row and 'titulo' in row:
-                            display_text = f"{row['numero_ticket']} - {row['titulo']}"
-                        elif 'numero_ticket' in row:
-                            display_text = f"{row['numero_ticket']} (ID: {row['id_ticket']})"
-                        
-                        ticket_display_map[row['id_ticket']] = display_text
-
-                    ticket_id_to_manage = st.selectbox(
-                        "Selecciona un ticket para editar/eliminar",
-                        options=ticket_ids,
-                        format_func=lambda x: ticket_display_map.get(x, f"Ticket ID {x}"), 
-                        key="manage_ticket_select"
-                    )
+                if page_ticket_labels:
+                    ticket_id_to_manage = entity_picker('tickets', "Selecciona un ticket para editar/eliminar", "manage_ticket_select",
+                                                        default_options=page_ticket_labels)
 
                     if ticket_id_to_manage:
+                        show_ticket_totales(ticket_id_to_manage)
+                        st.markdown("**Historial de cambios**")
+                        show_ticket_timeline(ticket_id_to_manage, {
+                            'id_cliente': clientes_catalog_dict, 'id_tecnico_asignado': tecnicos_catalog,
+                            'id_tipo_tarea': tipos_tarea_catalog, 'id_prioridad': prioridades_catalog,
+                            'id_estado': estados_ticket_catalog,
+                        })
                         ticket_data = db.get_ticket_by_id(ticket_id_to_manage)
                         if ticket_data:
+                            ticket_data = dict(ticket_data) # El formulario usa .get() sobre los campos
                             with st.form(f"edit_ticket_form_{ticket_id_to_manage}", clear_on_submit=False):
                                 st.write(f"**Editando Ticket: {ticket_data.get('numero_ticket', 'N/A')}**")
 
@@ -483,40 +712,40 @@ elif menu_selection == "Tickets":
                                 # --- Selectores de Edición ---
                                 edit_cliente_id = st.selectbox(
                                     "Cliente",
-                                    options=list(clientes_catalog_dict.keys()),
-                                    index=list(clientes_catalog_dict.keys()).index(ticket_data['id_cliente']) if ticket_data['id_cliente'] in clientes_catalog_dict else 0,
+                                    options=clientes_lookup['options'],
+                                    index=clientes_lookup['positions'].get(ticket_data['id_cliente'], 0),
                                     format_func=lambda x: clientes_catalog_dict.get(x, "Selecciona un cliente"),
                                     key=f"edit_tk_cliente_{ticket_id_to_manage}"
                                 )
 
                                 edit_tecnico_id = st.selectbox(
                                     "Técnico Asignado",
-                                    options=[None] + list(tecnicos_catalog.keys()),
-                                    index=([None] + list(tecnicos_catalog.keys())).index(ticket_data['id_tecnico_asignado']) if (ticket_data['id_tecnico_asignado'] in tecnicos_catalog or ticket_data['id_tecnico_asignado'] is None) else 0,
+                                    options=tecnicos_lookup['options'],
+                                    index=tecnicos_lookup['positions'].get(ticket_data['id_tecnico_asignado'], 0),
                                     format_func=lambda x: "Sin asignar" if x is None else tecnicos_catalog.get(x, "Desconocido"),
                                     key=f"edit_tk_tecnico_{ticket_id_to_manage}"
                                 )
 
                                 edit_tipo_tarea_id = st.selectbox(
                                     "Tipo de Tarea",
-                                    options=list(tipos_tarea_catalog.keys()),
-                                    index=list(tipos_tarea_catalog.keys()).index(ticket_data['id_tipo_tarea']) if ticket_data['id_tipo_tarea'] in tipos_tarea_catalog else 0,
+                                    options=tipos_tarea_lookup['options'],
+                                    index=tipos_tarea_lookup['positions'].get(ticket_data['id_tipo_tarea'], 0),
                                     format_func=lambda x: tipos_tarea_catalog.get(x, "Selecciona un tipo"),
                                     key=f"edit_tk_tipo_tarea_{ticket_id_to_manage}"
                                 )
 
                                 edit_prioridad_id = st.selectbox(
                                     "Prioridad",
-                                    options=list(prioridades_catalog.keys()),
-                                    index=list(prioridades_catalog.keys()).index(ticket_data['id_prioridad']) if ticket_data['id_prioridad'] in prioridades_catalog else 0,
+                                    options=prioridades_lookup['options'],
+                                    index=prioridades_lookup['positions'].get(ticket_data['id_prioridad'], 0),
                                     format_func=lambda x: prioridades_catalog.get(x, "Selecciona prioridad"),
                                     key=f"edit_tk_prioridad_{ticket_id_to_manage}"
                                 )
 
                                 edit_estado_id = st.selectbox(
                                     "Estado",
-                                    options=list(estados_ticket_catalog.keys()),
-                                    index=list(estados_ticket_catalog.keys()).index(ticket_data['id_estado']) if ticket_data['id_estado'] in estados_ticket_catalog else 0,
+                                    options=estados_ticket_lookup['options'],
+                                    index=estados_ticket_lookup['positions'].get(ticket_data['id_estado'], 0),
                                     format_func=lambda x: estados_ticket_catalog.get(x, "Selecciona estado"),
                                     key=f"edit_tk_estado_{ticket_id_to_manage}"
                                 )
@@ -576,9 +805,211 @@ elif menu_selection == "Tickets":
                 st.write(tickets_df.columns.tolist())
 
 
+# --- Registro de Actividad ---
+elif menu_selection == "Actividad":
+    st.title("Registro de Actividad")
+
+    tecnicos_catalog = catalog('tecnicos')
+    modalidades_catalog = catalog('modalidades', 'modalidades_trabajo')
+    modalidad_ids = {nombre: id_modalidad for id_modalidad, nombre in modalidades_catalog.items()}
+
+    # --- Imputación de horas en lote ---
+    st.subheader("Imputar horas")
+    st.caption("Añade una fila por imputación; todas se guardan juntas en una sola transacción.")
+    tecnico_imputacion = st.selectbox(
+        "Técnico",
+        options=list(tecnicos_catalog.keys()),
+        format_func=lambda x: tecnicos_catalog.get(x, f"Técnico ID {x}"),
+        key="actividad_tecnico"
+    )
+    plantilla = pd.DataFrame({
+        "numero_ticket": pd.Series(dtype="str"),
+        "fecha_actividad": pd.Series(dtype="datetime64[ns]"),
+        "horas": pd.Series(dtype="float"),
+        "modalidad": pd.Series(dtype="str"),
+        "descripcion_trabajo": pd.Series(dtype="str"),
+        "observaciones": pd.Series(dtype="str"),
+    })
+    imputaciones = st.data_editor(
+        plantilla,
+        num_rows="dynamic",
+        use_container_width=True,
+        key="actividad_editor",
+        column_config={
+            "numero_ticket": st.column_config.TextColumn("Ticket", help="Número de ticket, p. ej. TK-001", required=True),
+            "fecha_actividad": st.column_config.DateColumn("Fecha", default=datetime.now().date(), required=True),
+            "horas": st.column_config.NumberColumn("Horas", min_value=0.01, step=0.25, required=True),
+            "modalidad": st.column_config.SelectboxColumn("Modalidad", options=list(modalidad_ids.keys()), required=True),
+            "descripcion_trabajo": st.column_config.TextColumn("Descripción"),
+            "observaciones": st.column_config.TextColumn("Observaciones"),
+        },
+    )
+    if st.button("Guardar imputaciones", key="actividad_guardar"):
+        filas = imputaciones.dropna(subset=["numero_ticket", "fecha_actividad", "horas", "modalidad"])
+        if filas.empty:
+            st.error("Añade al menos una fila con ticket, fecha, horas y modalidad.")
+        else:
+            ticket_ids = db.get_ticket_ids_by_numero(filas["numero_ticket"].str.strip().unique().tolist())
+            desconocidos = sorted(set(filas["numero_ticket"].str.strip()) - set(ticket_ids))
+            if desconocidos:
+                st.error(f"Tickets inexistentes: {', '.join(desconocidos)}")
+            else:
+                registros = [{
+                    'id_ticket': ticket_ids[fila.numero_ticket.strip()],
+                    'id_tecnico': tecnico_imputacion,
+                    'id_modalidad': modalidad_ids[fila.modalidad],
+                    'fecha_actividad': pd.Timestamp(fila.fecha_actividad).date(),
+                    'tiempo_dedicado_horas': fila.horas,
+                    'descripcion_trabajo': fila.descripcion_trabajo if pd.notna(fila.descripcion_trabajo) else None,
+                    'observaciones': fila.observaciones if pd.notna(fila.observaciones) else None,
+                } for fila in filas.itertuples()]
+                insertados = db.add_registros_actividad(registros)
+                if insertados:
+                    display_message(f"{insertados} imputaciones guardadas.", "success")
+                    del st.session_state["actividad_editor"]
+                    st.rerun()
+                else:
+                    display_message("Error al guardar las imputaciones. Revisa los datos.", "error")
+
+    st.markdown("---")
+
+    # --- Historial ---
+    st.subheader("Historial")
+    historial_por = st.radio("Ver historial de", ("Ticket", "Técnico"), horizontal=True, key="actividad_historial_por")
+    historial_archivo = st.checkbox("Incluir tickets archivados", key="actividad_historial_archivo")
+    historial_key = None
+    if historial_por == "Ticket":
+        numero_historial = st.text_input("Número de ticket", key="actividad_numero_ticket").strip()
+        if numero_historial:
+            historial_key = db.get_ticket_ids_by_numero([numero_historial], include_archive=historial_archivo).get(numero_historial)
+            if historial_key is None:
+                st.warning(f"No existe el ticket {numero_historial}.")
+            else:
+                show_ticket_totales(historial_key)
+    else:
+        historial_key = st.selectbox(
+            "Técnico",
+            options=list(tecnicos_catalog.keys()),
+            format_func=lambda x: tecnicos_catalog.get(x, f"Técnico ID {x}"),
+            key="actividad_historial_tecnico"
+        )
+
+    if historial_key is not None:
+        kind = 'ticket' if historial_por == "Ticket" else 'tecnico'
+        # Pila de cursores como en el listado de tickets; se reinicia al cambiar de ticket o técnico
+        signature = (kind, historial_key, historial_archivo)
+        if st.session_state.get("actividad_signature") != signature:
+            st.session_state["actividad_signature"] = signature
+            st.session_state["actividad_cursors"] = [None]
+        activity_cursors = st.session_state["actividad_cursors"]
+        historial_df, next_cursor = load_activity_page(table_versions(*ACTIVITY_TABLES), kind, historial_key, after=activity_cursors[-1], include_archive=historial_archivo)
+
+        if historial_df.empty:
+            st.info("No hay actividad registrada.")
+        else:
+            columnas = ['fecha_actividad', 'numero_ticket', 'titulo', 'tecnico', 'modalidad', 'tiempo_dedicado_horas', 'descripcion_trabajo', 'observaciones']
+            st.dataframe(historial_df[columnas], use_container_width=True)
+
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if st.button("⬅ Anterior", disabled=len(activity_cursors) == 1, key="actividad_prev_page"):
+                activity_cursors.pop()
+                st.rerun()
+        with col_page:
+            st.caption(f"Página {len(activity_cursors)} · {len(historial_df)} registros")
+        with col_next:
+            if st.button("Siguiente ➡", disabled=next_cursor is None, key="actividad_next_page"):
+                activity_cursors.append(next_cursor)
+                st.rerun()
+
+
+# --- Administración (oculta) ---
+elif menu_selection == "Administración":
+    st.title("Administración")
+    st.caption("Estadísticas de este proceso desde su arranque.")
+
+    st.subheader("Pool de conexiones")
+    st.dataframe(pd.DataFrame([db.get_pool_stats()]))
+
+    st.subheader("Cola de escritura")
+    write_stats = db.get_write_queue_stats()
+    tamanos_lote = write_stats.pop('tamanos_lote')
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("En cola", write_stats['cola'], help=f"Máximo: {write_stats['cola_max']}")
+    col2.metric("Operaciones por commit", f"{write_stats['lote_medio']:.1f}", help=f"Máximo: {write_stats['lote_max']}")
+    col3.metric("Espera media", f"{write_stats['espera_media_ms']:.1f} ms", help="Desde que se encola hasta que se confirma")
+    col4.metric("Errores", write_stats['errores'], help=f"Lotes fallidos: {write_stats['lotes_fallidos']}")
+    if tamanos_lote:
+        st.bar_chart(pd.Series(tamanos_lote, name="lotes").rename_axis("operaciones por lote"))
+    if not db.WRITE_QUEUE_ENABLED:
+        st.caption("Cola desactivada (TICKETS_WRITE_QUEUE=0): cada escritura se confirma por separado.")
+
+    st.subheader("Esperas por bloqueos")
+    lock_stats = db.get_lock_stats()
+    if lock_stats:
+        st.dataframe(pd.DataFrame.from_dict(lock_stats, orient="index").round(2))
+        st.caption(f"Los bloqueos se reintentan con espera exponencial hasta {db.BUSY_RETRY_DEADLINE:g} s; "
+                   "'agotados' son los que llegaron al usuario como error.")
+    else:
+        st.caption("Aún no se ha esperado por ningún bloqueo.")
+
+    st.subheader("Versiones de datos")
+    st.dataframe(pd.DataFrame.from_dict(data_versions, orient="index", columns=["versión"]))
+
+    st.subheader("Caché de catálogos")
+    catalog_stats = db.get_catalog_cache_stats()
+    if catalog_stats:
+        st.dataframe(pd.DataFrame.from_dict(catalog_stats, orient="index"))
+    else:
+        st.caption("Aún no se ha consultado ningún catálogo.")
+
+    st.subheader("Consultas SQL")
+    query_stats = instrumentation.get_query_stats()
+    if query_stats:
+        query_df = pd.DataFrame(query_stats).drop(columns=["histogram"])
+        st.dataframe(query_df, use_container_width=True)
+        selected_sql = st.selectbox("Histograma de latencias", [q["sql"] for q in query_stats])
+        selected = next(q for q in query_stats if q["sql"] == selected_sql)
+        labels = [f"≤ {limit} ms" for limit in instrumentation.HISTOGRAM_BUCKETS_MS]
+        labels.append(f"> {instrumentation.HISTOGRAM_BUCKETS_MS[-1]} ms")
+        st.bar_chart(pd.DataFrame({"ejecuciones": selected["histogram"]}, index=labels))
+    else:
+        st.caption("Aún no se ha registrado ninguna consulta.")
+    if st.button("Reiniciar estadísticas de consultas"):
+        instrumentation.reset_query_stats()
+        st.rerun()
+
+    st.subheader("Archivo de tickets cerrados")
+    archive_stats = db.get_archive_stats()
+    if archive_stats:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Tickets archivados", archive_stats['tickets'])
+        col2.metric("Registros archivados", archive_stats['registros'])
+        col3.metric(f"Pendientes (> {db.ARCHIVE_AFTER_DAYS} días)", archive_stats['pendientes'])
+        st.caption(f"{archive_stats['ruta']} · último archivado: {archive_stats['ultimo_archivado'] or '—'}")
+        if st.button("Archivar ahora", disabled=not archive_stats['pendientes']):
+            result = db.archive_closed_tickets()
+            if result is None:
+                display_message("Error al archivar tickets.", "error")
+            else:
+                display_message(f"{result['tickets']} tickets y {result['registros']} registros archivados en {result['lotes']} lotes.", "success")
+                st.rerun()
+
+    st.subheader(f"Consultas lentas (≥ {instrumentation.SLOW_QUERY_MS:g} ms)")
+    slow_queries = instrumentation.read_slow_queries()
+    if slow_queries:
+        for entry in slow_queries:
+            with st.expander(f"{entry['fecha']} · {entry['duracion_ms']} ms · {entry['llamante']}"):
+                st.code(entry['sql'], language="sql")
+                st.text("\n".join(entry['plan']))
+    else:
+        st.caption(f"No hay entradas en {instrumentation.SLOW_QUERY_LOG}.")
+
+
 # --- BLOQUE FINAL ELSE ---
 # Este bloque maneja cualquier selección de menú que no sea una de las opciones anteriores.
 # Asegúrate de que esté al mismo nivel de indentación que el 'if' y los 'elif' principales.
 else: 
     st.title("Página no encontrada")
-    st.warning("Selecciona una opción en la barra lateral.")
\ No newline at end of file
+    st.warning("Selecciona una opción en la barra lateral.")
+
@@ -0,0 +1,320 @@
+"""Asignación automática de técnicos según su carga de trabajo.
+
+El motor mantiene en memoria la carga de cada técnico activo: la suma, sobre sus tickets abiertos,
+de las horas estimadas (las del ticket o, si no tiene, las de su tipo de tarea) por el peso del nivel
+de prioridad. Los técnicos están en un heap por especialidad, así que sugerir el técnico menos cargado
+para un tipo de tarea es mirar la cima de unos pocos heaps (O(log n) al retirar entradas obsoletas).
+Las altas, cambios y bajas de tickets hechas con database.py ajustan la carga a través de un listener;
+los cambios de otros procesos se recogen al recargar el estado (cada RELOAD_INTERVAL segundos o cuando
+cambian los técnicos o los catálogos, algo que se comprueba como mucho cada VERSION_CHECK_INTERVAL
+segundos para no consultar la base de datos en cada sugerencia).
+
+Uso:
+    python manage.py assign [--limit 500] [--dry-run]
+"""
+import heapq
+import json
+import os
+import threading
+import time
+import unicodedata
+
+import database as db
+
+RELOAD_INTERVAL = float(os.environ.get('TICKETS_ASSIGNMENT_RELOAD', '300')) # Segundos entre recargas completas
+VERSION_CHECK_INTERVAL = float(os.environ.get('TICKETS_ASSIGNMENT_VERSION_CHECK', '2')) # Segundos entre lecturas de versiones
+
+# Peso de un ticket según el nivel de su prioridad (1 = Crítica)
+PESOS_NIVEL = {1: 3.0, 2: 2.0, 3: 1.0, 4: 0.5, 5: 0.25}
+HORAS_POR_DEFECTO = 1.0 # Si ni el ticket ni su tipo de tarea tienen estimación
+
+# Especialidades de `tecnicos` que atienden cada tipo de tarea (nombres normalizados: minúsculas, sin tildes).
+# Un tipo sin entrada, o sin técnicos activos de esas especialidades, se reparte entre todos.
+ESPECIALIDADES_POR_TIPO = {
+    'soporte a usuarios finales': ('soporte',),
+    'planificacion y escalabilidad de ti': ('infraestructura', 'cloud', 'sistemas'),
+    'mantenimiento de impresoras': ('hardware', 'soporte'),
+    'actualizacion de equipos': ('hardware', 'sistemas', 'soporte'),
+    'configuracion de red': ('redes', 'infraestructura'),
+    'backup y recuperacion': ('backup', 'bases de datos', 'sistemas'),
+    'instalacion de software': ('sistemas', 'soporte'),
+    'seguridad informatica': ('seguridad', 'redes'),
+    'migracion de datos': ('bases de datos', 'cloud', 'backup'),
+    'capacitacion tecnica': ('soporte',),
+}
+
+# Si cambia alguna de estas tablas se recarga todo el estado
+_RELOAD_TABLES = ('tecnicos', 'tipos_tarea', 'prioridades', 'estados_ticket')
+
+_TODOS = None # Clave del heap con todos los técnicos activos
+
+def normalize(text):
+    """Minúsculas y sin tildes, para comparar especialidades y tipos de tarea."""
+    text = unicodedata.normalize('NFKD', (text or '').strip().lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+def _peso_nivel_sql(column):
+    cases = ' '.join(f"WHEN {int(nivel)} THEN {float(peso)}" for nivel, peso in PESOS_NIVEL.items())
+    return f"(CASE {column} {cases} ELSE 1.0 END)"
+
+_CARGAS_QUERY = f"""
+    SELECT tk.id_tecnico_asignado AS id_tecnico, COUNT(*) AS abiertos,
+           SUM(COALESCE(NULLIF(tk.tiempo_estimado_horas, 0), tt.tiempo_estimado_horas, {HORAS_POR_DEFECTO})
+               * {_peso_nivel_sql('p.nivel')}) AS carga
+    FROM tickets tk
+    LEFT JOIN tipos_tarea tt ON tt.id_tipo_tarea = tk.id_tipo_tarea
+    LEFT JOIN prioridades p ON p.id_prioridad = tk.id_prioridad
+    WHERE tk.id_tecnico_asignado IS NOT NULL
+      AND tk.id_estado NOT IN (SELECT id_estado FROM estados_ticket WHERE es_final = 1)
+    GROUP BY tk.id_tecnico_asignado
+"""
+
+_BACKLOG_QUERY = """
+    SELECT tk.id_ticket, tk.id_tipo_tarea, tk.id_prioridad, tk.id_estado, tk.tiempo_estimado_horas
+    FROM tickets tk
+    LEFT JOIN prioridades p ON p.id_prioridad = tk.id_prioridad
+    WHERE tk.id_tecnico_asignado IS NULL
+      AND tk.id_estado NOT IN (SELECT id_estado FROM estados_ticket WHERE es_final = 1)
+    ORDER BY COALESCE(p.nivel, 99), tk.fecha_creacion, tk.id_ticket
+    LIMIT ?
+"""
+
+# Un ticket que sigue en el estado inicial pasa al de asignado; en cualquier otro estado lo conserva
+_ASSIGN_SQL = """
+    UPDATE tickets SET id_tecnico_asignado = ?, fecha_asignacion = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP,
+        id_estado = CASE WHEN id_estado = ? THEN ? ELSE id_estado END
+    WHERE id_ticket = ? AND id_tecnico_asignado IS NULL
+"""
+
+
+class AssignmentEngine:
+    """Carga por técnico en memoria y heaps por especialidad para elegir al menos cargado."""
+
+    def __init__(self, database):
+        self.database = database
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._checked_at = None
+        self._versions = None
+        self._carga = {}         # id_tecnico -> carga ponderada
+        self._abiertos = {}      # id_tecnico -> tickets abiertos
+        self._especialidad = {}  # id_tecnico -> especialidad normalizada
+        self._heaps = {}         # especialidad (o _TODOS) -> [(carga, id_tecnico)], con entradas obsoletas
+        self._niveles = {}       # id_prioridad -> nivel
+        self._tipos = {}         # id_tipo_tarea -> (horas estimadas, especialidades)
+        self._finales = set()    # id_estado finales
+        self._flujo = (None, None) # (estado inicial, estado asignado)
+
+    # --- Estado ---
+
+    def _catalog_versions(self):
+        versions = db.get_data_versions()
+        return tuple(versions.get(table, 0) for table in _RELOAD_TABLES)
+
+    def load(self):
+        """Recarga técnicos, catálogos y cargas desde la base de datos. Devuelve False si falla."""
+        versions = self._catalog_versions() # Antes de leer: un cambio posterior provoca otra recarga
+        conn = db.get_db_connection()
+        if not conn: return False
+        try:
+            tecnicos = conn.execute("SELECT id_tecnico, especialidad FROM tecnicos WHERE activo = 1").fetchall()
+            niveles = {row[0]: row[1] for row in conn.execute("SELECT id_prioridad, nivel FROM prioridades")}
+            tipos = {row[0]: (row[2], ESPECIALIDADES_POR_TIPO.get(normalize(row[1]), ()))
+                     for row in conn.execute("SELECT id_tipo_tarea, nombre, tiempo_estimado_horas FROM tipos_tarea")}
+            finales = {row[0] for row in conn.execute("SELECT id_estado FROM estados_ticket WHERE es_final = 1")}
+            flujo = [row[0] for row in conn.execute(db.ASSIGNMENT_FLOW_QUERY)]
+            cargas = {row['id_tecnico']: (row['carga'] or 0.0, row['abiertos']) for row in conn.execute(_CARGAS_QUERY)}
+        except db.sqlite3.Error as e:
+            print(f"Error al cargar el estado de la asignación automática: {e}")
+            return False
+        finally:
+            conn.close()
+        with self._lock:
+            self._niveles, self._tipos, self._finales = niveles, tipos, finales
+            self._flujo = tuple(flujo) if len(flujo) == 2 else (None, None)
+            self._especialidad = {row[0]: normalize(row[1]) for row in tecnicos}
+            self._carga = {id_tecnico: cargas.get(id_tecnico, (0.0, 0))[0] for id_tecnico in self._especialidad}
+            self._abiertos = {id_tecnico: cargas.get(id_tecnico, (0.0, 0))[1] for id_tecnico in self._especialidad}
+            self._heaps = {}
+            for id_tecnico, especialidad in self._especialidad.items():
+                for key in (especialidad, _TODOS):
+                    self._heaps.setdefault(key, []).append((self._carga[id_tecnico], id_tecnico))
+            for heap in self._heaps.values():
+                heapq.heapify(heap)
+            self._versions = versions
+            self._loaded_at = self._checked_at = time.monotonic()
+        return True
+
+    def _ensure_loaded(self, check_versions=False):
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > RELOAD_INTERVAL:
+            return self.load()
+        if check_versions or now - self._checked_at >= VERSION_CHECK_INTERVAL:
+            self._checked_at = now
+            if self._catalog_versions() != self._versions:
+                return self.load()
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _push(self, id_tecnico):
+        entry = (self._carga[id_tecnico], id_tecnico)
+        for key in (self._especialidad[id_tecnico], _TODOS):
+            heap = self._heaps[key]
+            heapq.heappush(heap, entry)
+            if len(heap) > 4 * len(self._especialidad) + 16: # Demasiadas entradas obsoletas: se compacta
+                self._heaps[key] = heap = [(self._carga[t], t) for t in self._especialidad if key is _TODOS or self._especialidad[t] == key]
+                heapq.heapify(heap)
+
+    def _peek(self, key):
+        """Cima válida del heap `key`, descartando las entradas obsoletas (cargas que ya cambiaron)."""
+        heap = self._heaps.get(key)
+        while heap:
+            carga, id_tecnico = heap[0]
+            if self._carga.get(id_tecnico) == carga and (key is _TODOS or self._especialidad.get(id_tecnico) == key):
+                return carga, id_tecnico
+            heapq.heappop(heap)
+        return None
+
+    def _adjust(self, id_tecnico, peso, abiertos):
+        if id_tecnico not in self._carga: # Técnico inactivo o desconocido: no participa en la asignación
+            return
+        self._carga[id_tecnico] += peso
+        self._abiertos[id_tecnico] += abiertos
+        self._push(id_tecnico)
+
+    # --- Tickets ---
+
+    def ticket_weight(self, id_tipo_tarea, id_prioridad, tiempo_estimado_horas=None):
+        """Carga que aporta un ticket abierto: horas estimadas por el peso de su nivel de prioridad."""
+        horas = tiempo_estimado_horas or (self._tipos.get(id_tipo_tarea) or (None,))[0] or HORAS_POR_DEFECTO
+        return horas * PESOS_NIVEL.get(self._niveles.get(id_prioridad), 1.0)
+
+    def _contribution(self, ticket):
+        if not ticket or ticket.get('id_tecnico_asignado') is None or ticket.get('id_estado') in self._finales:
+            return None
+        return ticket['id_tecnico_asignado'], self.ticket_weight(ticket.get('id_tipo_tarea'), ticket.get('id_prioridad'),
+                                                                 ticket.get('tiempo_estimado_horas'))
+
+    def on_ticket_change(self, old, new):
+        """Listener de database.py: resta la aportación anterior del ticket y suma la nueva."""
+        with self._lock:
+            if self._loaded_at is None: # Sin estado cargado no hay nada que ajustar: load() leerá el ticket
+                return
+            for ticket, sign in ((old, -1), (new, +1)):
+                contribution = self._contribution(ticket)
+                if contribution:
+                    self._adjust(contribution[0], sign * contribution[1], sign)
+
+    def _best(self, id_tipo_tarea, exclude=()):
+        especialidades = [e for e in (self._tipos.get(id_tipo_tarea) or (None, ()))[1] if e in self._heaps]
+        best = None
+        for key in especialidades or [_TODOS]:
+            top = self._peek(key)
+            if top and top[1] not in exclude and (best is None or top < best):
+                best = top
+        if best is None and exclude: # La cima está excluida: se busca fuera del heap (caso raro)
+            candidates = [(self._carga[t], t) for t in self._carga if t not in exclude
+                          and (not especialidades or self._especialidad[t] in especialidades)]
+            best = min(candidates, default=None)
+        return best[1] if best else None
+
+    def suggest(self, id_tipo_tarea, exclude=()):
+        """Técnico activo menos cargado que atiende el tipo de tarea (None si no hay ninguno)."""
+        with self._lock:
+            if not self._ensure_loaded():
+                return None
+            return self._best(id_tipo_tarea, exclude)
+
+    def snapshot(self):
+        """Carga actual de cada técnico activo, de menor a mayor."""
+        with self._lock:
+            if not self._ensure_loaded():
+                return []
+            return sorted(({'id_tecnico': t, 'especialidad': self._especialidad[t], 'carga': self._carga[t],
+                            'tickets_abiertos': self._abiertos[t]} for t in self._carga), key=lambda row: (row['carga'], row['id_tecnico']))
+
+    def assign_backlog(self, limit=None, dry_run=False):
+        """Asigna los tickets abiertos sin técnico, por prioridad y antigüedad, en una sola transacción.
+
+        Cada ticket va al técnico menos cargado de su especialidad en ese momento (la carga se actualiza
+        ticket a ticket). El reparto se calcula bajo el bloqueo del motor y se aplica después a través
+        de la cola de escritura; un ticket que otro proceso haya asignado entretanto se omite. Devuelve
+        la lista de (id_ticket, id_tecnico) asignados o None si hay un error; con dry_run solo se
+        calcula el reparto.
+        """
+        with self._lock:
+            if not self._ensure_loaded(check_versions=True): # Un técnico recién dado de baja no recibe tickets
+                return None
+            inicial, asignado = self._flujo
+        conn = db.get_db_connection()
+        if not conn: return None
+        try:
+            backlog = conn.execute(_BACKLOG_QUERY, (-1 if limit is None else limit,)).fetchall()
+        except db.sqlite3.Error as e:
+            print(f"Error al leer el backlog de tickets: {e}")
+            return None
+        finally:
+            conn.close()
+
+        with self._lock:
+            plan, applied = [], {}
+            for ticket in backlog:
+                id_tecnico = self._best(ticket['id_tipo_tarea'])
+                if id_tecnico is None:
+                    continue
+                peso = self.ticket_weight(ticket['id_tipo_tarea'], ticket['id_prioridad'], ticket['tiempo_estimado_horas'])
+                self._adjust(id_tecnico, peso, 1)
+                applied[ticket['id_ticket']] = (id_tecnico, peso)
+                plan.append((ticket['id_ticket'], id_tecnico))
+            if dry_run:
+                for id_tecnico, peso in applied.values():
+                    self._adjust(id_tecnico, -peso, -1)
+                return plan
+        if not plan:
+            return plan
+
+        def assign(conn):
+            # Solo los tickets que siguen sin técnico: la comprobación y el UPDATE van en la misma transacción
+            pending = {row[0] for row in conn.execute(
+                "SELECT id_ticket FROM tickets WHERE id_tecnico_asignado IS NULL AND id_ticket IN (SELECT value FROM json_each(?))",
+                (json.dumps([id_ticket for id_ticket, _ in plan]),))}
+            conn.executemany(_ASSIGN_SQL, [(id_tecnico, inicial, asignado, id_ticket)
+                                           for id_ticket, id_tecnico in plan if id_ticket in pending])
+            return pending
+
+        try:
+            pending = db.execute_write(assign, ('tickets',))
+        except db.sqlite3.Error as e:
+            self.invalidate() # Las cargas ya ajustadas no se aplicaron: se recargan en el próximo uso
+            print(f"Error al asignar el backlog de tickets: {e}")
+            return None
+        with self._lock:
+            for id_ticket, _ in plan:
+                if id_ticket not in pending: # Asignado entretanto por otra vía: no cuenta para este técnico
+                    id_tecnico, peso = applied[id_ticket]
+                    self._adjust(id_tecnico, -peso, -1)
+        return [(id_ticket, id_tecnico) for id_ticket, id_tecnico in plan if id_ticket in pending]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Motor de la base de datos actual, creándolo (y registrando su listener) si hace falta."""
+    global _engine
+    with _engine_lock:
+        if _engine is None or _engine.database != db.DATABASE_NAME:
+            if _engine is not None:
+                db.remove_ticket_listener(_engine.on_ticket_change)
+            _engine = AssignmentEngine(db.DATABASE_NAME)
+            db.add_ticket_listener(_engine.on_ticket_change)
+        return _engine
+
+def suggest_tecnico(id_tipo_tarea):
+    return get_engine().suggest(id_tipo_tarea)
+
+def assign_backlog(limit=None, dry_run=False):
+    return get_engine().assign_backlog(limit=limit, dry_run=dry_run)
@@ -0,0 +1,635 @@
+"""Benchmarks de rendimiento del sistema de tickets.
+
+Uso:
+    python benchmark.py storage [--seconds 5] [--readers 2] [--writers 2] [--tickets 5000]
+    python benchmark.py queries --db datos.db [--repeat 50] [--full-listing]
+    python benchmark.py suite [--sizes 1000,100000,1000000] [--output resultados.json]
+                              [--baseline baseline.json [--threshold 0.25] | --save-baseline baseline.json]
+    python benchmark.py sla [--sizes 100000,1000000] [--repeat 3] [--chunk-size 100000]
+    python benchmark.py frames [--sizes 100000,1000000] [--rows 100000] [--repeat 3]
+    python benchmark.py stress [--seconds 5] [--writers 16] [--readers 8] [--holders 1] [--hold-ms 200]
+                               [--busy-timeout 50] [--modes queue,direct]
+
+Para las consultas, genera antes un dataset con populate.py, por ejemplo:
+    python populate.py --db datos.db --tickets 1000000 --actividades 3 --sesgo 1.1 --semilla 7
+
+La suite genera (y reutiliza) sus propios datasets en .bench_data/ y termina con código 1 si
+algún p95 empeora más que --threshold respecto a la baseline guardada.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import database as db
+import populate
+import sla
+
+
+# --- Utilidades comunes ---
+
+@contextlib.contextmanager
+def temporary_database(name):
+    """Apunta database.py a una base de datos temporal inicializada y la restaura al salir."""
+    original_name = db.DATABASE_NAME
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DATABASE_NAME = os.path.join(tmp, name)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.initialize_database()
+            yield db.DATABASE_NAME
+        finally:
+            db.configure_pool() # Cierra las conexiones antes de borrar el directorio
+            db.DATABASE_NAME = original_name
+
+def seed_tickets(count, seed=42):
+    """Inserta `count` tickets aleatorios con executemany en una sola transacción."""
+    rnd = random.Random(seed)
+    conn = db.get_db_connection()
+    try:
+        ids = {}
+        for table, column in (('clientes', 'id_cliente'), ('tecnicos', 'id_tecnico'), ('tipos_tarea', 'id_tipo_tarea'),
+                              ('prioridades', 'id_prioridad'), ('estados_ticket', 'id_estado')):
+            ids[table] = [row[0] for row in conn.execute(f"SELECT {column} FROM {table}")]
+        rows = (
+            (f"SEED-{i:08d}", rnd.choice(ids['clientes']), rnd.choice(ids['tecnicos'] + [None]),
+             rnd.choice(ids['tipos_tarea']), rnd.choice(ids['prioridades']), rnd.choice(ids['estados_ticket']),
+             f"Ticket de carga #{i}", "Generado por benchmark.py", round(rnd.uniform(0.5, 8.0), 2))
+            for i in range(1, count + 1)
+        )
+        conn.executemany('''
+            INSERT INTO tickets (numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, tiempo_estimado_horas)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# --- Benchmark de almacenamiento: lecturas y escrituras concurrentes ---
+
+def run_storage_benchmark(profile, seconds, readers, writers, tickets):
+    """Mide lecturas/s y escrituras/s concurrentes con un perfil de almacenamiento."""
+    original_profile, original_size = db.STORAGE_PROFILE, db.POOL_SIZE
+    db.configure_storage(profile)
+    db.configure_pool(size=readers + writers + 1)
+    try:
+        with temporary_database(f"bench_storage_{profile}.db"):
+            seed_tickets(tickets)
+            stop = threading.Event()
+            lock = threading.Lock()
+            totals = {'lecturas': 0, 'escrituras': 0, 'fallos': 0}
+
+            def reader():
+                rnd = random.Random()
+                done = 0
+                while not stop.is_set():
+                    db.get_ticket_by_id(rnd.randint(1, tickets))
+                    done += 1
+                with lock:
+                    totals['lecturas'] += done
+
+            def writer(worker):
+                done = failed = 0
+                while not stop.is_set():
+                    ok = db.add_ticket(f"W{worker}-{done + failed:08d}", 1, None, 1, 3, 1,
+                                       "Escritura concurrente", "benchmark.py storage", 1.0)
+                    if ok:
+                        done += 1
+                    else:
+                        failed += 1
+                with lock:
+                    totals['escrituras'] += done
+                    totals['fallos'] += failed
+
+            threads = [threading.Thread(target=reader) for _ in range(readers)]
+            threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            return {key: value / seconds for key, value in totals.items()}
+    finally:
+        db.configure_storage(original_profile)
+        db.configure_pool(size=original_size)
+
+def storage_command(args):
+    print(f"Lectores: {args.readers}, escritores: {args.writers}, duración: {args.seconds}s, tickets iniciales: {args.tickets}")
+    results = {}
+    for profile in args.profiles:
+        print(f"Midiendo perfil '{profile}'...")
+        results[profile] = run_storage_benchmark(profile, args.seconds, args.readers, args.writers, args.tickets)
+    print(f"\n{'perfil':<10} {'lecturas/s':>12} {'escrituras/s':>14} {'fallos/s':>10}")
+    for profile, result in results.items():
+        print(f"{profile:<10} {result['lecturas']:>12.0f} {result['escrituras']:>14.0f} {result['fallos']:>10.1f}")
+
+
+# --- Prueba de estrés: muchos hilos contra un mismo fichero ---
+
+def run_stress(mode, seconds, writers, readers, holders, hold_ms, duplicate_every, tickets):
+    """Escritores, lectores y conexiones externas que retienen el bloqueo de escritura a la vez.
+
+    Los escritores van por db.execute_write (cola o directo, según `mode`) y cada `duplicate_every`
+    escrituras insertan un numero_ticket repetido: ese IntegrityError debe fallar al momento, sin
+    reintentos. Los `holders` son conexiones sqlite3 propias, como otro proceso, que toman el bloqueo
+    con BEGIN IMMEDIATE y lo retienen `hold_ms` ms.
+    """
+    original_queue = db.WRITE_QUEUE_ENABLED
+    db.WRITE_QUEUE_ENABLED = mode == 'queue'
+    try:
+        with temporary_database(f"bench_stress_{mode}.db") as path:
+            seed_tickets(tickets)
+            db.reset_lock_stats()
+            queue_before = db.get_write_queue_stats()
+            stop = threading.Event()
+            lock = threading.Lock()
+            latencies = {'escritura': [], 'lectura': []}
+            totals = {'escrituras': 0, 'lecturas': 0, 'bloqueos_externos': 0, 'error_bloqueo': 0,
+                      'error_integridad': 0, 'otros_errores': 0}
+
+            def writer(worker):
+                rnd = random.Random(worker)
+                attempts = 0
+                while not stop.is_set():
+                    attempts += 1
+                    duplicate = duplicate_every and attempts % duplicate_every == 0
+                    numero = 'SEED-00000001' if duplicate else f"S{worker}-{attempts:08d}"
+                    id_ticket = rnd.randint(1, tickets)
+                    def operation(conn):
+                        conn.execute("UPDATE tickets SET tiempo_estimado_horas = tiempo_estimado_horas + 1 WHERE id_ticket = ?", (id_ticket,))
+                        conn.execute("INSERT INTO tickets (numero_ticket, id_cliente, id_tipo_tarea, id_prioridad, id_estado, titulo) "
+                                     "VALUES (?, 1, 1, 3, 1, 'Prueba de estrés')", (numero,))
+                    started = time.perf_counter()
+                    try:
+                        db.execute_write(operation)
+                        outcome = 'escrituras'
+                    except sqlite3.IntegrityError:
+                        outcome = 'error_integridad'
+                    except sqlite3.Error as e:
+                        outcome = 'error_bloqueo' if db.is_busy_error(e) else 'otros_errores'
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        totals[outcome] += 1
+                        latencies['escritura'].append(elapsed)
+
+            def reader():
+                rnd = random.Random()
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    db.get_ticket_by_id(rnd.randint(1, tickets))
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        totals['lecturas'] += 1
+                        latencies['lectura'].append(elapsed)
+
+            def holder():
+                # Conexión ajena al pool: para la aplicación se comporta como otro proceso
+                conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+                rnd = random.Random()
+                try:
+                    while not stop.is_set():
+                        conn.execute("BEGIN IMMEDIATE")
+                        conn.execute("UPDATE tickets SET titulo = titulo WHERE id_ticket = ?", (rnd.randint(1, tickets),))
+                        stop.wait(hold_ms / 1000)
+                        conn.execute("COMMIT")
+                        with lock:
+                            totals['bloqueos_externos'] += 1
+                        stop.wait(hold_ms / 1000) # Deja el mismo tiempo libre a los demás
+                finally:
+                    conn.close()
+
+            threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+            threads += [threading.Thread(target=reader) for _ in range(readers)]
+            threads += [threading.Thread(target=holder) for _ in range(holders)]
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            result = dict(totals, escrituras_por_s=totals['escrituras'] / seconds, lecturas_por_s=totals['lecturas'] / seconds)
+            for kind, values in latencies.items():
+                values.sort()
+                result[f'{kind}_p50_ms'] = 1000 * percentile(values, 50)
+                result[f'{kind}_p95_ms'] = 1000 * percentile(values, 95)
+                result[f'{kind}_max_ms'] = 1000 * (values[-1] if values else 0.0)
+            queue_after = db.get_write_queue_stats()
+            lotes = queue_after['lotes'] - queue_before['lotes']
+            result['lote_medio'] = (queue_after['operaciones'] - queue_before['operaciones']) / lotes if lotes else 0.0
+            result['bloqueos'] = db.get_lock_stats()
+            return result
+    finally:
+        db.WRITE_QUEUE_ENABLED = original_queue
+
+def stress_command(args):
+    original_size = db.POOL_SIZE
+    db.configure_pool(size=args.writers + args.readers + 2)
+    if args.busy_timeout is not None:
+        db.configure_storage(busy_timeout=args.busy_timeout)
+    print(f"Escritores: {args.writers}, lectores: {args.readers}, conexiones externas: {args.holders} ({args.hold_ms:.0f} ms), "
+          f"busy_timeout: {db.get_storage_settings()['busy_timeout']} ms, plazo de reintentos: {db.BUSY_RETRY_DEADLINE:.0f} s")
+    results = {}
+    try:
+        for mode in args.modes.split(','):
+            print(f"Midiendo modo '{mode}'...")
+            results[mode] = run_stress(mode, args.seconds, args.writers, args.readers, args.holders,
+                                       args.hold_ms, args.duplicate_every, args.tickets)
+    finally:
+        db.configure_storage(db.STORAGE_PROFILE) # Descarta el busy_timeout de la prueba
+        db.configure_pool(size=original_size)
+
+    print(f"\n{'modo':<8} {'escr/s':>8} {'lect/s':>8} {'escr p50':>9} {'escr p95':>9} {'escr max':>9} "
+          f"{'lect p95':>9} {'bloqueo':>8} {'integr.':>8} {'otros':>6}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['escrituras_por_s']:>8.0f} {r['lecturas_por_s']:>8.0f} {r['escritura_p50_ms']:>9.2f} "
+              f"{r['escritura_p95_ms']:>9.2f} {r['escritura_max_ms']:>9.1f} {r['lectura_p95_ms']:>9.2f} "
+              f"{r['error_bloqueo']:>8} {r['error_integridad']:>8} {r['otros_errores']:>6}")
+    for mode, r in results.items():
+        print(f"\nEsperas por bloqueos en modo '{mode}' ({r['bloqueos_externos']} bloqueos externos, lote medio {r['lote_medio']:.1f}):")
+        print(f"  {'operación':<24} {'ejec.':>7} {'esperan':>8} {'reintentos':>10} {'agotados':>9} {'total ms':>10} {'media ms':>9} {'max ms':>8}")
+        for kind, s in sorted(r['bloqueos'].items()):
+            print(f"  {kind:<24} {s['ejecuciones']:>7} {s['con_espera']:>8} {s['reintentos']:>10} {s['agotados']:>9} "
+                  f"{s['espera_ms']:>10.1f} {s['espera_media_ms']:>9.2f} {s['espera_max_ms']:>8.1f}")
+    # Un error que no sea de bloqueo ni el IntegrityError provocado indica un fallo real
+    return 1 if any(r['otros_errores'] for r in results.values()) else 0
+
+
+# --- Consultas calientes de database.py ---
+
+def time_call(func, repeat, warmup=1):
+    """Ejecuta `func` warmup + repeat veces y devuelve la duración (s) de las `repeat` medidas."""
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def build_hot_queries(seed=0, full_listing=False):
+    """(nombre, función sin argumentos) de las consultas que ejecuta la app al renderizar cada página."""
+    conn = db.get_db_connection()
+    try:
+        max_id = conn.execute("SELECT MAX(id_ticket) FROM tickets").fetchone()[0] or 1
+        top_cliente = conn.execute("SELECT id_cliente FROM tickets GROUP BY id_cliente ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+        top_cliente = top_cliente[0] if top_cliente else None
+    finally:
+        conn.close()
+    _, second_page = db.get_tickets_page()
+    rnd = random.Random(seed)
+
+    def cold(func):
+        def run():
+            db.invalidate_catalog()
+            return func()
+        return run
+
+    queries = [
+        ('get_tickets_page', lambda: db.get_tickets_page()),
+        ('get_tickets_page[pagina 2]', lambda: db.get_tickets_page(after=second_page)),
+        ('get_tickets_page[cliente]', lambda: db.get_tickets_page(filters={'id_cliente': top_cliente})),
+        ('get_tickets_page[estado]', lambda: db.get_tickets_page(filters={'id_estado': 1})),
+        ('get_ticket_by_id', lambda: db.get_ticket_by_id(rnd.randint(1, max_id))),
+        ('get_dashboard_counters', db.get_dashboard_counters),
+        ('get_tecnicos_catalog[fria]', cold(db.get_tecnicos_catalog)),
+        ('get_tecnicos_catalog', db.get_tecnicos_catalog),
+        ('get_clientes_catalog[fria]', cold(db.get_clientes_catalog)),
+        ('get_tecnicos', db.get_tecnicos),
+        ('get_clientes', db.get_clientes),
+    ]
+    if full_listing:
+        queries.append(('get_tickets', db.get_tickets))
+    return queries
+
+def queries_command(args):
+    original_name = db.DATABASE_NAME
+    db.DATABASE_NAME = args.db
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.initialize_database()
+        counters = db.get_dashboard_counters()
+        print(f"Base de datos: {args.db} ({counters.get('total_tickets', 0)} tickets), {args.repeat} repeticiones")
+        print(f"\n{'consulta':<30} {'media ms':>10} {'min ms':>10} {'max ms':>10}")
+        for name, func in build_hot_queries(full_listing=args.full_listing):
+            durations = time_call(func, args.repeat)
+            print(f"{name:<30} {1000 * sum(durations) / len(durations):>10.3f} {1000 * min(durations):>10.3f} {1000 * max(durations):>10.3f}")
+    finally:
+        db.configure_pool()
+        db.DATABASE_NAME = original_name
+
+
+# --- Suite de benchmarks con umbral de regresión ---
+
+BENCH_DATA_DIR = '.bench_data'
+DEFAULT_SIZES = (1000, 100000, 1000000)
+REGRESSION_THRESHOLD = 0.25 # +25% de p95 respecto a la baseline
+REGRESSION_MIN_MS = 0.05 # Diferencias menores se consideran ruido
+
+def ensure_dataset(size, data_dir=BENCH_DATA_DIR):
+    """Devuelve la ruta de un dataset de `size` tickets, generándolo con populate.py si no existe."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"tickets_{size}.db")
+    if os.path.exists(path):
+        return path
+    print(f"Generando dataset de {size} tickets en {path}...")
+    partial = f"{path}.partial"
+    for leftover in (partial, f"{partial}-wal", f"{partial}-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    original_name = db.DATABASE_NAME
+    db.DATABASE_NAME = partial
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            populate.populate_database(tecnicos=max(10, size // 2000), clientes=max(20, size // 500), tickets=size,
+                                       actividades_por_ticket=2, dias=365, sesgo=1.0, semilla=size)
+    finally:
+        db.configure_pool() # Cierra las conexiones: el WAL se integra en el archivo principal
+        db.DATABASE_NAME = original_name
+    os.replace(partial, path)
+    return path
+
+def build_write_ops(run_id):
+    """add_ticket, update_ticket y delete_ticket sobre tickets propios, que se borran al final."""
+    numbers = itertools.count()
+    created = []
+
+    def add():
+        db.add_ticket(f"BENCH-{run_id}-{next(numbers)}", 1, None, 1, 3, 1, "Ticket de benchmark", "benchmark.py suite", 1.0)
+
+    def load_created():
+        if not created:
+            conn = db.get_db_connection()
+            try:
+                created.extend(row[0] for row in conn.execute(
+                    "SELECT id_ticket FROM tickets WHERE numero_ticket LIKE ?", (f"BENCH-{run_id}-%",)))
+            finally:
+                conn.close()
+        return created
+
+    positions = itertools.count()
+
+    def update():
+        ids = load_created()
+        id_ticket = ids[next(positions) % len(ids)]
+        db.update_ticket(id_ticket, f"BENCH-{run_id}-U{id_ticket}", 1, None, 1, 2, 2, "Ticket de benchmark (editado)",
+                         "benchmark.py suite", None, None, 2.0)
+
+    def delete():
+        ids = load_created()
+        if ids:
+            db.delete_ticket(ids.pop())
+
+    return [('add_ticket', add), ('update_ticket', update), ('delete_ticket', delete)]
+
+def percentile(sorted_values, q):
+    """Percentil q (0-100) con interpolación lineal sobre valores ya ordenados."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def peak_memory_kib(func):
+    """Pico de memoria de Python asignada durante una llamada (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+def measure(func, repeat):
+    durations = sorted(time_call(func, repeat))
+    return {
+        'p50_ms': 1000 * percentile(durations, 50),
+        'p95_ms': 1000 * percentile(durations, 95),
+        'p99_ms': 1000 * percentile(durations, 99),
+        'ops_por_s': len(durations) / sum(durations) if sum(durations) else 0.0,
+        'memoria_pico_kib': peak_memory_kib(func), # Pasada aparte: tracemalloc distorsiona los tiempos
+    }
+
+def run_suite(sizes, repeat, data_dir=BENCH_DATA_DIR):
+    results = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'repeticiones': repeat,
+        'resultados': {},
+    }
+    original_name = db.DATABASE_NAME
+    try:
+        for size in sizes:
+            db.DATABASE_NAME = ensure_dataset(size, data_dir)
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.initialize_database()
+            print(f"\nDataset de {size} tickets:")
+            print(f"{'función':<30} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'pico KiB':>9}")
+            size_results = results['resultados'][str(size)] = {}
+            operations = build_hot_queries(seed=size) + build_write_ops(f"{os.getpid()}-{size}")
+            for name, func in operations:
+                size_results[name] = metrics = measure(func, repeat)
+                print(f"{name:<30} {metrics['p50_ms']:>9.3f} {metrics['p95_ms']:>9.3f} {metrics['p99_ms']:>9.3f} "
+                      f"{metrics['ops_por_s']:>10.0f} {metrics['memoria_pico_kib']:>9.1f}")
+            db.configure_pool()
+    finally:
+        db.DATABASE_NAME = original_name
+    return results
+
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD, min_ms=REGRESSION_MIN_MS):
+    """Lista de (tamaño, función, p95 baseline, p95 actual) que empeoran más que `threshold`."""
+    regressions = []
+    for size, functions in results['resultados'].items():
+        for name, metrics in functions.items():
+            reference = baseline.get('resultados', {}).get(size, {}).get(name)
+            if not reference:
+                continue
+            before, after = reference['p95_ms'], metrics['p95_ms']
+            if after > before * (1 + threshold) and after - before > min_ms:
+                regressions.append((size, name, before, after))
+    return regressions
+
+def suite_command(args):
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run_suite(sizes, args.repeat, args.data_dir)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Baseline guardada en {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold, args.min_ms)
+        for size, name, before, after in regressions:
+            print(f"REGRESIÓN [{size} tickets] {name}: p95 {before:.3f} ms -> {after:.3f} ms (+{100 * (after / before - 1):.0f}%)")
+        if regressions:
+            return 1
+        print(f"Sin regresiones respecto a {args.baseline} (umbral +{100 * args.threshold:.0f}% en p95).")
+    return 0
+
+
+# --- Métricas de SLA: NumPy vectorizado frente a un bucle por ticket ---
+
+def python_sla_percentiles(rows, column, until='cierre'):
+    """Referencia por fila: percentiles de asignación o resolución por grupo con listas y diccionarios."""
+    index = sla._LOAD_COLUMNS.index(column)
+    creacion, fin = sla._LOAD_COLUMNS.index('creacion'), sla._LOAD_COLUMNS.index(until)
+    groups = {}
+    for row in rows:
+        if row[fin] != db.EPOCH_NAT and row[creacion] != db.EPOCH_NAT:
+            groups.setdefault(row[index], []).append((row[fin] - row[creacion]) / 3600)
+    return {key: [percentile(sorted(values), q) for q in sla.PERCENTILES] for key, values in groups.items()}
+
+def python_sla(rows):
+    return [python_sla_percentiles(rows, column, until) for column, _ in sla.DIMENSIONES.values() for until in ('asignacion', 'cierre')]
+
+def vectorized_sla(times):
+    metrics = sla.compute_ticket_metrics(times)
+    return {dimension: sla.summarize_by(times[column], metrics) for dimension, (column, _) in sla.DIMENSIONES.items()}
+
+def sla_command(args):
+    original_name = db.DATABASE_NAME
+    try:
+        print(f"{'tickets':>9} {'carga ms':>10} {'numpy ms':>10} {'python ms':>10} {'x':>6}")
+        for size in (int(size) for size in args.sizes.split(',')):
+            db.DATABASE_NAME = ensure_dataset(size, args.data_dir)
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.initialize_database()
+            load = min(time_call(lambda: sla.load_ticket_times(chunk_size=args.chunk_size), args.repeat))
+            times = sla.load_ticket_times(chunk_size=args.chunk_size)
+            vectorized = min(time_call(lambda: vectorized_sla(times), args.repeat))
+            rows = list(zip(*(times[name].astype(np.int64).tolist() for name in sla._LOAD_COLUMNS)))
+            per_row = min(time_call(lambda: python_sla(rows), args.repeat, warmup=0))
+            # Comprobación: los mismos percentiles de resolución por prioridad en ambas versiones
+            reference = python_sla_percentiles(rows, 'id_prioridad')
+            for row in vectorized_sla(times)['prioridad']:
+                expected = reference.get(row['id'], [None] * len(sla.PERCENTILES))
+                got = [row[f'resolucion_p{q}_h'] for q in sla.PERCENTILES]
+                if any(abs(a - b) > 1e-6 for a, b in zip(expected, got) if a is not None and b is not None):
+                    print(f"DIFERENCIA en la prioridad {row['id']}: {got} != {expected}")
+                    return 1
+            print(f"{size:>9} {1000 * load:>10.1f} {1000 * vectorized:>10.1f} {1000 * per_row:>10.1f} {per_row / vectorized:>6.1f}")
+            db.configure_pool()
+    finally:
+        db.DATABASE_NAME = original_name
+    return 0
+
+def rows_listing(rows):
+    """Listado como lo construía app.py: lista de sqlite3.Row -> DataFrame y fechas parseadas desde texto."""
+    page, _ = db.get_tickets_page(limit=rows)
+    frame = pd.DataFrame([tuple(row) for row in page], columns=page[0].keys() if page else None)
+    frame['fecha_creacion'] = pd.to_datetime(frame['fecha_creacion'], format='ISO8601')
+    return frame
+
+def columnar_listing(rows):
+    return db.get_tickets_frame(limit=rows)[0]
+
+def frames_command(args):
+    original_name = db.DATABASE_NAME
+    try:
+        print(f"{'tickets':>9} {'filas':>8} {'ruta':>9} {'ms':>9} {'pico KiB':>10} {'df KiB':>9}")
+        for size in (int(size) for size in args.sizes.split(',')):
+            db.DATABASE_NAME = ensure_dataset(size, args.data_dir)
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.initialize_database()
+            db.configure_pool()
+            rows = min(args.rows, size)
+            frames = {}
+            for name, builder in (('filas', rows_listing), ('columnas', columnar_listing)):
+                elapsed = min(time_call(lambda: builder(rows), args.repeat))
+                peak = peak_memory_kib(lambda: builder(rows))
+                frames[name] = builder(rows)
+                memory = frames[name].memory_usage(deep=True).sum() / 1024
+                print(f"{size:>9} {len(frames[name]):>8} {name:>9} {1000 * elapsed:>9.1f} {peak:>10.0f} {memory:>9.0f}")
+            # Comprobación: mismos tickets en el mismo orden y mismos nombres de estado
+            old, new = frames['filas'], frames['columnas']
+            if old['id_ticket'].tolist() != new['id_ticket'].tolist() or old['estado'].tolist() != new['estado'].astype(object).tolist():
+                print(f"DIFERENCIA entre los dos listados con {size} tickets")
+                return 1
+    finally:
+        db.DATABASE_NAME = original_name
+        db.configure_pool()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del sistema de tickets.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    storage = subparsers.add_parser('storage', help="Throughput de lectura/escritura concurrente por perfil de almacenamiento.")
+    storage.add_argument('--profiles', nargs='+', default=['legacy', 'tuned'], choices=sorted(db.STORAGE_PROFILES))
+    storage.add_argument('--seconds', type=float, default=5)
+    storage.add_argument('--readers', type=int, default=2, help="Hilos lectores; con muchos, los escritores se quedan sin GIL y se mide el intérprete, no SQLite.")
+    storage.add_argument('--writers', type=int, default=2)
+    storage.add_argument('--tickets', type=int, default=5000)
+    storage.set_defaults(func=storage_command)
+
+    queries = subparsers.add_parser('queries', help="Latencia de las consultas calientes de database.py sobre un dataset.")
+    queries.add_argument('--db', required=True, help="Base de datos generada con populate.py.")
+    queries.add_argument('--repeat', type=int, default=50)
+    queries.add_argument('--full-listing', action='store_true', help="Incluye get_tickets() completo (lento en datasets grandes).")
+    queries.set_defaults(func=queries_command)
+
+    suite = subparsers.add_parser('suite', help="Suite completa por tamaño de dataset con comparación contra baseline.")
+    suite.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES), help="Tamaños en tickets, separados por comas.")
+    suite.add_argument('--repeat', type=int, default=30)
+    suite.add_argument('--data-dir', default=BENCH_DATA_DIR, help="Directorio donde se guardan los datasets generados.")
+    suite.add_argument('--output', default='bench_results.json')
+    suite.add_argument('--baseline', help="JSON de una ejecución anterior contra el que comparar.")
+    suite.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="Empeoramiento relativo de p95 tolerado (0.25 = +25%%).")
+    suite.add_argument('--min-ms', type=float, default=REGRESSION_MIN_MS, help="Diferencia absoluta de p95 (ms) por debajo de la cual no se considera regresión.")
+    suite.add_argument('--save-baseline', help="Guarda también los resultados como baseline en esta ruta.")
+    suite.set_defaults(func=suite_command)
+
+    sla_parser = subparsers.add_parser('sla', help="Métricas de SLA vectorizadas frente a un cálculo por ticket en Python.")
+    sla_parser.add_argument('--sizes', default='100000,1000000', help="Tamaños en tickets, separados por comas.")
+    sla_parser.add_argument('--repeat', type=int, default=3)
+    sla_parser.add_argument('--chunk-size', type=int, default=sla.CHUNK_SIZE)
+    sla_parser.add_argument('--data-dir', default=BENCH_DATA_DIR)
+    sla_parser.set_defaults(func=sla_command)
+
+    frames = subparsers.add_parser('frames', help="Listado de tickets como DataFrame: filas sqlite3.Row frente a lectura en columnas tipadas.")
+    frames.add_argument('--sizes', default='100000,1000000', help="Tamaños en tickets, separados por comas.")
+    frames.add_argument('--rows', type=int, default=100000, help="Filas del listado que se convierten a DataFrame.")
+    frames.add_argument('--repeat', type=int, default=3)
+    frames.add_argument('--data-dir', default=BENCH_DATA_DIR)
+    frames.set_defaults(func=frames_command)
+
+    stress = subparsers.add_parser('stress', help="Muchos hilos y conexiones externas contra un mismo fichero: reintentos y esperas por bloqueos.")
+    stress.add_argument('--seconds', type=float, default=5)
+    stress.add_argument('--writers', type=int, default=16)
+    stress.add_argument('--readers', type=int, default=8)
+    stress.add_argument('--holders', type=int, default=1, help="Conexiones externas que retienen el bloqueo de escritura.")
+    stress.add_argument('--hold-ms', type=float, default=200, help="Milisegundos que cada conexión externa retiene el bloqueo.")
+    stress.add_argument('--busy-timeout', type=int, help="busy_timeout (ms) de las conexiones del pool; por defecto el del perfil.")
+    stress.add_argument('--duplicate-every', type=int, default=50, help="Cada cuántas escrituras se fuerza un IntegrityError (0 = nunca).")
+    stress.add_argument('--modes', default='queue,direct', help="Modos de escritura separados por comas: queue, direct.")
+    stress.add_argument('--tickets', type=int, default=5000)
+    stress.set_defaults(func=stress_command)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args) or 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Importación masiva de tickets desde CSV o JSONL.
+
+Lee el archivo en streaming, resuelve los nombres de catálogo (cliente, técnico, tipo de tarea,
+prioridad, estado) a IDs con mapas en memoria e inserta con executemany, una transacción por lote.
+Las filas que no se pueden importar (numero_ticket duplicado, catálogo desconocido, valor inválido)
+se escriben en un archivo de rechazos en lugar de abortar la carga.
+
+Uso:
+    python manage.py import tickets.csv [--batch-size 5000] [--rejects rechazados.jsonl] [--rebuild-indexes]
+"""
+import csv
+import json
+import sqlite3
+import time
+
+import database as db
+
+IMPORT_BATCH_SIZE = 5000
+
+INSERT_TICKET_SQL = '''
+    INSERT INTO tickets (numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado,
+                         titulo, descripcion, fecha_creacion, fecha_asignacion, fecha_cierre, tiempo_estimado_horas)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?)
+'''
+
+
+class RejectedRow(Exception):
+    """Fila que no se puede importar; el mensaje es el motivo del rechazo."""
+
+
+def read_records(path, fmt=None):
+    """Itera (número de línea, registro, error) de un CSV o JSONL sin cargar el archivo entero."""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for line_no, record in enumerate(csv.DictReader(f), start=2):
+                yield line_no, record, None
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line), None
+                except json.JSONDecodeError as e:
+                    yield line_no, line.rstrip('\n'), f"JSON inválido: {e}"
+
+
+def _key(value):
+    return str(value).strip().casefold()
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class CatalogResolver:
+    """Mapas nombre -> ID de los catálogos, cargados una sola vez al empezar la importación."""
+
+    def __init__(self, conn):
+        self.maps = {
+            'cliente': self._load(conn, "SELECT id_cliente, nombre_empresa FROM clientes"),
+            'tipo_tarea': self._load(conn, "SELECT id_tipo_tarea, nombre FROM tipos_tarea"),
+            'prioridad': self._load(conn, "SELECT id_prioridad, nombre FROM prioridades"),
+            'estado': self._load(conn, "SELECT id_estado, nombre FROM estados_ticket"),
+            # Un técnico se puede indicar por login, email o "Nombre Apellido"
+            'tecnico': self._load(conn, """
+                SELECT id_tecnico, login FROM tecnicos
+                UNION ALL SELECT id_tecnico, email FROM tecnicos
+                UNION ALL SELECT id_tecnico, nombre || ' ' || apellido FROM tecnicos
+            """),
+        }
+        self.ids = {name: set(mapping.values()) for name, mapping in self.maps.items()}
+
+    @staticmethod
+    def _load(conn, query):
+        return {_key(name): id_ for id_, name in conn.execute(query) if name is not None}
+
+    def resolve(self, record, name, id_field, required=True):
+        """Devuelve el ID del catálogo `name` a partir de `id_field` o del nombre en `name`."""
+        if not _blank(record.get(id_field)):
+            try:
+                id_ = int(record[id_field])
+            except (TypeError, ValueError):
+                raise RejectedRow(f"{id_field} no es un entero: {record[id_field]!r}")
+            if id_ not in self.ids[name]:
+                raise RejectedRow(f"{id_field} {id_} no existe")
+            return id_
+        if not _blank(record.get(name)):
+            id_ = self.maps[name].get(_key(record[name]))
+            if id_ is None:
+                raise RejectedRow(f"{name} desconocido: {record[name]!r}")
+            return id_
+        if required:
+            raise RejectedRow(f"Falta {name} o {id_field}")
+        return None
+
+
+def _optional(record, field):
+    value = record.get(field)
+    return None if _blank(value) else value
+
+def build_ticket_row(record, resolver):
+    """Convierte un registro del archivo en la tupla de parámetros de INSERT_TICKET_SQL."""
+    if not isinstance(record, dict):
+        raise RejectedRow("El registro no es un objeto")
+    if _blank(record.get('titulo')):
+        raise RejectedRow("Falta titulo")
+    horas = _optional(record, 'tiempo_estimado_horas')
+    if horas is not None:
+        try:
+            horas = float(horas)
+        except (TypeError, ValueError):
+            raise RejectedRow(f"tiempo_estimado_horas no es numérico: {horas!r}")
+    numero = _optional(record, 'numero_ticket')
+    return (
+        str(numero).strip() if numero is not None else None,
+        resolver.resolve(record, 'cliente', 'id_cliente'),
+        resolver.resolve(record, 'tecnico', 'id_tecnico_asignado', required=False),
+        resolver.resolve(record, 'tipo_tarea', 'id_tipo_tarea'),
+        resolver.resolve(record, 'prioridad', 'id_prioridad'),
+        resolver.resolve(record, 'estado', 'id_estado'),
+        record['titulo'],
+        _optional(record, 'descripcion'),
+        _optional(record, 'fecha_creacion'),
+        _optional(record, 'fecha_asignacion'),
+        _optional(record, 'fecha_cierre'),
+        horas,
+    )
+
+
+class RejectWriter:
+    """Escribe las filas rechazadas en JSONL; el archivo solo se crea si hay algún rechazo."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, line_no, reason, record):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write(json.dumps({'linea': line_no, 'motivo': reason, 'registro': record}, ensure_ascii=False, default=str) + '\n')
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _insert_batch(conn, batch, rejects, bump_versions=True):
+    """Inserta un lote en una transacción; los numero_ticket ya existentes van a rechazos.
+
+    Con bump_versions=False no se sube la versión de `tickets` (la carga la sube una vez al final).
+    """
+    numeros = [row[0] for _, row, _ in batch if row[0] is not None]
+    existing = set()
+    if numeros:
+        existing = {r[0] for r in conn.execute(
+            "SELECT numero_ticket FROM tickets WHERE numero_ticket IN (SELECT value FROM json_each(?))",
+            (json.dumps(numeros),))}
+    pending = []
+    for line_no, row, record in batch:
+        if row[0] is not None:
+            if row[0] in existing:
+                rejects.write(line_no, f"numero_ticket duplicado: {row[0]}", record)
+                continue
+            existing.add(row[0]) # Duplicados dentro del mismo lote
+        pending.append((line_no, row, record))
+
+    def insert(conn):
+        conn.executemany(INSERT_TICKET_SQL, [row for _, row, _ in pending])
+        if bump_versions:
+            db.bump_data_versions(conn, ('tickets',)) # Una vez por lote: las cachés ven cada lote confirmado
+        return len(pending)
+    try:
+        return db.retry_transaction(conn, insert, 'import_tickets')
+    except sqlite3.IntegrityError:
+        # Otro proceso insertó el mismo numero_ticket entre la comprobación y la inserción:
+        # se repite el lote fila a fila para rechazar solo las filas conflictivas.
+        pass
+
+    def insert_rows(conn):
+        inserted, rejected = 0, []
+        for line_no, row, record in pending:
+            try:
+                conn.execute(INSERT_TICKET_SQL, row)
+                inserted += 1
+            except sqlite3.IntegrityError as e:
+                rejected.append((line_no, str(e), record))
+        if inserted and bump_versions:
+            db.bump_data_versions(conn, ('tickets',))
+        return inserted, rejected
+    inserted, rejected = db.retry_transaction(conn, insert_rows, 'import_tickets')
+    for line_no, reason, record in rejected: # Después del COMMIT: un intento repetido no los duplica
+        rejects.write(line_no, reason, record)
+    return inserted
+
+
+def ticket_indexes():
+    return [(name, sql) for name, sql in db.INDEXES if ' ON tickets(' in sql]
+
+def _drop_ticket_indexes(conn):
+    def drop(conn):
+        for name, _ in ticket_indexes():
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+    db.retry_transaction(conn, drop, 'import_tickets')
+
+def _create_ticket_indexes(conn):
+    def create(conn):
+        for _, sql in ticket_indexes():
+            conn.execute(sql)
+        conn.execute("ANALYZE tickets")
+    db.retry_transaction(conn, create, 'import_tickets')
+
+def import_tickets(path, fmt=None, batch_size=IMPORT_BATCH_SIZE, reject_path=None, rebuild_indexes=False, progress=True):
+    """Importa tickets desde `path` (CSV o JSONL) y devuelve las estadísticas de la carga.
+
+    Con rebuild_indexes=True se eliminan los índices secundarios de `tickets` antes de la carga
+    y se recrean al final, lo que es más rápido que mantenerlos fila a fila en cargas grandes.
+    También se suspenden los triggers de datos derivados (búsqueda, totales, resúmenes y
+    contadores), que se recalculan una vez al terminar, y la versión de `tickets` sube una sola vez.
+    """
+    reject_path = reject_path or f"{path}.rechazados.jsonl"
+    rejects = RejectWriter(reject_path)
+    stats = {'leidas': 0, 'insertadas': 0, 'rechazadas': 0}
+    started = time.perf_counter()
+    conn = db.get_db_connection()
+    if not conn:
+        return None
+    try:
+        resolver = CatalogResolver(conn)
+        if rebuild_indexes:
+            _drop_ticket_indexes(conn)
+            db.suspend_derived_triggers(conn)
+
+        batch = []
+        for line_no, record, error in read_records(path, fmt):
+            stats['leidas'] += 1
+            if error:
+                rejects.write(line_no, error, record)
+                continue
+            try:
+                batch.append((line_no, build_ticket_row(record, resolver), record))
+            except RejectedRow as e:
+                rejects.write(line_no, str(e), record)
+            if len(batch) >= batch_size:
+                stats['insertadas'] += _insert_batch(conn, batch, rejects, not rebuild_indexes)
+                batch = []
+                if progress:
+                    elapsed = time.perf_counter() - started
+                    print(f"  -> {stats['insertadas']} tickets insertados ({stats['insertadas'] / elapsed:.0f} filas/s)")
+        if batch:
+            stats['insertadas'] += _insert_batch(conn, batch, rejects, not rebuild_indexes)
+
+        if rebuild_indexes:
+            if progress:
+                print("Recreando índices y datos derivados de tickets...")
+            _create_ticket_indexes(conn)
+            if not db.restore_derived_data(conn, ('tickets',)):
+                return None
+        return stats
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error durante la importación masiva: {e}")
+        conn.rollback()
+        if rebuild_indexes:
+            _create_ticket_indexes(conn) # No dejar la tabla sin índices ni triggers tras un fallo
+            db.restore_derived_data(conn, ('tickets',))
+        return None
+    finally:
+        conn.close()
+        rejects.close()
+        stats['rechazadas'] = rejects.count
+        stats['segundos'] = time.perf_counter() - started
+        stats['filas_por_segundo'] = stats['insertadas'] / stats['segundos'] if stats['segundos'] else 0.0
+        stats['archivo_rechazos'] = reject_path if rejects.count else None
@@ -1,173 +1,269 @@
+import json
+import os
+import queue
+import random
+import re
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
 import hashlib # Necesario para el hash de contraseñas
 
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
 DATABASE_NAME = 'sistema_tickets.db'
 
-def initialize_database():
-    """Crea la base de datos y las tablas si no existen."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
+# --- Configuración del pool de conexiones ---
+POOL_SIZE = int(os.environ.get('TICKETS_POOL_SIZE', '5'))
+POOL_TIMEOUT = float(os.environ.get('TICKETS_POOL_TIMEOUT', '10')) # Segundos máximos esperando una conexión libre
+POOL_HEALTHCHECK_INTERVAL = 30 # Segundos de inactividad tras los que se verifica la conexión antes de reutilizarla
+STATEMENT_CACHE_SIZE = 256 # Sentencias preparadas que sqlite3 mantiene en caché por conexión
+ANALYSIS_LIMIT = 1000 # Filas por índice que muestrea PRAGMA optimize al actualizar estadísticas
 
-        # --- Creación de Tablas ---
-        print("Creando tablas si no existen...")
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tecnicos (
-            id_tecnico INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre VARCHAR(100) NOT NULL,
-            apellido VARCHAR(100) NOT NULL,
-            email VARCHAR(150) UNIQUE NOT NULL,
-            login VARCHAR(50) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            telefono VARCHAR(20),
-            especialidad VARCHAR(100),
-            fecha_ingreso DATE NOT NULL,
-            activo INTEGER DEFAULT 1, -- 1 for TRUE, 0 for FALSE
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-        ''')
-        print("  -> tecnicos: OK")
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clientes (
-            id_cliente INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre_empresa VARCHAR(200) NOT NULL,
-            contacto_principal VARCHAR(150),
-            email VARCHAR(150),
-            telefono VARCHAR(20),
-            direccion TEXT,
-            ciudad VARCHAR(100),
-            pais VARCHAR(100) DEFAULT 'España',
-            activo INTEGER DEFAULT 1, -- 1 for TRUE, 0 for FALSE
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-        ''')
-        print("  -> clientes: OK")
+# --- Configuración de la cola de escritura ---
+WRITE_QUEUE_ENABLED = os.environ.get('TICKETS_WRITE_QUEUE', '1') != '0' # 0: cada escritura en su propia transacción
+WRITE_BATCH_MAX = int(os.environ.get('TICKETS_WRITE_BATCH_MAX', '64')) # Operaciones máximas por commit
 
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tipos_tarea (
-            id_tipo_tarea INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre VARCHAR(200) NOT NULL UNIQUE,
-            descripcion TEXT,
-            tiempo_estimado_horas REAL,
-            prioridad_default VARCHAR(20) DEFAULT 'Media',
-            activo INTEGER DEFAULT 1, -- 1 for TRUE, 0 for FALSE
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-        ''')
-        print("  -> tipos_tarea: OK")
+# --- Configuración de los reintentos ante bloqueos ---
+BUSY_RETRY_DEADLINE = float(os.environ.get('TICKETS_BUSY_DEADLINE', '10')) # Segundos máximos reintentando una transacción
+BUSY_BACKOFF_BASE_MS = 5 # Primera espera máxima entre reintentos; se duplica en cada intento
+BUSY_BACKOFF_MAX_MS = 500 # Tope de la espera entre reintentos
 
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS modalidades_trabajo (
-            id_modalidad INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre VARCHAR(50) NOT NULL UNIQUE,
-            descripcion TEXT,
-            activo INTEGER DEFAULT 1 -- 1 for TRUE, 0 for FALSE
-        );
-        ''')
-        print("  -> modalidades_trabajo: OK")
+# --- Perfiles de almacenamiento ---
+# Cada perfil agrupa los PRAGMAs que se aplican una sola vez a cada conexión del pool.
+# 'tuned' es el perfil por defecto; 'legacy' reproduce los valores por defecto de SQLite.
+STORAGE_PROFILES = {
+    'tuned': {
+        'journal_mode': 'WAL', # Los lectores no se bloquean mientras otra conexión escribe
+        'synchronous': 'NORMAL', # Seguro con WAL: solo los checkpoints hacen fsync completo
+        'cache_size': -65536, # Valor negativo = KiB: 64 MiB de caché de páginas por conexión
+        'mmap_size': 268435456, # 256 MiB leídos vía mmap en lugar de read()
+        'temp_store': 'MEMORY', # Ordenaciones e índices temporales en memoria
+        'busy_timeout': 5000, # ms esperando un bloqueo antes de devolver SQLITE_BUSY
+        'wal_autocheckpoint': 1000, # Páginas de WAL acumuladas antes de un checkpoint automático
+        'journal_size_limit': 67108864, # El WAL se trunca a 64 MiB tras cada checkpoint
+        'checkpoint_mode': 'PASSIVE', # Modo de checkpoint_wal() y del cierre del pool
+    },
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000,
+        'journal_size_limit': -1,
+        'checkpoint_mode': 'PASSIVE',
+    },
+}
 
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS prioridades (
-            id_prioridad INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre VARCHAR(20) NOT NULL UNIQUE,
-            nivel INTEGER NOT NULL,
-            color_hex VARCHAR(7),
-            descripcion TEXT
-        );
-        ''')
-        print("  -> prioridades: OK")
+# Orden en el que se aplican los PRAGMAs (journal_mode primero: afecta al resto)
+STORAGE_PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store',
+                   'busy_timeout', 'wal_autocheckpoint', 'journal_size_limit')
 
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS estados_ticket (
-            id_estado INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre VARCHAR(50) NOT NULL UNIQUE,
-            descripcion TEXT,
-            es_final INTEGER DEFAULT 0, -- 0 for FALSE, 1 for TRUE
-            orden_flujo INTEGER
-        );
-        ''')
-        print("  -> estados_ticket: OK")
+STORAGE_PROFILE = os.environ.get('TICKETS_STORAGE_PROFILE', 'tuned')
+_storage_overrides = {}
 
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tickets (
-            id_ticket INTEGER PRIMARY KEY AUTOINCREMENT,
-            numero_ticket VARCHAR(20) UNIQUE,
-            id_cliente INTEGER NOT NULL,
-            id_tecnico_asignado INTEGER,
-            id_tipo_tarea INTEGER NOT NULL,
-            id_prioridad INTEGER NOT NULL,
-            id_estado INTEGER NOT NULL,
-            titulo VARCHAR(200) NOT NULL,
-            descripcion TEXT,
-            fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
-            fecha_asignacion DATETIME,
-            fecha_cierre DATETIME,
-            tiempo_estimado_horas REAL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (id_cliente) REFERENCES clientes(id_cliente),
-            FOREIGN KEY (id_tecnico_asignado) REFERENCES tecnicos(id_tecnico),
-            FOREIGN KEY (id_tipo_tarea) REFERENCES tipos_tarea(id_tipo_tarea),
-            FOREIGN KEY (id_prioridad) REFERENCES prioridades(id_prioridad),
-            FOREIGN KEY (id_estado) REFERENCES estados_ticket(id_estado)
-        );
-        ''')
-        print("  -> tickets: OK")
+# Índices secundarios (nombre, DDL). bulk_import.py los elimina y recrea en cargas masivas.
+# Los de tickets llevan fecha_creacion como segunda columna para servir el orden del listado
+# con cada filtro; id_ticket no hace falta: es el rowid y va implícito en cada índice.
+# `python manage.py indexes --try-candidates` revisa los planes y compara alternativas.
+INDEXES = (
+    ('idx_tickets_cliente_fecha', 'CREATE INDEX IF NOT EXISTS idx_tickets_cliente_fecha ON tickets(id_cliente, fecha_creacion);'),
+    ('idx_tickets_tecnico_fecha', 'CREATE INDEX IF NOT EXISTS idx_tickets_tecnico_fecha ON tickets(id_tecnico_asignado, fecha_creacion);'),
+    ('idx_tickets_estado_fecha', 'CREATE INDEX IF NOT EXISTS idx_tickets_estado_fecha ON tickets(id_estado, fecha_creacion);'),
+    ('idx_tickets_tipo_tarea', 'CREATE INDEX IF NOT EXISTS idx_tickets_tipo_tarea ON tickets(id_tipo_tarea);'),
+    ('idx_tickets_fecha_creacion', 'CREATE INDEX IF NOT EXISTS idx_tickets_fecha_creacion ON tickets(fecha_creacion);'),
+    ('idx_registros_ticket_fecha', 'CREATE INDEX IF NOT EXISTS idx_registros_ticket_fecha ON registros_actividad(id_ticket, fecha_actividad);'),
+    ('idx_registros_tecnico_fecha', 'CREATE INDEX IF NOT EXISTS idx_registros_tecnico_fecha ON registros_actividad(id_tecnico, fecha_actividad);'),
+    ('idx_registros_fecha', 'CREATE INDEX IF NOT EXISTS idx_registros_fecha ON registros_actividad(fecha_actividad);'),
+    ('idx_clientes_nombre', 'CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes(nombre_empresa);'),
+)
 
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS registros_actividad (
-            id_registro INTEGER PRIMARY KEY AUTOINCREMENT,
-            id_ticket INTEGER NOT NULL,
-            id_tecnico INTEGER NOT NULL,
-            id_modalidad INTEGER NOT NULL,
-            fecha_actividad DATE NOT NULL,
-            tiempo_dedicado_horas REAL NOT NULL,
-            descripcion_trabajo TEXT,
-            observaciones TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (id_ticket) REFERENCES tickets(id_ticket),
-            FOREIGN KEY (id_tecnico) REFERENCES tecnicos(id_tecnico),
-            FOREIGN KEY (id_modalidad) REFERENCES modalidades_trabajo(id_modalidad)
-        );
-        ''')
-        print("  -> registros_actividad: OK")
-
-        # --- Índices ---
-        print("Creando índices si no existen...")
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_cliente ON tickets(id_cliente);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_tecnico ON tickets(id_tecnico_asignado);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_tipo_tarea ON tickets(id_tipo_tarea);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_estado ON tickets(id_estado);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_registros_ticket ON registros_actividad(id_ticket);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_registros_tecnico ON registros_actividad(id_tecnico);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_numero ON tickets(numero_ticket);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_fecha_creacion ON tickets(fecha_creacion);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_registros_fecha ON registros_actividad(fecha_actividad);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tecnicos_login ON tecnicos(login);')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes(nombre_empresa);')
-        print("Índices creados/verificados.")
+# Índices retirados (migraciones 5 y 6): duplicados de un UNIQUE o prefijos de un índice compuesto
+OBSOLETE_INDEXES = ('idx_tickets_numero', 'idx_tecnicos_login', 'idx_tickets_cliente',
+                    'idx_tickets_tecnico', 'idx_tickets_estado', 'idx_registros_ticket',
+                    'idx_registros_tecnico')
 
-        conn.commit()
-        print("Tablas y índices creados/verificados correctamente.")
-        
-        # Insertar datos maestros solo si las tablas estaban vacías
-        insert_master_data_if_empty(conn) 
-        
-        return True # Indicar éxito
-    except sqlite3.Error as e:
-        print(f"Error al inicializar la base de datos (creación de tablas/índices): {e}")
+_storage_reported = False
+
+def initialize_database():
+    """Lleva el esquema a SCHEMA_VERSION aplicando las migraciones pendientes.
+
+    Si la base de datos ya está al día el coste es leer PRAGMA user_version y los nombres de los
+    triggers (para restaurar los de datos derivados si una carga masiva no terminó). El perfil de
+    almacenamiento se imprime la primera vez en cada proceso.
+    """
+    global _storage_reported
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        version = get_schema_version(conn)
+        if version is None:
+            return False
+        ok = True
+        if version > SCHEMA_VERSION:
+            print(f"Aviso: la base de datos está en la versión de esquema {version}, posterior a la de este código ({SCHEMA_VERSION}).")
+        elif version == SCHEMA_VERSION:
+            if missing_derived_triggers(conn):
+                print("Aviso: faltan triggers de datos derivados (carga masiva interrumpida). Recalculando...")
+                ok = restore_derived_data(conn)
+        else:
+            migrate_database(conn)
+            print(f"Esquema actualizado de la versión {version} a la {SCHEMA_VERSION}.")
+        if not _storage_reported: # Una vez por proceso, sea cual sea la versión del esquema
+            print_storage_report(conn)
+            _storage_reported = True
+        return ok # Indicar éxito
+    except sqlite3.Error as e:
+        print(f"Error al inicializar la base de datos (migraciones del esquema): {e}")
+        conn.rollback()
         return False # Indicar fallo
     finally:
         if conn:
             conn.close()
 
+def create_base_schema(cursor):
+    """Tablas e índices originales (migración 1)."""
+    # --- Creación de Tablas ---
+    print("Creando tablas si no existen...")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tecnicos (
+        id_tecnico INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre VARCHAR(100) NOT NULL,
+        apellido VARCHAR(100) NOT NULL,
+        email VARCHAR(150) UNIQUE NOT NULL,
+        login VARCHAR(50) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        telefono VARCHAR(20),
+        especialidad VARCHAR(100),
+        fecha_ingreso DATE NOT NULL,
+        activo INTEGER DEFAULT 1, -- 1 for TRUE, 0 for FALSE
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    ''')
+    print("  -> tecnicos: OK")
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS clientes (
+        id_cliente INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre_empresa VARCHAR(200) NOT NULL,
+        contacto_principal VARCHAR(150),
+        email VARCHAR(150),
+        telefono VARCHAR(20),
+        direccion TEXT,
+        ciudad VARCHAR(100),
+        pais VARCHAR(100) DEFAULT 'España',
+        activo INTEGER DEFAULT 1, -- 1 for TRUE, 0 for FALSE
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    ''')
+    print("  -> clientes: OK")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tipos_tarea (
+        id_tipo_tarea INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre VARCHAR(200) NOT NULL UNIQUE,
+        descripcion TEXT,
+        tiempo_estimado_horas REAL,
+        prioridad_default VARCHAR(20) DEFAULT 'Media',
+        activo INTEGER DEFAULT 1, -- 1 for TRUE, 0 for FALSE
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    ''')
+    print("  -> tipos_tarea: OK")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS modalidades_trabajo (
+        id_modalidad INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre VARCHAR(50) NOT NULL UNIQUE,
+        descripcion TEXT,
+        activo INTEGER DEFAULT 1 -- 1 for TRUE, 0 for FALSE
+    );
+    ''')
+    print("  -> modalidades_trabajo: OK")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS prioridades (
+        id_prioridad INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre VARCHAR(20) NOT NULL UNIQUE,
+        nivel INTEGER NOT NULL,
+        color_hex VARCHAR(7),
+        descripcion TEXT
+    );
+    ''')
+    print("  -> prioridades: OK")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS estados_ticket (
+        id_estado INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre VARCHAR(50) NOT NULL UNIQUE,
+        descripcion TEXT,
+        es_final INTEGER DEFAULT 0, -- 0 for FALSE, 1 for TRUE
+        orden_flujo INTEGER
+    );
+    ''')
+    print("  -> estados_ticket: OK")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tickets (
+        id_ticket INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero_ticket VARCHAR(20) UNIQUE,
+        id_cliente INTEGER NOT NULL,
+        id_tecnico_asignado INTEGER,
+        id_tipo_tarea INTEGER NOT NULL,
+        id_prioridad INTEGER NOT NULL,
+        id_estado INTEGER NOT NULL,
+        titulo VARCHAR(200) NOT NULL,
+        descripcion TEXT,
+        fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+        fecha_asignacion DATETIME,
+        fecha_cierre DATETIME,
+        tiempo_estimado_horas REAL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (id_cliente) REFERENCES clientes(id_cliente),
+        FOREIGN KEY (id_tecnico_asignado) REFERENCES tecnicos(id_tecnico),
+        FOREIGN KEY (id_tipo_tarea) REFERENCES tipos_tarea(id_tipo_tarea),
+        FOREIGN KEY (id_prioridad) REFERENCES prioridades(id_prioridad),
+        FOREIGN KEY (id_estado) REFERENCES estados_ticket(id_estado)
+    );
+    ''')
+    print("  -> tickets: OK")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS registros_actividad (
+        id_registro INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_ticket INTEGER NOT NULL,
+        id_tecnico INTEGER NOT NULL,
+        id_modalidad INTEGER NOT NULL,
+        fecha_actividad DATE NOT NULL,
+        tiempo_dedicado_horas REAL NOT NULL,
+        descripcion_trabajo TEXT,
+        observaciones TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (id_ticket) REFERENCES tickets(id_ticket),
+        FOREIGN KEY (id_tecnico) REFERENCES tecnicos(id_tecnico),
+        FOREIGN KEY (id_modalidad) REFERENCES modalidades_trabajo(id_modalidad)
+    );
+    ''')
+    print("  -> registros_actividad: OK")
+
+    # --- Índices ---
+    print("Creando índices si no existen...")
+    for _, index_sql in INDEXES:
+        cursor.execute(index_sql)
+    print("Índices creados/verificados.")
+
 def insert_master_data_if_empty(conn):
-    """Inserta datos maestros solo si las tablas están vacías."""
+    """Inserta datos maestros solo si las tablas están vacías. El llamante confirma la transacción."""
     cursor = conn.cursor()
     
     # --- Lógica de inserción para cada tabla maestra ---
@@ -268,62 +364,655 @@ def insert_master_data_if_empty(conn):
         except sqlite3.Error as e:
             print(f"  -> ERROR insertando clientes: {e}")
 
-    conn.commit()
     print("Verificación de datos maestros completada.")
 
 
-# --- Funciones CRUD ---
+# --- Pool de conexiones ---
 
-def get_db_connection():
-    """Establece y devuelve una conexión a la base de datos."""
-    try:
-        conn = sqlite3.connect(DATABASE_NAME)
+class PooledConnection:
+    """Conexión prestada por el pool. close() la devuelve al pool en lugar de cerrarla.
+
+    cursor(), execute() y executemany() usan InstrumentedCursor, así que todas las consultas
+    hechas con conexiones del pool quedan registradas en instrumentation.get_query_stats().
+    """
+
+    def __init__(self, pool, raw):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+
+    def _connection(self):
+        raw = object.__getattribute__(self, '_raw')
+        if raw is None:
+            raise sqlite3.ProgrammingError("La conexión ya fue devuelta al pool.")
+        return raw
+
+    def __getattr__(self, name):
+        return getattr(self._connection(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._connection(), name, value)
+
+    def cursor(self, factory=None):
+        if factory is not None:
+            return self._connection().cursor(factory)
+        if not instrumentation.ENABLED:
+            return self._connection().cursor()
+        cursor = self._connection().cursor(instrumentation.InstrumentedCursor)
+        cursor.database = self._pool.database
+        return cursor
+
+    @instrumentation.register_wrapper
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    @instrumentation.register_wrapper
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def __enter__(self):
+        self._connection().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._connection().__exit__(exc_type, exc, tb)
+
+    def close(self):
+        raw = object.__getattribute__(self, '_raw')
+        if raw is not None:
+            object.__setattr__(self, '_raw', None)
+            self._pool.release(raw)
+
+    def __del__(self):
+        # Red de seguridad si alguien olvida llamar a close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Pool thread-safe de conexiones SQLite de larga duración."""
+
+    def __init__(self, database, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._idle = deque() # (conexión, instante del último uso)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {'hits': 0, 'waits': 0, 'creations': 0, 'discards': 0, 'timeouts': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            check_same_thread=False, # El pool garantiza que solo un hilo usa la conexión a la vez
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
         conn.row_factory = sqlite3.Row # Devuelve filas como diccionarios
+        apply_storage_settings(conn)
+        self._count('creations')
         return conn
+
+    def _is_healthy(self, conn, last_used):
+        if time.monotonic() - last_used < POOL_HEALTHCHECK_INTERVAL:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Presta una conexión; espera hasta `timeout` segundos si el pool está agotado."""
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count('timeouts')
+                raise sqlite3.OperationalError("Tiempo de espera agotado esperando una conexión libre del pool")
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    conn = self._connect()
+                    break
+                conn, last_used = item
+                if self._is_healthy(conn, last_used):
+                    self._count('hits')
+                    break
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Devuelve una conexión al pool, descartando cualquier transacción sin confirmar."""
+        try:
+            if self._closed:
+                self._discard(conn)
+                return
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.row_factory = sqlite3.Row
+            except sqlite3.Error:
+                self._discard(conn)
+                return
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def _discard(self, conn):
+        self._count('discards')
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        if idle:
+            _optimize(idle[0][0])
+            _checkpoint(idle[0][0], get_storage_settings()['checkpoint_mode'])
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['size'] = self.size
+        return stats
+
+
+# --- Perfil de almacenamiento ---
+
+def get_storage_settings():
+    """Ajustes efectivos: perfil elegido + variables TICKETS_STORAGE_<AJUSTE> + configure_storage()."""
+    if STORAGE_PROFILE not in STORAGE_PROFILES:
+        raise ValueError(f"Perfil de almacenamiento desconocido: {STORAGE_PROFILE}")
+    settings = dict(STORAGE_PROFILES[STORAGE_PROFILE])
+    for key in settings:
+        env_value = os.environ.get(f"TICKETS_STORAGE_{key.upper()}")
+        if env_value is not None:
+            settings[key] = env_value
+    settings.update(_storage_overrides)
+    return settings
+
+def configure_storage(profile=None, **overrides):
+    """Selecciona un perfil y/o sobrescribe ajustes concretos. Las conexiones se recrean."""
+    global STORAGE_PROFILE
+    unknown = set(overrides) - set(STORAGE_PROFILES['tuned'])
+    if unknown:
+        raise ValueError(f"Ajustes de almacenamiento desconocidos: {', '.join(sorted(unknown))}")
+    with _pool_lock:
+        if profile is not None:
+            STORAGE_PROFILE = profile
+            _storage_overrides.clear()
+        _storage_overrides.update(overrides)
+    configure_pool()
+
+def _pragma_value(value):
+    value = str(value).strip()
+    if not value.lstrip('-').isalnum():
+        raise ValueError(f"Valor de PRAGMA no válido: {value!r}")
+    return value
+
+def apply_storage_settings(conn):
+    """Aplica los PRAGMAs del perfil de almacenamiento a una conexión recién creada."""
+    settings = get_storage_settings()
+    for key in STORAGE_PRAGMAS:
+        conn.execute(f"PRAGMA {key} = {_pragma_value(settings[key])}")
+
+def _checkpoint(conn, mode):
+    try:
+        return conn.execute(f"PRAGMA wal_checkpoint({_pragma_value(mode).upper()})").fetchone()
     except sqlite3.Error as e:
-        print(f"Error al conectar a la base de datos: {e}")
+        print(f"Error al hacer checkpoint del WAL: {e}")
         return None
 
-# --- CRUD para Técnicos ---
-def add_tecnico(nombre, apellido, email, login, password_hash, telefono, especialidad, fecha_ingreso):
+def _run_optimize(conn):
+    # analysis_limit acota el ANALYZE que PRAGMA optimize pueda lanzar en tablas grandes
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("PRAGMA optimize")
+
+def _optimize(conn):
+    try:
+        _run_optimize(conn)
+    except sqlite3.Error as e:
+        print(f"Error al ejecutar PRAGMA optimize: {e}")
+
+def optimize_database(full_analyze=False):
+    """Mantenimiento del planificador: PRAGMA optimize (barato) o ANALYZE completo + optimize."""
     conn = get_db_connection()
     if not conn: return False
+    def optimize(conn):
+        if full_analyze:
+            conn.execute("ANALYZE")
+        _run_optimize(conn)
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO tecnicos (nombre, apellido, email, login, password_hash, telefono, especialidad, fecha_ingreso)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (nombre, apellido, email, login, password_hash, telefono, especialidad, fecha_ingreso))
-        conn.commit()
+        retry_transaction(conn, optimize, 'optimize_database')
         return True
-    except sqlite3.IntegrityError: # Para campos UNIQUE como email/login
-        return False
     except sqlite3.Error as e:
-        print(f"Error al agregar técnico: {e}")
+        print(f"Error al optimizar la base de datos: {e}")
         return False
     finally:
         conn.close()
 
-def get_tecnicos():
+def checkpoint_wal(mode=None):
+    """Fuerza un checkpoint del WAL. Devuelve (bloqueado, páginas_wal, páginas_copiadas)."""
     conn = get_db_connection()
-    if not conn: return []
+    if not conn: return None
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tecnicos")
-        tecnicos = cursor.fetchall()
-        return tecnicos
-    except sqlite3.Error as e:
-        print(f"Error al obtener técnicos: {e}")
-        return []
+        result = _checkpoint(conn, mode or get_storage_settings()['checkpoint_mode'])
+        return tuple(result) if result else None
     finally:
         conn.close()
 
+def get_storage_report(conn=None):
+    """Lee de una conexión del pool los valores efectivos de cada PRAGMA del perfil."""
+    borrowed = conn is None
+    if borrowed:
+        conn = get_db_connection()
+    if not conn: return {}
+    try:
+        report = {'profile': STORAGE_PROFILE}
+        for key in STORAGE_PRAGMAS:
+            report[key] = conn.execute(f"PRAGMA {key}").fetchone()[0]
+        report['checkpoint_mode'] = get_storage_settings()['checkpoint_mode']
+        return report
+    except sqlite3.Error as e:
+        print(f"Error al leer los ajustes de almacenamiento: {e}")
+        return {}
+    finally:
+        if borrowed:
+            conn.close()
+
+def print_storage_report(conn=None):
+    report = get_storage_report(conn)
+    print(f"Perfil de almacenamiento '{report.pop('profile', STORAGE_PROFILE)}':")
+    for key, value in report.items():
+        print(f"  -> {key} = {value}")
+
+
+_pool = None
+_pool_lock = threading.RLock()
+
+def get_pool():
+    """Devuelve el pool de la base de datos actual, creándolo si hace falta."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE_NAME:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DATABASE_NAME, POOL_SIZE, POOL_TIMEOUT)
+        return _pool
+
+def configure_pool(size=None, timeout=None):
+    """Cambia el tamaño y/o el tiempo de espera del pool. Las conexiones libres se recrean."""
+    global _pool, POOL_SIZE, POOL_TIMEOUT
+    with _pool_lock:
+        if size is not None:
+            POOL_SIZE = size
+        if timeout is not None:
+            POOL_TIMEOUT = timeout
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+def get_pool_stats():
+    """Contadores del pool: hits (reutilizaciones), waits (esperas), creations, discards, timeouts."""
+    return get_pool().get_stats()
+
+def get_db_connection():
+    """Presta una conexión del pool. Llamar a close() la devuelve al pool."""
+    try:
+        return get_pool().acquire()
+    except sqlite3.Error as e:
+        print(f"Error al conectar a la base de datos: {e}")
+        return None
+
+# --- Reintentos ante bloqueos ---
+# SQLITE_BUSY y SQLITE_LOCKED son transitorios: otra conexión (de este proceso o de otro) tiene el
+# bloqueo de escritura. busy_timeout ya espera dentro de SQLite, pero algunos casos se devuelven sin
+# esperar (p. ej. SQLITE_BUSY_SNAPSHOT en WAL) y, si el bloqueo dura más que busy_timeout, el error
+# llegaba al usuario. run_with_retry repite la transacción completa con esperas exponenciales con
+# jitter hasta BUSY_RETRY_DEADLINE; los demás errores (restricciones, SQL...) no se reintentan.
+# El tiempo perdido esperando bloqueos (reintentos más lo que tarden las sentencias que toman el bloqueo,
+# locking_statement) se acumula en get_lock_stats() por operación: la función que escribe
+# (add_ticket, archive_closed_tickets, migrate_database...), una vez por ejecución.
+
+_BUSY_CODES = (5, 6) # SQLITE_BUSY, SQLITE_LOCKED (sin los bits de código extendido)
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    """La base de datos siguió bloqueada hasta agotar el plazo de reintentos."""
+
+def is_busy_error(error):
+    """True si el error es un bloqueo transitorio (SQLITE_BUSY/SQLITE_LOCKED) y no un error de datos o de SQL."""
+    if isinstance(error, DatabaseBusyError):
+        return True
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in _BUSY_CODES
+    message = str(error).lower()
+    return 'database is locked' in message or 'database table is locked' in message or 'busy' in message
+
+_lock_stats_lock = threading.Lock()
+_lock_stats = {}
+_statement_wait = threading.local() # Espera de locking_statement en el intento en curso de este hilo
+
+def record_lock_wait(kind, waited, retries=0, exhausted=False):
+    """Acumula `waited` segundos de espera por bloqueos para la operación `kind`."""
+    with _lock_stats_lock:
+        entry = _lock_stats.setdefault(kind, {'ejecuciones': 0, 'con_espera': 0, 'reintentos': 0, 'agotados': 0,
+                                              'espera_ms': 0.0, 'espera_max_ms': 0.0})
+        entry['ejecuciones'] += 1
+        entry['con_espera'] += waited >= 0.001 or retries > 0
+        entry['reintentos'] += retries
+        entry['agotados'] += exhausted
+        entry['espera_ms'] += waited * 1000
+        entry['espera_max_ms'] = max(entry['espera_max_ms'], waited * 1000)
+
+def get_lock_stats():
+    """Esperas por bloqueos por operación: ejecuciones, cuántas esperaron, reintentos, agotados y ms."""
+    with _lock_stats_lock:
+        stats = {kind: dict(entry) for kind, entry in _lock_stats.items()}
+    for entry in stats.values():
+        entry['espera_media_ms'] = entry['espera_ms'] / entry['ejecuciones'] if entry['ejecuciones'] else 0.0
+    return stats
+
+def reset_lock_stats():
+    with _lock_stats_lock:
+        _lock_stats.clear()
+
+def locking_statement(conn, sql):
+    """Ejecuta una sentencia que toma o libera el bloqueo de escritura (BEGIN IMMEDIATE, COMMIT).
+
+    Su duración, incluida la espera de busy_timeout, cuenta como espera por bloqueos de la operación
+    que la está ejecutando dentro de run_with_retry.
+    """
+    started = time.monotonic()
+    try:
+        conn.execute(sql)
+    finally:
+        _statement_wait.seconds = getattr(_statement_wait, 'seconds', 0.0) + time.monotonic() - started
+
+def run_with_retry(attempt, kind, deadline=None):
+    """Ejecuta attempt() y lo repite mientras falle por un bloqueo, hasta `deadline` segundos en total.
+
+    attempt debe poder repetirse: abre su transacción y la deshace si falla. Entre intentos se espera
+    un tiempo aleatorio entre 0 y BUSY_BACKOFF_BASE_MS * 2^intento (con tope BUSY_BACKOFF_MAX_MS).
+    Si se agota el plazo lanza DatabaseBusyError; cualquier otro error se propaga sin reintentar.
+    `kind` es el nombre de la operación en get_lock_stats(), o una lista de nombres (uno por operación
+    de un lote de la cola: todas esperaron lo mismo).
+    """
+    kinds = [kind] if isinstance(kind, str) else kind
+    deadline = BUSY_RETRY_DEADLINE if deadline is None else deadline
+    started = time.monotonic()
+    retries = 0
+    while True:
+        attempt_started = time.monotonic()
+        _statement_wait.seconds = 0.0
+        try:
+            result = attempt()
+        except sqlite3.Error as e:
+            if not is_busy_error(e):
+                raise
+            elapsed = time.monotonic() - started
+            if elapsed >= deadline:
+                for name in kinds:
+                    record_lock_wait(name, elapsed, retries, exhausted=True)
+                raise DatabaseBusyError(f"{e} (sin éxito tras {retries} reintentos en {elapsed:.1f} s)") from e
+            backoff = min(BUSY_BACKOFF_MAX_MS, BUSY_BACKOFF_BASE_MS * 2 ** retries) / 1000
+            time.sleep(min(random.uniform(0, backoff), deadline - elapsed))
+            retries += 1
+            continue
+        waited = attempt_started - started + _statement_wait.seconds
+        for name in kinds:
+            record_lock_wait(name, waited, retries)
+        return result
+
+def retry_transaction(conn, work, kind, deadline=None):
+    """Ejecuta work(conn) en una transacción BEGIN IMMEDIATE de `conn`, con run_with_retry, y la confirma.
+
+    Para los escritores que no pasan por la cola (cargas masivas, reconstrucciones, migraciones).
+    `conn` no debe tener una transacción abierta: un intento fallido se deshace entero antes de
+    repetirlo, así que work tampoco debe tener efectos fuera de la base de datos. Devuelve su resultado.
+    """
+    def attempt():
+        try:
+            locking_statement(conn, "BEGIN IMMEDIATE")
+            result = work(conn)
+            locking_statement(conn, "COMMIT")
+            return result
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+    return run_with_retry(attempt, kind, deadline)
+
+def operation_name(operation):
+    """Función que definió `operation` (add_ticket para su operación interna), para get_lock_stats()."""
+    return getattr(operation, '__qualname__', type(operation).__name__).split('.<locals>', 1)[0]
+
+# --- Cola de escritura ---
+# Todas las escrituras de las funciones CRUD pasan por un único hilo escritor: así las sesiones de
+# Streamlit no compiten por el bloqueo de escritura de SQLite. Una escritura con la cola vacía se
+# confirma enseguida; las que se acumulan mientras tanto van juntas en la siguiente transacción (group
+# commit): un commit (y un fsync) para todo el lote. Si el lote tiene varias operaciones, cada una va en su propio SAVEPOINT y un error solo
+# deshace esa operación; su resultado o su excepción llegan al llamante por un Future después del COMMIT.
+
+class WriteQueue:
+    """Cola de operaciones de escritura atendida por un hilo escritor con group commit."""
+
+    def __init__(self, batch_max=WRITE_BATCH_MAX):
+        self.batch_max = batch_max
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'operaciones': 0, 'errores': 0, 'lotes': 0, 'lotes_fallidos': 0, 'cola_max': 0,
+                       'espera_ms': 0.0, 'commit_ms': 0.0}
+        self._batch_sizes = Counter()
+
+    def submit(self, operation, tables=(), archive=False):
+        """Encola operation(conn) y devuelve un Future con su resultado.
+
+        La operación recibe una conexión del pool ya dentro de la transacción: no debe hacer commit ni
+        rollback, y no puede encolar otras escrituras (el escritor esperaría por sí mismo). `tables` son
+        las tablas de DATA_VERSION_TABLES que puede modificar: su versión sube si la operación cambia filas.
+        Con archive=True la conexión tiene el archivo adjunto como ARCHIVE_SCHEMA (ATTACH no se puede
+        hacer dentro de la transacción).
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Una operación de la cola de escritura no puede encolar otra escritura")
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((operation, tuple(tables), future, time.monotonic(), archive))
+        depth = self._queue.qsize()
+        with self._lock:
+            self._stats['cola_max'] = max(self._stats['cola_max'], depth)
+        return future
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='tickets-escritor', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        # Sin ventana de espera: solo se agrupa lo que ya está encolado (llegó durante el commit anterior)
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.run_batch(batch)
+            except Exception as e: # Ninguna operación debe quedarse esperando si falla el propio escritor
+                for _, _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def run_batch(self, batch):
+        """Ejecuta una lista de (operación, tablas, future, instante de encolado, archivo) en una transacción."""
+        conn = get_db_connection()
+        if not conn:
+            error = sqlite3.OperationalError("No hay conexión disponible para escribir")
+            for _, _, future, _, _ in batch:
+                future.set_exception(error)
+            self._record(batch, 0, failed=True)
+            return
+        started = time.monotonic()
+        attached = failed = False
+        try:
+            attached = any(archive for *_, archive in batch) and _attach_archive(conn, create=True)
+            outcomes = run_with_retry(lambda: self._attempt(conn, batch), [operation_name(item[0]) for item in batch])
+        except sqlite3.Error as e: # Bloqueo persistente o fallo de BEGIN/COMMIT: no se guardó nada del lote
+            outcomes = [(None, e)] * len(batch)
+            failed = True
+        finally:
+            if attached:
+                _detach_archive(conn)
+            conn.close()
+        # Un lote confirmado no es un lote fallido aunque alguna de sus operaciones fallara (cuentan en errores)
+        self._record(batch, time.monotonic() - started, failed=failed,
+                     errors=sum(error is not None for _, error in outcomes))
+        for (_, _, future, _, _), (result, error) in zip(batch, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _attempt(self, conn, batch):
+        outcomes = []
+        try:
+            locking_statement(conn, "BEGIN IMMEDIATE")
+            touched = set()
+            # Con una sola operación el SAVEPOINT sobra: si falla se deshace la transacción entera. Y no es
+            # gratis: mientras está abierto, cada página que modifica la operación se copia al subdiario,
+            # lo que hace unas 3 veces más lento un executemany grande.
+            single = len(batch) == 1
+            for operation, tables, _, _, _ in batch:
+                if not single:
+                    conn.execute("SAVEPOINT operacion")
+                changes = conn.total_changes
+                try:
+                    outcomes.append((operation(conn), None))
+                    if conn.total_changes != changes:
+                        touched.update(tables)
+                except Exception as e:
+                    if is_busy_error(e): # Un bloqueo no es culpa de la operación: se repite el lote entero
+                        raise
+                    if single:
+                        conn.rollback()
+                        return [(None, e)]
+                    conn.execute("ROLLBACK TO operacion")
+                    outcomes.append((None, e))
+                if not single:
+                    conn.execute("RELEASE operacion")
+            if touched: # Una sola actualización de versiones por lote, no una por fila escrita
+                bump_data_versions(conn, touched)
+            locking_statement(conn, "COMMIT")
+            return outcomes
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+    def _record(self, batch, elapsed, failed, errors=None):
+        now = time.monotonic()
+        with self._lock:
+            self._stats['operaciones'] += len(batch)
+            self._stats['errores'] += len(batch) if errors is None else errors
+            self._stats['lotes'] += 1
+            self._stats['lotes_fallidos'] += failed
+            self._stats['espera_ms'] += sum(now - queued for _, _, _, queued, _ in batch) * 1000
+            self._stats['commit_ms'] += elapsed * 1000
+            self._batch_sizes[len(batch)] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            sizes = dict(self._batch_sizes)
+        stats['cola'] = self._queue.qsize()
+        stats['lote_medio'] = stats['operaciones'] / stats['lotes'] if stats['lotes'] else 0.0
+        stats['lote_max'] = max(sizes, default=0)
+        stats['espera_media_ms'] = stats.pop('espera_ms') / stats['operaciones'] if stats['operaciones'] else 0.0
+        stats['transaccion_media_ms'] = stats.pop('commit_ms') / stats['lotes'] if stats['lotes'] else 0.0
+        stats['tamanos_lote'] = dict(sorted(sizes.items()))
+        return stats
+
+
+_write_queue = WriteQueue()
+
+def execute_write(operation, tables=(), archive=False):
+    """Ejecuta operation(conn) a través de la cola de escritura y devuelve su resultado.
+
+    Bloquea hasta que el lote de la operación se confirma; si la operación (o el commit) falla, lanza
+    la misma excepción. `tables` son las tablas versionadas (DATA_VERSION_TABLES) que la operación
+    puede modificar; con archive=True la conexión tiene el archivo adjunto. Con TICKETS_WRITE_QUEUE=0
+    la operación se ejecuta en el hilo llamante, en su propia transacción.
+    """
+    if not WRITE_QUEUE_ENABLED:
+        future = Future()
+        _write_queue.run_batch([(operation, tuple(tables), future, time.monotonic(), archive)])
+        return future.result()
+    return _write_queue.submit(operation, tables, archive).result()
+
+def get_write_queue_stats():
+    """Métricas de la cola de escritura: profundidad actual y máxima, tamaño de los lotes, esperas y errores."""
+    return _write_queue.get_stats()
+
+# --- Funciones CRUD ---
+
+# --- CRUD para Técnicos ---
+def add_tecnico(nombre, apellido, email, login, password_hash, telefono, especialidad, fecha_ingreso):
+    def insert(conn):
+        conn.execute('''
+            INSERT INTO tecnicos (nombre, apellido, email, login, password_hash, telefono, especialidad, fecha_ingreso)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (nombre, apellido, email, login, password_hash, telefono, especialidad, fecha_ingreso))
+    try:
+        execute_write(insert, ('tecnicos',))
+    except sqlite3.IntegrityError: # Para campos UNIQUE como email/login
+        return False
+    except sqlite3.Error as e:
+        print(f"Error al agregar técnico: {e}")
+        return False
+    invalidate_catalog('tecnicos')
+    return True
+
+def get_tecnicos(columns=None, filters=None):
+    """Todos los técnicos, sin password_hash. Para recorrer muchos, mejor iter_tecnicos o get_tecnicos_page."""
+    return list(iter_tecnicos(columns, filters))
+
 def get_tecnico_by_id(id_tecnico):
     conn = get_db_connection()
     if not conn: return None
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tecnicos WHERE id_tecnico = ?", (id_tecnico,))
+        cursor.execute(f"SELECT {', '.join(LISTINGS['tecnicos'][1])} FROM tecnicos WHERE id_tecnico = ?", (id_tecnico,))
         tecnico = cursor.fetchone()
         return tecnico
     except sqlite3.Error as e:
@@ -333,70 +1022,49 @@ def get_tecnico_by_id(id_tecnico):
         conn.close()
 
 def update_tecnico(id_tecnico, nombre, apellido, email, login, telefono, especialidad, fecha_ingreso, activo):
-    conn = get_db_connection()
-    if not conn: return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    def update(conn):
+        conn.execute('''
             UPDATE tecnicos
             SET nombre = ?, apellido = ?, email = ?, login = ?, telefono = ?, especialidad = ?, fecha_ingreso = ?, activo = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id_tecnico = ?
         ''', (nombre, apellido, email, login, telefono, especialidad, fecha_ingreso, activo, id_tecnico))
-        conn.commit()
-        return True
+    try:
+        execute_write(update, ('tecnicos',))
     except sqlite3.IntegrityError:
         return False
     except sqlite3.Error as e:
         print(f"Error al actualizar técnico: {e}")
         return False
-    finally:
-        conn.close()
+    invalidate_catalog('tecnicos')
+    return True
 
 def delete_tecnico(id_tecnico):
-    conn = get_db_connection()
-    if not conn: return False
     try:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM tecnicos WHERE id_tecnico = ?", (id_tecnico,))
-        conn.commit()
-        return True
+        execute_write(lambda conn: conn.execute("DELETE FROM tecnicos WHERE id_tecnico = ?", (id_tecnico,)), ('tecnicos',))
     except sqlite3.Error as e:
         print(f"Error al eliminar técnico: {e}")
         return False
-    finally:
-        conn.close()
+    invalidate_catalog('tecnicos')
+    return True
 
 # --- CRUD para Clientes ---
 def add_cliente(nombre_empresa, contacto_principal, email, telefono, direccion, ciudad, pais):
-    conn = get_db_connection()
-    if not conn: return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    def insert(conn):
+        conn.execute('''
             INSERT INTO clientes (nombre_empresa, contacto_principal, email, telefono, direccion, ciudad, pais)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (nombre_empresa, contacto_principal, email, telefono, direccion, ciudad, pais))
-        conn.commit()
-        return True
+    try:
+        execute_write(insert, ('clientes',))
     except sqlite3.Error as e:
         print(f"Error al agregar cliente: {e}")
         return False
-    finally:
-        conn.close()
+    invalidate_catalog('clientes')
+    return True
 
-def get_clientes():
-    conn = get_db_connection()
-    if not conn: return []
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM clientes")
-        clientes = cursor.fetchall()
-        return clientes
-    except sqlite3.Error as e:
-        print(f"Error al obtener clientes: {e}")
-        return []
-    finally:
-        conn.close()
+def get_clientes(columns=None, filters=None):
+    """Todos los clientes. Para recorrer muchos, mejor iter_clientes o get_clientes_page."""
+    return list(iter_clientes(columns, filters))
 
 def get_cliente_by_id(id_cliente):
     conn = get_db_connection()
@@ -413,74 +1081,336 @@ def get_cliente_by_id(id_cliente):
         conn.close()
 
 def update_cliente(id_cliente, nombre_empresa, contacto_principal, email, telefono, direccion, ciudad, pais, activo):
-    conn = get_db_connection()
-    if not conn: return False
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    def update(conn):
+        conn.execute('''
             UPDATE clientes
             SET nombre_empresa = ?, contacto_principal = ?, email = ?, telefono = ?, direccion = ?, ciudad = ?, pais = ?, activo = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id_cliente = ?
         ''', (nombre_empresa, contacto_principal, email, telefono, direccion, ciudad, pais, activo, id_cliente))
-        conn.commit()
-        return True
+    try:
+        execute_write(update, ('clientes',))
     except sqlite3.Error as e:
         print(f"Error al actualizar cliente: {e}")
         return False
-    finally:
-        conn.close()
+    invalidate_catalog('clientes')
+    return True
 
 def delete_cliente(id_cliente):
-    conn = get_db_connection()
-    if not conn: return False
     try:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM clientes WHERE id_cliente = ?", (id_cliente,))
-        conn.commit()
-        return True
+        execute_write(lambda conn: conn.execute("DELETE FROM clientes WHERE id_cliente = ?", (id_cliente,)), ('clientes',))
     except sqlite3.Error as e:
         print(f"Error al eliminar cliente: {e}")
         return False
-    finally:
-        conn.close()
+    invalidate_catalog('clientes')
+    return True
 
-# --- CRUD para Tickets ---
-def add_ticket(numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, tiempo_estimado_horas):
+# --- Listados de técnicos y clientes ---
+# Columnas explícitas (password_hash no se puede pedir) y filtros opcionales. Se leen por páginas
+# keyset sobre la clave o con un generador que recorre el cursor por bloques, así la memoria no
+# crece con el número de filas.
+
+LISTING_PAGE_SIZE = 100
+LISTING_BATCH_SIZE = 500 # Filas por fetchmany en los generadores
+
+# Tabla -> (clave, columnas que se pueden pedir, columnas por las que se puede filtrar)
+LISTINGS = {
+    'tecnicos': ('id_tecnico', ('id_tecnico', 'nombre', 'apellido', 'email', 'login', 'telefono', 'especialidad',
+                                'fecha_ingreso', 'activo', 'created_at', 'updated_at'),
+                 ('activo', 'especialidad')),
+    'clientes': ('id_cliente', ('id_cliente', 'nombre_empresa', 'contacto_principal', 'email', 'telefono', 'direccion',
+                                'ciudad', 'pais', 'activo', 'created_at', 'updated_at'),
+                 ('activo', 'ciudad', 'pais')),
+}
+
+def listing_filter_clauses(table, filters=None):
+    """Condiciones WHERE (sobre la tabla sin alias) y parámetros de los filtros de un listado.
+
+    Cada filtro es un valor o una lista de valores; None no filtra.
+    """
+    clauses, params = [], []
+    for column, value in (filters or {}).items():
+        if column not in LISTINGS[table][2]:
+            raise ValueError(f"No se puede filtrar {table} por {column}")
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            clauses.append(f"{column} IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([int(v) if isinstance(v, bool) else v for v in value]))
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    return clauses, params
+
+def listing_query(table, columns=None, filters=None, after=None, limit=None):
+    """SQL y parámetros de un listado ordenado por la clave. La clave siempre va en la primera columna."""
+    key, available, _ = LISTINGS[table]
+    columns = tuple(columns or available)
+    unknown = [column for column in columns if column not in available]
+    if unknown:
+        raise ValueError(f"Columnas no disponibles en {table}: {', '.join(unknown)}")
+    columns = (key,) + tuple(column for column in columns if column != key)
+    clauses, params = listing_filter_clauses(table, filters)
+    if after is not None:
+        clauses.append(f"{key} > ?")
+        params.append(after)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY {key}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+def _listing_page(table, columns, filters, after, limit):
     conn = get_db_connection()
-    if not conn: return False
+    if not conn: return [], None
     try:
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO tickets (numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, tiempo_estimado_horas)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, tiempo_estimado_horas))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError: # Para numero_ticket UNIQUE
-        return False
+        rows = cursor.execute(*listing_query(table, columns, filters, after, limit + 1)).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][0]
+        return rows, next_cursor
     except sqlite3.Error as e:
-        print(f"Error al agregar ticket: {e}")
-        return False
+        print(f"Error al obtener página de {table}: {e}")
+        return [], None
     finally:
         conn.close()
 
-def get_tickets():
+def _iter_listing(table, columns, filters, batch_size):
     conn = get_db_connection()
-    if not conn: return []
+    if not conn: return
     try:
         cursor = conn.cursor()
-        query = """
-        SELECT
-            tk.id_ticket, tk.numero_ticket, c.nombre_empresa,
-            t.nombre || ' ' || t.apellido AS tecnico_asignado,
-            tt.nombre AS tipo_tarea, p.nombre AS prioridad,
-            e.nombre AS estado, tk.titulo, tk.fecha_creacion
-        FROM tickets tk
-        LEFT JOIN clientes c ON tk.id_cliente = c.id_cliente
-        LEFT JOIN tecnicos t ON tk.id_tecnico_asignado = t.id_tecnico
-        LEFT JOIN tipos_tarea tt ON tk.id_tipo_tarea = tt.id_tipo_tarea
-        LEFT JOIN prioridades p ON tk.id_prioridad = p.id_prioridad
+        cursor.execute(*listing_query(table, columns, filters))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    except sqlite3.Error as e:
+        print(f"Error al recorrer {table}: {e}")
+    finally:
+        conn.close()
+
+def get_tecnicos_page(columns=None, filters=None, after=None, limit=LISTING_PAGE_SIZE):
+    """Página de técnicos por id: (filas, cursor_siguiente); `after` es el cursor de la página anterior.
+
+    filters admite activo y especialidad.
+    """
+    return _listing_page('tecnicos', columns, filters, after, limit)
+
+def iter_tecnicos(columns=None, filters=None, batch_size=LISTING_BATCH_SIZE):
+    """Generador de técnicos por id. La conexión vuelve al pool al agotarlo o al cerrarlo."""
+    return _iter_listing('tecnicos', columns, filters, batch_size)
+
+def get_clientes_page(columns=None, filters=None, after=None, limit=LISTING_PAGE_SIZE):
+    """Página de clientes por id: (filas, cursor_siguiente); `after` es el cursor de la página anterior.
+
+    filters admite activo, ciudad y pais.
+    """
+    return _listing_page('clientes', columns, filters, after, limit)
+
+def iter_clientes(columns=None, filters=None, batch_size=LISTING_BATCH_SIZE):
+    """Generador de clientes por id. La conexión vuelve al pool al agotarlo o al cerrarlo."""
+    return _iter_listing('clientes', columns, filters, batch_size)
+
+# --- CRUD para Tickets ---
+# Funciones avisadas tras cada alta, modificación o baja hecha con add_ticket/update_ticket/delete_ticket.
+# Reciben (anterior, nuevo) con las columnas de TICKET_LISTENER_COLUMNS; anterior es None en un alta
+# y nuevo es None en una baja. Solo ven las escrituras de este proceso.
+_ticket_listeners = []
+
+TICKET_LISTENER_COLUMNS = ('id_ticket', 'id_tecnico_asignado', 'id_tipo_tarea', 'id_prioridad', 'id_estado', 'tiempo_estimado_horas')
+
+def add_ticket_listener(listener):
+    if listener not in _ticket_listeners:
+        _ticket_listeners.append(listener)
+
+def remove_ticket_listener(listener):
+    if listener in _ticket_listeners:
+        _ticket_listeners.remove(listener)
+
+def _ticket_snapshot(cursor, id_ticket):
+    """Columnas de TICKET_LISTENER_COLUMNS del ticket, o None. Sin listeners no se consulta nada."""
+    if not _ticket_listeners or id_ticket is None:
+        return None
+    row = cursor.execute(f"SELECT {', '.join(TICKET_LISTENER_COLUMNS)} FROM tickets WHERE id_ticket = ?", (id_ticket,)).fetchone()
+    return dict(row) if row else None
+
+def _notify_ticket_listeners(old, new):
+    if old is None and new is None:
+        return
+    for listener in list(_ticket_listeners):
+        try:
+            listener(old, new)
+        except Exception as e: # Un listener con errores no debe deshacer una escritura ya confirmada
+            print(f"Error en un listener de tickets: {e}")
+
+# Los dos primeros estados no finales del flujo: el inicial ('Nuevo') y el de asignado ('Asignado')
+ASSIGNMENT_FLOW_QUERY = "SELECT id_estado FROM estados_ticket WHERE es_final = 0 ORDER BY orden_flujo LIMIT 2"
+
+def add_ticket(numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, tiempo_estimado_horas):
+    def insert(conn):
+        cursor = conn.cursor()
+        estado = id_estado
+        # Un ticket creado ya con técnico queda asignado, como con _ASSIGN_SQL (asignacion.py) y
+        # bulk_update_tickets: se marca fecha_asignacion y sale del estado inicial
+        if id_tecnico_asignado is not None:
+            flujo = [row[0] for row in cursor.execute(ASSIGNMENT_FLOW_QUERY)]
+            if len(flujo) == 2 and estado == flujo[0]:
+                estado = flujo[1]
+        cursor.execute('''
+            INSERT INTO tickets (numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, tiempo_estimado_horas, fecha_asignacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CASE WHEN ? IS NULL THEN NULL ELSE CURRENT_TIMESTAMP END)
+        ''', (numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, estado, titulo, descripcion, tiempo_estimado_horas, id_tecnico_asignado))
+        return _ticket_snapshot(cursor, cursor.lastrowid)
+    try:
+        new = execute_write(insert, ('tickets',))
+    except sqlite3.IntegrityError: # Para numero_ticket UNIQUE
+        return False
+    except sqlite3.Error as e:
+        print(f"Error al agregar ticket: {e}")
+        return False
+    _notify_ticket_listeners(None, new)
+    return True
+
+TICKET_LIST_COLUMNS = """
+            tk.id_ticket, tk.numero_ticket, c.nombre_empresa,
+            t.nombre || ' ' || t.apellido AS tecnico_asignado,
+            tt.nombre AS tipo_tarea, p.nombre AS prioridad,
+            e.nombre AS estado, tk.titulo, tk.fecha_creacion"""
+
+TICKET_LIST_JOINS = """
+        LEFT JOIN clientes c ON tk.id_cliente = c.id_cliente
+        LEFT JOIN tecnicos t ON tk.id_tecnico_asignado = t.id_tecnico
+        LEFT JOIN tipos_tarea tt ON tk.id_tipo_tarea = tt.id_tipo_tarea
+        LEFT JOIN prioridades p ON tk.id_prioridad = p.id_prioridad
         LEFT JOIN estados_ticket e ON tk.id_estado = e.id_estado
+"""
+
+TICKET_LIST_SELECT = f"""
+        SELECT{TICKET_LIST_COLUMNS}
+        FROM tickets tk{TICKET_LIST_JOINS}"""
+
+TICKETS_PAGE_SIZE = 50
+
+# Filtros admitidos por get_tickets_page() y la columna de `tickets` a la que se aplican
+TICKET_FILTER_COLUMNS = {
+    'id_cliente': 'tk.id_cliente',
+    'id_tecnico': 'tk.id_tecnico_asignado',
+    'id_estado': 'tk.id_estado',
+    'id_prioridad': 'tk.id_prioridad',
+    'id_tipo_tarea': 'tk.id_tipo_tarea',
+}
+
+def _sql_timestamp(value, end_of_day=False):
+    """Convierte date/datetime/str al formato de texto con el que SQLite compara fechas."""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        if end_of_day:
+            value += timedelta(days=1)
+        return value.isoformat()
+    return str(value)
+
+def ticket_filter_clauses(filters):
+    """Traduce un dict de filtros a condiciones SQL sobre el alias `tk` y sus parámetros.
+
+    Admite id_cliente, id_tecnico, id_estado, id_prioridad e id_tipo_tarea (valor o lista),
+    sin_tecnico=True, abiertos=True (estados no finales) y fecha_desde/fecha_hasta (inclusive)
+    sobre fecha_creacion.
+    """
+    clauses, params = [], []
+    for key, column in TICKET_FILTER_COLUMNS.items():
+        value = (filters or {}).get(key)
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            values = list(value)
+            if not values:
+                continue
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if not filters:
+        return clauses, params
+    if filters.get('sin_tecnico'):
+        clauses.append("tk.id_tecnico_asignado IS NULL")
+    if filters.get('abiertos'):
+        clauses.append("tk.id_estado NOT IN (SELECT id_estado FROM estados_ticket WHERE es_final = 1)")
+    if filters.get('fecha_desde'):
+        clauses.append("tk.fecha_creacion >= ?")
+        params.append(_sql_timestamp(filters['fecha_desde']))
+    if filters.get('fecha_hasta'):
+        hasta = filters['fecha_hasta']
+        if isinstance(hasta, date) and not isinstance(hasta, datetime):
+            clauses.append("tk.fecha_creacion < ?") # Día completo: hasta el inicio del día siguiente
+            params.append(_sql_timestamp(hasta, end_of_day=True))
+        else:
+            clauses.append("tk.fecha_creacion <= ?")
+            params.append(_sql_timestamp(hasta))
+    return clauses, params
+
+def ticket_page_query(after=None, limit=TICKETS_PAGE_SIZE, filters=None, include_archive=False):
+    """SQL y parámetros de una página del listado de tickets (lo usan get_tickets_page e index_advisor).
+
+    Con include_archive la página mezcla tickets y archivo.tickets (la conexión debe tener el
+    archivo adjunto) y cada fila lleva la columna `archivado` (0/1).
+    """
+    clauses, params = ticket_filter_clauses(filters)
+    if after is not None:
+        clauses.append("(tk.fecha_creacion, tk.id_ticket) < (?, ?)")
+        params.extend(after)
+    if include_archive:
+        return _archive_page_query(TICKET_ARCHIVE_BRANCH, clauses, params, limit,
+                                   f"SELECT{TICKET_LIST_COLUMNS}, tk.archivado FROM {{source}} tk{TICKET_LIST_JOINS}",
+                                   "tk.fecha_creacion DESC, tk.id_ticket DESC")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"""{TICKET_LIST_SELECT}
+        {where}
+        ORDER BY tk.fecha_creacion DESC, tk.id_ticket DESC
+        LIMIT ?
+        """
+    return sql, params + [limit + 1] # Una fila extra indica si hay página siguiente
+
+def get_tickets_page(after=None, limit=TICKETS_PAGE_SIZE, filters=None, include_archive=False):
+    """Devuelve una página de tickets, de más reciente a más antiguo, y el cursor de la siguiente.
+
+    La paginación es por clave (keyset) sobre (fecha_creacion, id_ticket): `after` es el cursor
+    devuelto por la llamada anterior y el coste de cada página no depende de su posición.
+    Con include_archive se incluyen los tickets archivados (si existe el archivo).
+    Devuelve (filas, cursor_siguiente); cursor_siguiente es None en la última página.
+    """
+    conn = get_db_connection()
+    if not conn: return [], None
+    attached = False
+    try:
+        cursor = conn.cursor()
+        attached = include_archive and _attach_archive(conn)
+        cursor.execute(*ticket_page_query(after, limit, filters, include_archive=attached))
+        rows = cursor.fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]['fecha_creacion'], rows[-1]['id_ticket'])
+        return rows, next_cursor
+    except sqlite3.Error as e:
+        print(f"Error al obtener página de tickets: {e}")
+        return [], None
+    finally:
+        if attached:
+            _detach_archive(conn)
+        conn.close()
+
+def get_tickets():
+    conn = get_db_connection()
+    if not conn: return []
+    try:
+        cursor = conn.cursor()
+        query = f"""{TICKET_LIST_SELECT}
         ORDER BY tk.fecha_creacion DESC
         """
         cursor.execute(query)
@@ -492,9 +1422,12 @@ def get_tickets():
     finally:
         conn.close()
 
-def get_ticket_by_id(id_ticket):
+def get_ticket_by_id(id_ticket, include_archive=False):
+    """Ticket con los nombres de sus catálogos. Con include_archive, si no está en tickets se busca
+    en el archivo (la fila trae entonces fecha_archivado)."""
     conn = get_db_connection()
     if not conn: return None
+    attached = False
     try:
         cursor = conn.cursor()
         query = """
@@ -503,7 +1436,7 @@ def get_ticket_by_id(id_ticket):
             t.nombre || ' ' || t.apellido AS tecnico_asignado,
             tt.nombre AS tipo_tarea, p.nombre AS prioridad,
             e.nombre AS estado
-        FROM tickets tk
+        FROM {schema}.tickets tk
         LEFT JOIN clientes c ON tk.id_cliente = c.id_cliente
         LEFT JOIN tecnicos t ON tk.id_tecnico_asignado = t.id_tecnico
         LEFT JOIN tipos_tarea tt ON tk.id_tipo_tarea = tt.id_tipo_tarea
@@ -511,83 +1444,1808 @@ def get_ticket_by_id(id_ticket):
         LEFT JOIN estados_ticket e ON tk.id_estado = e.id_estado
         WHERE tk.id_ticket = ?
         """
-        cursor.execute(query, (id_ticket,))
+        cursor.execute(query.format(schema='main'), (id_ticket,))
         ticket = cursor.fetchone()
+        if ticket is None and include_archive:
+            attached = _attach_archive(conn)
+            if attached:
+                ticket = cursor.execute(query.format(schema=ARCHIVE_SCHEMA), (id_ticket,)).fetchone()
         return ticket
     except sqlite3.Error as e:
         print(f"Error al obtener ticket por ID: {e}")
         return None
     finally:
+        if attached:
+            _detach_archive(conn)
         conn.close()
 
 def update_ticket(id_ticket, numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, fecha_asignacion, fecha_cierre, tiempo_estimado_horas):
-    conn = get_db_connection()
-    if not conn: return False
-    try:
+    def update(conn):
         cursor = conn.cursor()
+        old = _ticket_snapshot(cursor, id_ticket)
         cursor.execute('''
             UPDATE tickets
             SET numero_ticket = ?, id_cliente = ?, id_tecnico_asignado = ?, id_tipo_tarea = ?, id_prioridad = ?, id_estado = ?,
                 titulo = ?, descripcion = ?, fecha_asignacion = ?, fecha_cierre = ?, tiempo_estimado_horas = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id_ticket = ?
         ''', (numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, fecha_asignacion, fecha_cierre, tiempo_estimado_horas, id_ticket))
-        conn.commit()
-        return True
+        return old, _ticket_snapshot(cursor, id_ticket)
+    try:
+        old, new = execute_write(update, ('tickets',))
     except sqlite3.Error as e:
         print(f"Error al actualizar ticket: {e}")
         return False
+    _notify_ticket_listeners(old, new)
+    return True
+
+def delete_ticket(id_ticket):
+    def delete(conn):
+        cursor = conn.cursor()
+        old = _ticket_snapshot(cursor, id_ticket)
+        cursor.execute("DELETE FROM registros_actividad WHERE id_ticket = ?", (id_ticket,)) # Considerar borrar dependientes
+        cursor.execute("DELETE FROM tickets WHERE id_ticket = ?", (id_ticket,))
+        return old
+    try:
+        old = execute_write(delete, ('tickets', 'registros_actividad'))
+    except sqlite3.Error as e:
+        print(f"Error al eliminar ticket: {e}")
+        return False
+    _notify_ticket_listeners(old, None)
+    return True
+
+# --- Operaciones masivas sobre tickets ---
+# Una sola sentencia UPDATE por operación, sobre una lista de id_ticket o sobre los tickets que cumplen
+# unos filtros (los del listado), en lugar de una llamada a update_ticket por ticket.
+
+BULK_TICKET_FIELDS = ('id_estado', 'id_tecnico_asignado', 'id_prioridad')
+
+# Columnas que acompañan a cada cambio (el ? es el valor nuevo). Al pasar a un estado final se pone
+# fecha_cierre (si no la tenía) y al volver a uno no final se borra; asignar un técnico conserva la
+# primera fecha_asignacion.
+_BULK_SIDE_EFFECTS = {
+    'id_estado': "fecha_cierre = CASE WHEN (SELECT es_final FROM estados_ticket WHERE id_estado = ?) = 1 "
+                 "THEN COALESCE(fecha_cierre, CURRENT_TIMESTAMP) ELSE NULL END",
+    'id_tecnico_asignado': "fecha_asignacion = CASE WHEN ? IS NULL THEN fecha_asignacion "
+                           "ELSE COALESCE(fecha_asignacion, CURRENT_TIMESTAMP) END",
+}
+
+def bulk_update_tickets(changes, ids=None, filters=None):
+    """Cambia estado, técnico y/o prioridad (`changes`, claves de BULK_TICKET_FIELDS) de varios tickets.
+
+    Los tickets se eligen por `ids` o, si es None, por `filters` (los de ticket_filter_clauses, al menos
+    uno). Todo ocurre en una transacción. Devuelve {'seleccionados': n, 'modificados': n} (solo cuentan
+    como modificados los tickets que cambian de valor) o None si hay un error.
+    """
+    unknown = set(changes) - set(BULK_TICKET_FIELDS)
+    if not changes or unknown:
+        print(f"Error en la operación masiva: cambios no válidos {sorted(unknown) or '(ninguno)'}")
+        return None
+    if ids is not None:
+        ticket_ids, invalid = [], []
+        for value in ids:
+            try:
+                ticket_ids.append(int(value))
+            except (TypeError, ValueError):
+                invalid.append(value)
+        if invalid:
+            print(f"Error en la operación masiva: ids de ticket no válidos {invalid}")
+            return None
+        clauses, target_params = ["tk.id_ticket IN (SELECT value FROM json_each(?))"], [json.dumps(ticket_ids)]
+    else:
+        clauses, target_params = ticket_filter_clauses(filters)
+        if not clauses: # Sin filtros se modificarían todos los tickets: se exige una selección explícita
+            print("Error en la operación masiva: indica una lista de tickets o algún filtro.")
+            return None
+    fields = list(changes)
+    assignments = [f"{field} = ?" for field in fields] + [_BULK_SIDE_EFFECTS[f] for f in fields if f in _BULK_SIDE_EFFECTS]
+    set_params = [changes[f] for f in fields] + [changes[f] for f in fields if f in _BULK_SIDE_EFFECTS]
+    # Solo se tocan los tickets que cambian de valor: así rowcount, updated_at y los triggers son exactos
+    target = ' AND '.join(clauses)
+    where = f"({target}) AND ({' OR '.join(f'tk.{f} IS NOT ?' for f in fields)})"
+    where_params = list(target_params) + [changes[f] for f in fields]
+
+    def update(conn):
+        cursor = conn.cursor()
+        if 'id_estado' in changes and not cursor.execute("SELECT 1 FROM estados_ticket WHERE id_estado = ?", (changes['id_estado'],)).fetchone():
+            raise sqlite3.IntegrityError(f"el estado {changes['id_estado']} no existe")
+        selected = cursor.execute(f"SELECT COUNT(*) FROM tickets AS tk WHERE {target}", target_params).fetchone()[0]
+        old = {}
+        if _ticket_listeners: # Los listeners necesitan el antes y el después de cada ticket modificado
+            rows = cursor.execute(f"SELECT {', '.join(TICKET_LISTENER_COLUMNS)} FROM tickets AS tk WHERE {where}", where_params)
+            old = {row['id_ticket']: dict(row) for row in rows}
+        cursor.execute(f"UPDATE tickets AS tk SET {', '.join(assignments)}, updated_at = CURRENT_TIMESTAMP WHERE {where}",
+                       set_params + where_params)
+        modified = cursor.rowcount
+        new = {}
+        if old:
+            rows = cursor.execute(f"SELECT {', '.join(TICKET_LISTENER_COLUMNS)} FROM tickets WHERE id_ticket IN (SELECT value FROM json_each(?))",
+                                  (json.dumps(list(old)),))
+            new = {row['id_ticket']: dict(row) for row in rows}
+        return selected, modified, old, new
+    try:
+        selected, modified, old, new = execute_write(update, ('tickets',))
+    except sqlite3.Error as e:
+        print(f"Error en la operación masiva sobre tickets: {e}")
+        return None
+    for id_ticket, before in old.items():
+        _notify_ticket_listeners(before, new.get(id_ticket))
+    return {'seleccionados': selected, 'modificados': modified}
+
+# --- CRUD para Registros de Actividad ---
+# Cada registro es una imputación de horas de un técnico a un ticket. totales_ticket guarda por
+# ticket la suma de horas, el número de registros y la última fecha de actividad; los triggers la
+# mantienen en cada escritura, así la vista de un ticket no vuelve a agregar todo su historial.
+
+ACTIVITY_PAGE_SIZE = 25
+
+INSERT_REGISTRO_SQL = '''
+    INSERT INTO registros_actividad (id_ticket, id_tecnico, id_modalidad, fecha_actividad,
+                                     tiempo_dedicado_horas, descripcion_trabajo, observaciones)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+REGISTRO_FIELDS = ('id_ticket', 'id_tecnico', 'id_modalidad', 'fecha_actividad',
+                   'tiempo_dedicado_horas', 'descripcion_trabajo', 'observaciones')
+
+def _registro_params(registro):
+    """Tupla de parámetros de INSERT_REGISTRO_SQL a partir de un dict (o de una tupla ya ordenada)."""
+    if isinstance(registro, dict):
+        registro = tuple(registro.get(field) for field in REGISTRO_FIELDS)
+    if len(registro) != len(REGISTRO_FIELDS):
+        raise ValueError(f"Un registro de actividad tiene {len(REGISTRO_FIELDS)} campos: {', '.join(REGISTRO_FIELDS)}")
+    id_ticket, id_tecnico, id_modalidad, fecha, horas, descripcion, observaciones = registro
+    if horas is None or float(horas) <= 0:
+        raise ValueError(f"tiempo_dedicado_horas debe ser positivo: {horas!r}")
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    return (id_ticket, id_tecnico, id_modalidad, fecha.isoformat() if isinstance(fecha, date) else fecha,
+            float(horas), descripcion, observaciones)
+
+def add_registros_actividad(registros):
+    """Inserta varios registros de actividad en una sola transacción (todos o ninguno).
+
+    Cada registro es un dict con las claves de REGISTRO_FIELDS o una tupla en ese orden.
+    Devuelve el número de registros insertados, o False si alguno no es válido.
+    """
+    try:
+        rows = [_registro_params(registro) for registro in registros]
+    except (TypeError, ValueError) as e:
+        print(f"Error en los registros de actividad: {e}")
+        return False
+    if not rows:
+        return 0
+    def insert(conn):
+        cursor = conn.cursor()
+        # foreign_keys está desactivado (valor por defecto de SQLite): se comprueban los tickets a mano
+        tickets = {row[0] for row in cursor.execute(
+            "SELECT id_ticket FROM tickets WHERE id_ticket IN (SELECT value FROM json_each(?))",
+            (json.dumps(sorted({row[0] for row in rows})),))}
+        missing = {row[0] for row in rows} - tickets
+        if missing:
+            raise sqlite3.IntegrityError(f"tickets inexistentes {sorted(missing)}")
+        cursor.executemany(INSERT_REGISTRO_SQL, rows)
+        return len(rows)
+    try:
+        return execute_write(insert, ('registros_actividad',))
+    except sqlite3.Error as e:
+        print(f"Error al agregar registros de actividad: {e}")
+        return False
+
+def add_registro_actividad(id_ticket, id_tecnico, id_modalidad, fecha_actividad, tiempo_dedicado_horas, descripcion_trabajo=None, observaciones=None):
+    return add_registros_actividad([(id_ticket, id_tecnico, id_modalidad, fecha_actividad,
+                                     tiempo_dedicado_horas, descripcion_trabajo, observaciones)]) == 1
+
+def delete_registro_actividad(id_registro):
+    try:
+        return execute_write(lambda conn: conn.execute("DELETE FROM registros_actividad WHERE id_registro = ?", (id_registro,)).rowcount > 0, ('registros_actividad',))
+    except sqlite3.Error as e:
+        print(f"Error al eliminar registro de actividad: {e}")
+        return False
+
+ACTIVITY_HISTORY_COLUMNS = """
+            r.id_registro, r.id_ticket, r.numero_ticket, r.titulo,
+            r.id_tecnico, t.nombre || ' ' || t.apellido AS tecnico,
+            m.nombre AS modalidad, r.fecha_actividad, r.tiempo_dedicado_horas,
+            r.descripcion_trabajo, r.observaciones"""
+
+ACTIVITY_HISTORY_JOINS = """
+        LEFT JOIN tecnicos t ON r.id_tecnico = t.id_tecnico
+        LEFT JOIN modalidades_trabajo m ON r.id_modalidad = m.id_modalidad
+"""
+
+ACTIVITY_HISTORY_SELECT = f"""
+        SELECT{ACTIVITY_HISTORY_COLUMNS}
+        FROM (SELECT r.*, tk.numero_ticket, tk.titulo FROM registros_actividad r
+              JOIN tickets tk ON r.id_ticket = tk.id_ticket) r{ACTIVITY_HISTORY_JOINS}"""
+
+def _get_activity_page(column, value, after, limit, include_archive=False):
+    conn = get_db_connection()
+    if not conn: return [], None
+    attached = False
+    try:
+        clauses, params = [f"r.{column} = ?"], [value]
+        if after is not None:
+            clauses.append("(r.fecha_actividad, r.id_registro) < (?, ?)")
+            params.extend(after)
+        cursor = conn.cursor()
+        attached = include_archive and _attach_archive(conn)
+        if attached:
+            cursor.execute(*_archive_page_query(ACTIVITY_ARCHIVE_BRANCH, clauses, params, limit,
+                                                f"SELECT{ACTIVITY_HISTORY_COLUMNS}, r.archivado FROM {{source}} r{ACTIVITY_HISTORY_JOINS}",
+                                                "r.fecha_actividad DESC, r.id_registro DESC"))
+        else:
+            cursor.execute(f"""{ACTIVITY_HISTORY_SELECT}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY r.fecha_actividad DESC, r.id_registro DESC
+        LIMIT ?
+        """, params + [limit + 1])
+        rows = cursor.fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]['fecha_actividad'], rows[-1]['id_registro'])
+        return rows, next_cursor
+    except sqlite3.Error as e:
+        print(f"Error al obtener historial de actividad: {e}")
+        return [], None
     finally:
+        if attached:
+            _detach_archive(conn)
         conn.close()
 
-def delete_ticket(id_ticket):
+def get_registros_ticket_page(id_ticket, after=None, limit=ACTIVITY_PAGE_SIZE, include_archive=False):
+    """Historial de actividad de un ticket, del más reciente al más antiguo (keyset como get_tickets_page)."""
+    return _get_activity_page('id_ticket', id_ticket, after, limit, include_archive)
+
+def get_registros_tecnico_page(id_tecnico, after=None, limit=ACTIVITY_PAGE_SIZE, include_archive=False):
+    """Historial de actividad de un técnico, del más reciente al más antiguo."""
+    return _get_activity_page('id_tecnico', id_tecnico, after, limit, include_archive)
+
+def get_ticket_totales(id_ticket):
+    """Horas dedicadas frente a estimadas de un ticket, leídas de totales_ticket (sin agregar)."""
     conn = get_db_connection()
-    if not conn: return False
+    if not conn: return None
     try:
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM registros_actividad WHERE id_ticket = ?", (id_ticket,)) # Considerar borrar dependientes
-        cursor.execute("DELETE FROM tickets WHERE id_ticket = ?", (id_ticket,))
+        cursor.execute("""
+        SELECT tk.id_ticket, tk.tiempo_estimado_horas,
+               COALESCE(tt.horas_dedicadas, 0) AS horas_dedicadas,
+               COALESCE(tt.num_registros, 0) AS num_registros,
+               tt.ultima_actividad
+        FROM tickets tk
+        LEFT JOIN totales_ticket tt ON tt.id_ticket = tk.id_ticket
+        WHERE tk.id_ticket = ?
+        """, (id_ticket,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        totales = dict(row)
+        estimado = totales['tiempo_estimado_horas']
+        totales['horas_restantes'] = estimado - totales['horas_dedicadas'] if estimado is not None else None
+        return totales
+    except sqlite3.Error as e:
+        print(f"Error al obtener totales del ticket: {e}")
+        return None
+    finally:
+        conn.close()
+
+def get_ticket_ids_by_numero(numeros, include_archive=False):
+    """Devuelve {numero_ticket: id_ticket} de los números que existen, con una sola consulta.
+
+    Con include_archive se buscan también en el archivo; si un número está en los dos, gana el vivo.
+    """
+    conn = get_db_connection()
+    if not conn: return {}
+    attached = False
+    try:
+        cursor = conn.cursor()
+        schemas = ['main']
+        attached = include_archive and _attach_archive(conn)
+        if attached:
+            schemas.insert(0, ARCHIVE_SCHEMA)
+        cursor.execute(" UNION ALL ".join(f"SELECT numero_ticket, id_ticket FROM {schema}.tickets WHERE numero_ticket IN (SELECT value FROM json_each(?))"
+                                          for schema in schemas), [json.dumps(list(numeros))] * len(schemas))
+        return {row['numero_ticket']: row['id_ticket'] for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"Error al buscar tickets por número: {e}")
+        return {}
+    finally:
+        if attached:
+            _detach_archive(conn)
+        conn.close()
+
+# --- Archivo de tickets cerrados ---
+# Los tickets en estado final (estados_ticket.es_final = 1) cerrados hace más de ARCHIVE_AFTER_DAYS días
+# se mueven, con sus registros de actividad, a un archivo SQLite aparte que se adjunta (ATTACH) solo
+# cuando hace falta: así tickets y registros_actividad, y sus índices, solo guardan los datos vivos.
+# Al borrarlos de las tablas principales los triggers actualizan contadores, resúmenes, totales y el
+# índice de búsqueda, que pasan a reflejar solo los datos vivos. Las lecturas con include_archive=True
+# (get_tickets_page, get_ticket_by_id, get_registros_*_page) ven también los archivados.
+
+ARCHIVE_SCHEMA = 'archivo'
+ARCHIVE_AFTER_DAYS = int(os.environ.get('TICKETS_ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = 500 # Tickets por transacción: cada lote bloquea la escritura poco tiempo
+
+ARCHIVE_COLUMNS = {
+    'tickets': ('id_ticket', 'numero_ticket', 'id_cliente', 'id_tecnico_asignado', 'id_tipo_tarea', 'id_prioridad',
+                'id_estado', 'titulo', 'descripcion', 'fecha_creacion', 'fecha_asignacion', 'fecha_cierre',
+                'tiempo_estimado_horas', 'created_at', 'updated_at'),
+    'registros_actividad': ('id_registro', 'id_ticket', 'id_tecnico', 'id_modalidad', 'fecha_actividad',
+                            'tiempo_dedicado_horas', 'descripcion_trabajo', 'observaciones', 'created_at'),
+}
+
+# Mismas columnas que las tablas principales, sin claves foráneas: los catálogos siguen en la base principal
+ARCHIVE_SCHEMA_SQL = (
+    f"""CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.tickets (
+        id_ticket INTEGER PRIMARY KEY,
+        numero_ticket VARCHAR(20) UNIQUE,
+        id_cliente INTEGER NOT NULL,
+        id_tecnico_asignado INTEGER,
+        id_tipo_tarea INTEGER NOT NULL,
+        id_prioridad INTEGER NOT NULL,
+        id_estado INTEGER NOT NULL,
+        titulo VARCHAR(200) NOT NULL,
+        descripcion TEXT,
+        fecha_creacion DATETIME,
+        fecha_asignacion DATETIME,
+        fecha_cierre DATETIME,
+        tiempo_estimado_horas REAL,
+        created_at DATETIME,
+        updated_at DATETIME,
+        fecha_archivado DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""",
+    f"""CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.registros_actividad (
+        id_registro INTEGER PRIMARY KEY,
+        id_ticket INTEGER NOT NULL,
+        id_tecnico INTEGER NOT NULL,
+        id_modalidad INTEGER NOT NULL,
+        fecha_actividad DATE NOT NULL,
+        tiempo_dedicado_horas REAL NOT NULL,
+        descripcion_trabajo TEXT,
+        observaciones TEXT,
+        created_at DATETIME
+    )""",
+    f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archivo_tickets_fecha ON tickets(fecha_creacion)",
+    f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archivo_tickets_cliente_fecha ON tickets(id_cliente, fecha_creacion)",
+    f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archivo_registros_ticket_fecha ON registros_actividad(id_ticket, fecha_actividad)",
+    f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archivo_registros_tecnico_fecha ON registros_actividad(id_tecnico, fecha_actividad)",
+)
+
+# Ramas de las lecturas unificadas: (SELECT de una base, condición extra para el archivo). La condición
+# descarta filas que también siguen en la base principal: en modo WAL una transacción sobre dos archivos
+# no es atómica entre ellos, y si se corta entre los dos commits el ticket queda copiado pero sin borrar
+# (la siguiente ejecución de archive_closed_tickets lo termina de mover).
+TICKET_ARCHIVE_BRANCH = (
+    f"SELECT {', '.join('tk.' + c for c in ARCHIVE_COLUMNS['tickets'])}, {{archivado}} AS archivado FROM {{schema}}.tickets tk",
+    "NOT EXISTS (SELECT 1 FROM main.tickets h WHERE h.id_ticket = tk.id_ticket)",
+)
+ACTIVITY_ARCHIVE_BRANCH = (
+    f"SELECT {', '.join('r.' + c for c in ARCHIVE_COLUMNS['registros_actividad'])}, tk.numero_ticket, tk.titulo, "
+    "{archivado} AS archivado FROM {schema}.registros_actividad r JOIN {schema}.tickets tk ON r.id_ticket = tk.id_ticket",
+    "NOT EXISTS (SELECT 1 FROM main.registros_actividad h WHERE h.id_registro = r.id_registro)",
+)
+
+_ARCHIVE_CANDIDATES = """
+    SELECT tk.id_ticket FROM main.tickets tk
+    WHERE tk.id_estado IN (SELECT id_estado FROM main.estados_ticket WHERE es_final = 1)
+      AND COALESCE(tk.fecha_cierre, tk.updated_at) < ?
+    ORDER BY tk.id_ticket
+    LIMIT ?
+"""
+
+def archive_database_path():
+    """Archivo de tickets archivados: TICKETS_ARCHIVE_DB o <base de datos>_archivo.db junto a la principal."""
+    return os.environ.get('TICKETS_ARCHIVE_DB') or f"{os.path.splitext(DATABASE_NAME)[0]}_archivo.db"
+
+def _attach_archive(conn, create=False):
+    """Adjunta el archivo a la conexión como ARCHIVE_SCHEMA. Sin create, devuelve False si aún no existe."""
+    if any(row[1] == ARCHIVE_SCHEMA for row in conn.execute("PRAGMA database_list")):
+        return True
+    path = archive_database_path()
+    if not create and not os.path.exists(path):
+        return False
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+    if create:
+        for sql in ARCHIVE_SCHEMA_SQL:
+            conn.execute(sql)
         conn.commit()
+    return True
+
+def _detach_archive(conn):
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+    except sqlite3.Error as e: # Se queda adjunto en la conexión del pool; _attach_archive lo detecta
+        print(f"Error al separar el archivo de tickets: {e}")
+
+def _archive_page_query(branch, clauses, params, limit, outer, order_by):
+    """Página keyset sobre la base principal y el archivo adjunto.
+
+    Cada rama aplica `clauses` y devuelve como mucho limit + 1 filas ya ordenadas (usando sus propios
+    índices); la consulta exterior (`outer`, con {source}) las mezcla, une los catálogos y vuelve a cortar.
+    """
+    select, archive_only = branch
+    branches = []
+    for schema, archivado in (('main', 0), (ARCHIVE_SCHEMA, 1)):
+        conditions = clauses + ([archive_only] if archivado else [])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        branches.append(f"SELECT * FROM ({select.format(schema=schema, archivado=archivado)} {where} ORDER BY {order_by} LIMIT ?)")
+    sql = f"""{outer.format(source='(' + ' UNION ALL '.join(branches) + ')')}
+        ORDER BY {order_by}
+        LIMIT ?
+        """
+    branch_params = list(params) + [limit + 1]
+    return sql, branch_params + branch_params + [limit + 1]
+
+def archive_closed_tickets(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, limit=None, dry_run=False):
+    """Mueve al archivo los tickets en estado final cerrados hace más de `older_than_days` días.
+
+    Cada lote de `batch_size` tickets (con sus registros de actividad) se copia y se borra de las
+    tablas principales en una operación de la cola de escritura. Con dry_run solo cuenta lo que se movería.
+    Devuelve {'tickets': n, 'registros': n, 'lotes': n} o None si hay un error.
+    """
+    cutoff = _sql_timestamp(datetime.now() - timedelta(days=older_than_days))
+    ticket_columns = ', '.join(ARCHIVE_COLUMNS['tickets'])
+    registro_columns = ', '.join(ARCHIVE_COLUMNS['registros_actividad'])
+
+    def move(conn, size):
+        ids = [row[0] for row in conn.execute(_ARCHIVE_CANDIDATES, (cutoff, size))]
+        if not ids:
+            return None
+        batch = (json.dumps(ids),)
+        old = []
+        if _ticket_listeners:
+            old = [dict(row) for row in conn.execute(f"SELECT {', '.join(TICKET_LISTENER_COLUMNS)} FROM main.tickets "
+                                                     "WHERE id_ticket IN (SELECT value FROM json_each(?))", batch)]
+        # INSERT OR REPLACE: un lote copiado a medias en una ejecución anterior se vuelve a copiar
+        conn.execute(f"""INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.tickets ({ticket_columns})
+            SELECT {ticket_columns} FROM main.tickets WHERE id_ticket IN (SELECT value FROM json_each(?))""", batch)
+        registros = conn.execute(f"""INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.registros_actividad ({registro_columns})
+            SELECT {registro_columns} FROM main.registros_actividad WHERE id_ticket IN (SELECT value FROM json_each(?))""", batch).rowcount
+        conn.execute("DELETE FROM main.registros_actividad WHERE id_ticket IN (SELECT value FROM json_each(?))", batch)
+        conn.execute("DELETE FROM main.tickets WHERE id_ticket IN (SELECT value FROM json_each(?))", batch)
+        return len(ids), registros, old
+
+    if dry_run:
+        conn = get_db_connection()
+        if not conn: return None
+        try:
+            cursor = conn.cursor()
+            ids = [row[0] for row in cursor.execute(_ARCHIVE_CANDIDATES, (cutoff, -1 if limit is None else limit))]
+            registros = cursor.execute("SELECT COUNT(*) FROM registros_actividad WHERE id_ticket IN (SELECT value FROM json_each(?))",
+                                       (json.dumps(ids),)).fetchone()[0]
+            return {'tickets': len(ids), 'registros': registros, 'lotes': 0}
+        except sqlite3.Error as e:
+            print(f"Error al archivar tickets: {e}")
+            return None
+        finally:
+            conn.close()
+
+    # Sin conexión propia mientras los lotes pasan por la cola: el escritor necesita una del pool
+    stats = {'tickets': 0, 'registros': 0, 'lotes': 0}
+    try:
+        while limit is None or stats['tickets'] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - stats['tickets'])
+            moved = execute_write(lambda conn: move(conn, size), ('tickets', 'registros_actividad'), archive=True)
+            if moved is None:
+                break
+            stats['tickets'] += moved[0]
+            stats['registros'] += moved[1]
+            stats['lotes'] += 1
+            for ticket in moved[2]:
+                _notify_ticket_listeners(ticket, None)
+    except sqlite3.Error as e:
+        print(f"Error al archivar tickets: {e}")
+        return None
+    if stats['tickets']:
+        conn = get_db_connection()
+        if conn:
+            try:
+                _optimize(conn) # Las estadísticas del planificador cambian al vaciar las tablas principales
+            finally:
+                conn.close()
+    return stats
+
+def get_archive_stats(older_than_days=ARCHIVE_AFTER_DAYS):
+    """Tamaño del archivo y tickets pendientes de archivar. Devuelve un dict o None si hay un error."""
+    conn = get_db_connection()
+    if not conn: return None
+    attached = False
+    try:
+        cursor = conn.cursor()
+        cutoff = _sql_timestamp(datetime.now() - timedelta(days=older_than_days))
+        stats = {
+            'ruta': archive_database_path(), 'tickets': 0, 'registros': 0, 'ultimo_archivado': None,
+            'pendientes': cursor.execute(f"SELECT COUNT(*) FROM ({_ARCHIVE_CANDIDATES})", (cutoff, -1)).fetchone()[0],
+        }
+        attached = _attach_archive(conn)
+        if attached:
+            row = cursor.execute(f"SELECT COUNT(*), MAX(fecha_archivado) FROM {ARCHIVE_SCHEMA}.tickets").fetchone()
+            stats['tickets'], stats['ultimo_archivado'] = row[0], row[1]
+            stats['registros'] = cursor.execute(f"SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.registros_actividad").fetchone()[0]
+        return stats
+    except sqlite3.Error as e:
+        print(f"Error al obtener estadísticas del archivo: {e}")
+        return None
+    finally:
+        if attached:
+            _detach_archive(conn)
+        conn.close()
+
+# --- Lectura en columnas (DataFrames tipados) ---
+# Alternativa a pd.DataFrame(lista de sqlite3.Row) para los listados: solo se leen las columnas pedidas,
+# las fechas llegan de SQLite como segundos desde 1970 y se ven como datetime64 sin parsear texto, y los
+# nombres de cliente, técnico, tipo, prioridad y estado no se unen en SQL: se leen sus ids y se
+# construyen categóricas con una tabla de traducción sobre el catálogo completo.
+
+EPOCH_NAT = np.iinfo(np.int64).min # NaT de datetime64 visto como entero: los NULL llegan ya convertidos
+_NULL_ID = -1
+
+def epoch_sql(column):
+    """Expresión SQL con los segundos desde 1970 de una fecha (EPOCH_NAT si es NULL)."""
+    # unixepoch() (SQLite 3.38+) es bastante más rápida que strftime('%s') y da el mismo resultado
+    if sqlite3.sqlite_version_info >= (3, 38, 0):
+        return f"COALESCE(unixepoch({column}), {EPOCH_NAT})"
+    return f"COALESCE(CAST(strftime('%s', {column}) AS INTEGER), {EPOCH_NAT})"
+
+# Categóricas a partir de un id: columna del DataFrame -> (columna de id, consulta id/nombre en el orden
+# de las categorías). Se leen todas las filas del catálogo, también las inactivas.
+FRAME_CATEGORIES = {
+    'nombre_empresa': ('id_cliente', "SELECT id_cliente, nombre_empresa FROM clientes ORDER BY nombre_empresa"),
+    'tecnico_asignado': ('id_tecnico_asignado', "SELECT id_tecnico, nombre || ' ' || apellido FROM tecnicos ORDER BY 2"),
+    'tipo_tarea': ('id_tipo_tarea', "SELECT id_tipo_tarea, nombre FROM tipos_tarea ORDER BY nombre"),
+    'prioridad': ('id_prioridad', "SELECT id_prioridad, nombre FROM prioridades ORDER BY nivel"),
+    'estado': ('id_estado', "SELECT id_estado, nombre FROM estados_ticket ORDER BY orden_flujo"),
+}
+
+# Tipo de cada columna que se puede pedir: int, id (entero con NULL), real, text, category (texto
+# repetido), datetime o catalog (FRAME_CATEGORIES). password_hash no está: nunca sale en un DataFrame.
+FRAME_COLUMNS = {
+    'tickets': {
+        'id_ticket': 'int', 'numero_ticket': 'text', 'id_cliente': 'int', 'id_tecnico_asignado': 'id',
+        'id_tipo_tarea': 'int', 'id_prioridad': 'int', 'id_estado': 'int', 'titulo': 'text', 'descripcion': 'text',
+        'fecha_creacion': 'datetime', 'fecha_asignacion': 'datetime', 'fecha_cierre': 'datetime',
+        'tiempo_estimado_horas': 'real', 'created_at': 'datetime', 'updated_at': 'datetime',
+        'nombre_empresa': 'catalog', 'tecnico_asignado': 'catalog', 'tipo_tarea': 'catalog',
+        'prioridad': 'catalog', 'estado': 'catalog',
+    },
+    'tecnicos': {
+        'id_tecnico': 'int', 'nombre': 'text', 'apellido': 'text', 'email': 'text', 'login': 'text',
+        'telefono': 'text', 'especialidad': 'category', 'fecha_ingreso': 'datetime', 'activo': 'int',
+        'created_at': 'datetime', 'updated_at': 'datetime',
+    },
+    'clientes': {
+        'id_cliente': 'int', 'nombre_empresa': 'text', 'contacto_principal': 'text', 'email': 'text',
+        'telefono': 'text', 'direccion': 'text', 'ciudad': 'category', 'pais': 'category', 'activo': 'int',
+        'created_at': 'datetime', 'updated_at': 'datetime',
+    },
+}
+
+# Columnas del listado de tickets de app.py (las de TICKET_LIST_COLUMNS)
+TICKET_LIST_FRAME_COLUMNS = ('id_ticket', 'numero_ticket', 'nombre_empresa', 'tecnico_asignado', 'tipo_tarea',
+                             'prioridad', 'estado', 'titulo', 'fecha_creacion')
+
+def _frame_expression(table, column, alias):
+    kind = FRAME_COLUMNS[table][column]
+    if kind == 'catalog':
+        return f"COALESCE({alias}.{FRAME_CATEGORIES[column][0]}, {_NULL_ID})"
+    if kind == 'id':
+        return f"COALESCE({alias}.{column}, {_NULL_ID})"
+    if kind == 'datetime':
+        return epoch_sql(f"{alias}.{column}")
+    return f"{alias}.{column}"
+
+def _catalog_codes(cursor, column, ids):
+    """Categorical de `column` a partir de sus ids (NULL o id desconocido -> valor ausente)."""
+    pairs = cursor.execute(FRAME_CATEGORIES[column][1]).fetchall() if len(ids) else []
+    labels = list(dict.fromkeys(label for _, label in pairs)) # Sin repetidos: dos clientes pueden llamarse igual
+    position = {label: i for i, label in enumerate(labels)}
+    lookup = np.full(max([key for key, _ in pairs] + [int(ids.max(initial=0))]) + 1, -1, dtype=np.int32)
+    for key, label in pairs:
+        lookup[key] = position[label]
+    codes = np.where(ids >= 0, lookup[np.clip(ids, 0, None)], -1)
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+def _build_frame(cursor, table, columns, rows):
+    """DataFrame con las primeras len(columns) columnas de `rows` (tuplas), según FRAME_COLUMNS."""
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    data = {}
+    for column, raw in zip(columns, values):
+        kind = FRAME_COLUMNS[table][column]
+        if kind in ('int', 'id', 'catalog', 'datetime'):
+            array = np.array(raw, dtype=np.int64)
+            if kind == 'catalog':
+                data[column] = _catalog_codes(cursor, column, array)
+            elif kind == 'id':
+                data[column] = pd.arrays.IntegerArray(array, array == _NULL_ID)
+            elif kind == 'datetime':
+                data[column] = array.view('datetime64[s]')
+            else:
+                data[column] = array
+        elif kind == 'real':
+            data[column] = np.array(raw, dtype=np.float64) # None -> NaN
+        elif kind == 'category':
+            data[column] = pd.Categorical(raw)
+        else:
+            data[column] = np.array(raw, dtype=object)
+    return pd.DataFrame(data, columns=list(columns))
+
+def _frame_columns(table, columns):
+    columns = tuple(columns or FRAME_COLUMNS[table])
+    unknown = [column for column in columns if column not in FRAME_COLUMNS[table]]
+    if unknown:
+        raise ValueError(f"Columnas no disponibles en {table}: {', '.join(unknown)}")
+    return columns
+
+def get_table_frame(table, columns=None, filters=None):
+    """DataFrame tipado de tecnicos o clientes con solo las columnas pedidas (filtros de listing_filter_clauses)."""
+    columns = _frame_columns(table, columns)
+    key = LISTINGS[table][0]
+    clauses, params = listing_filter_clauses(table, filters)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    conn = get_db_connection()
+    if not conn: return _build_frame(None, table, columns, [])
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None # Tuplas: ni sqlite3.Row ni diccionarios por fila
+        select = ', '.join(_frame_expression(table, column, 't') for column in columns)
+        rows = cursor.execute(f"SELECT {select} FROM {table} t{where} ORDER BY t.{key}", params).fetchall()
+        return _build_frame(cursor, table, columns, rows)
+    except sqlite3.Error as e:
+        print(f"Error al obtener {table} en columnas: {e}")
+        return _build_frame(None, table, columns, [])
+    finally:
+        conn.close()
+
+def get_tickets_frame(columns=TICKET_LIST_FRAME_COLUMNS, after=None, limit=TICKETS_PAGE_SIZE, filters=None, include_archive=False):
+    """Versión en columnas de get_tickets_page: (DataFrame, cursor_siguiente) con el mismo orden y cursor.
+
+    Con include_archive se añade la columna `archivado` (bool).
+    """
+    columns = _frame_columns('tickets', columns)
+    conn = get_db_connection()
+    if not conn: return _build_frame(None, 'tickets', columns, []), None
+    attached = False
+    try:
+        clauses, params = ticket_filter_clauses(filters)
+        if after is not None:
+            clauses.append("(tk.fecha_creacion, tk.id_ticket) < (?, ?)")
+            params.extend(after)
+        # Detrás de las columnas pedidas van las del cursor (y `archivado`) tal como están en la tabla
+        select = ', '.join([_frame_expression('tickets', column, 'tk') for column in columns] + ['tk.fecha_creacion', 'tk.id_ticket'])
+        attached = include_archive and _attach_archive(conn)
+        if attached:
+            sql, params = _archive_page_query(TICKET_ARCHIVE_BRANCH, clauses, params, limit,
+                                              f"SELECT {select}, tk.archivado FROM {{source}} tk",
+                                              "tk.fecha_creacion DESC, tk.id_ticket DESC")
+        else:
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            sql = f"SELECT {select} FROM tickets tk {where} ORDER BY tk.fecha_creacion DESC, tk.id_ticket DESC LIMIT ?"
+            params = params + [limit + 1]
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = tuple(rows[-1][len(columns):len(columns) + 2])
+        frame = _build_frame(cursor, 'tickets', columns, rows)
+        if attached:
+            frame['archivado'] = np.array([row[-1] for row in rows], dtype=bool)
+        return frame, next_cursor
+    except sqlite3.Error as e:
+        print(f"Error al obtener página de tickets en columnas: {e}")
+        return _build_frame(None, 'tickets', columns, []), None
+    finally:
+        if attached:
+            _detach_archive(conn)
+        conn.close()
+
+# --- Totales por ticket ---
+TICKET_TOTALS_QUERY = """
+    SELECT id_ticket, SUM(tiempo_dedicado_horas), COUNT(*), MAX(fecha_actividad)
+    FROM registros_actividad GROUP BY id_ticket
+"""
+
+def _sumar_registro(row, sign):
+    """UPSERT que suma (sign=+1) o resta (sign=-1) el registro NEW/OLD de los totales de su ticket."""
+    if sign > 0:
+        return f"""INSERT INTO totales_ticket (id_ticket, horas_dedicadas, num_registros, ultima_actividad)
+            VALUES ({row}.id_ticket, {row}.tiempo_dedicado_horas, 1, {row}.fecha_actividad)
+            ON CONFLICT(id_ticket) DO UPDATE SET
+                horas_dedicadas = horas_dedicadas + excluded.horas_dedicadas,
+                num_registros = num_registros + 1,
+                ultima_actividad = MAX(COALESCE(ultima_actividad, excluded.ultima_actividad), excluded.ultima_actividad);"""
+    # Al restar, la última fecha se vuelve a leer con idx_registros_ticket_fecha (una búsqueda, no un recorrido)
+    return f"""UPDATE totales_ticket SET
+                horas_dedicadas = horas_dedicadas - {row}.tiempo_dedicado_horas,
+                num_registros = num_registros - 1,
+                ultima_actividad = (SELECT MAX(fecha_actividad) FROM registros_actividad WHERE id_ticket = {row}.id_ticket)
+            WHERE id_ticket = {row}.id_ticket;"""
+
+TOTALS_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_totales_registros_insert AFTER INSERT ON registros_actividad
+    BEGIN
+        {_sumar_registro('NEW', +1)}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_totales_registros_delete AFTER DELETE ON registros_actividad
+    BEGIN
+        {_sumar_registro('OLD', -1)}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_totales_registros_update
+    AFTER UPDATE OF id_ticket, tiempo_dedicado_horas, fecha_actividad ON registros_actividad
+    BEGIN
+        {_sumar_registro('OLD', -1)}
+        {_sumar_registro('NEW', +1)}
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_totales_tickets_delete AFTER DELETE ON tickets
+    BEGIN
+        DELETE FROM totales_ticket WHERE id_ticket = OLD.id_ticket;
+    END;""",
+)
+
+def create_ticket_totals(cursor):
+    """Crea totales_ticket y sus triggers, y la rellena con el historial existente."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS totales_ticket (
+        id_ticket INTEGER PRIMARY KEY,
+        horas_dedicadas REAL NOT NULL DEFAULT 0,
+        num_registros INTEGER NOT NULL DEFAULT 0,
+        ultima_actividad DATE
+    );
+    ''')
+    for trigger in TOTALS_TRIGGERS:
+        cursor.execute(trigger)
+    cursor.execute(f"INSERT OR REPLACE INTO totales_ticket (id_ticket, horas_dedicadas, num_registros, ultima_actividad) {TICKET_TOTALS_QUERY}")
+
+def verify_ticket_totals():
+    """Compara totales_ticket con la agregación real. Devuelve los id_ticket que difieren (None si falla)."""
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        WITH reales (id_ticket, horas, registros, ultima) AS ({TICKET_TOTALS_QUERY}),
+        r AS (SELECT id_ticket, ROUND(horas, 6), registros, ultima FROM reales),
+        t AS (SELECT id_ticket, ROUND(horas_dedicadas, 6), num_registros, ultima_actividad FROM totales_ticket WHERE num_registros != 0)
+        SELECT id_ticket FROM (SELECT * FROM r EXCEPT SELECT * FROM t)
+        UNION
+        SELECT id_ticket FROM (SELECT * FROM t EXCEPT SELECT * FROM r)
+        """)
+        return [row['id_ticket'] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        print(f"Error al verificar totales de tickets: {e}")
+        return None
+    finally:
+        conn.close()
+
+def _fill_ticket_totals(cursor):
+    cursor.execute("DELETE FROM totales_ticket")
+    cursor.execute(f"INSERT INTO totales_ticket (id_ticket, horas_dedicadas, num_registros, ultima_actividad) {TICKET_TOTALS_QUERY}")
+
+def rebuild_ticket_totals():
+    """Recalcula totales_ticket desde registros_actividad, en una transacción."""
+    conn = get_db_connection()
+    if not conn: return False
+    def rebuild(conn):
+        cursor = conn.cursor()
+        _fill_ticket_totals(cursor)
+        _fill_summaries(cursor) # Los INSERT anteriores han vuelto a sumar sus horas a los resúmenes
+    try:
+        retry_transaction(conn, rebuild, 'rebuild_ticket_totals')
         return True
     except sqlite3.Error as e:
-        print(f"Error al eliminar ticket: {e}")
+        print(f"Error al reconstruir totales de tickets: {e}")
         return False
     finally:
         conn.close()
 
-# --- Funciones para obtener datos de catálogos ---
-def get_catalog_data(table_name, id_column, name_column):
+# --- Contadores del dashboard ---
+# resumen_contadores guarda los totales del dashboard y los triggers lo mantienen al día en cada
+# escritura (también las de populate.py o de otros procesos), así el dashboard los lee con una
+# sola consulta en lugar de recontar las tablas en cada render.
+
+# Consulta de referencia para cada contador: la usan rebuild/verify
+DASHBOARD_COUNTERS = {
+    'total_tickets': "SELECT COUNT(*) FROM tickets",
+    'tickets_abiertos': "SELECT COUNT(*) FROM tickets WHERE id_estado NOT IN (SELECT id_estado FROM estados_ticket WHERE es_final = 1)",
+    'tecnicos_activos': "SELECT COUNT(*) FROM tecnicos WHERE activo = 1",
+    'clientes_activos': "SELECT COUNT(*) FROM clientes WHERE activo = 1",
+}
+
+# 1 si el ticket (NEW u OLD) está en un estado no final, igual que el NOT IN de la consulta de referencia
+_TICKET_ABIERTO = "(1 - (SELECT COUNT(*) FROM estados_ticket WHERE id_estado = {row}.id_estado AND es_final = 1))"
+
+_RECOUNT_ABIERTOS = f"UPDATE resumen_contadores SET valor = ({DASHBOARD_COUNTERS['tickets_abiertos']}) WHERE clave = 'tickets_abiertos';"
+
+COUNTER_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_tickets_insert AFTER INSERT ON tickets
+    BEGIN
+        UPDATE resumen_contadores SET valor = valor + 1 WHERE clave = 'total_tickets';
+        UPDATE resumen_contadores SET valor = valor + {_TICKET_ABIERTO.format(row='NEW')} WHERE clave = 'tickets_abiertos';
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_tickets_delete AFTER DELETE ON tickets
+    BEGIN
+        UPDATE resumen_contadores SET valor = valor - 1 WHERE clave = 'total_tickets';
+        UPDATE resumen_contadores SET valor = valor - {_TICKET_ABIERTO.format(row='OLD')} WHERE clave = 'tickets_abiertos';
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_tickets_estado AFTER UPDATE OF id_estado ON tickets
+    WHEN OLD.id_estado IS NOT NEW.id_estado
+    BEGIN
+        UPDATE resumen_contadores SET valor = valor + {_TICKET_ABIERTO.format(row='NEW')} - {_TICKET_ABIERTO.format(row='OLD')}
+        WHERE clave = 'tickets_abiertos';
+    END;""",
+    # Cambiar qué estados son finales es raro: se recuenta en lugar de ajustar
+    f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_estados_update AFTER UPDATE OF id_estado, es_final ON estados_ticket
+    BEGIN
+        {_RECOUNT_ABIERTOS}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_estados_insert AFTER INSERT ON estados_ticket
+    BEGIN
+        {_RECOUNT_ABIERTOS}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_estados_delete AFTER DELETE ON estados_ticket
+    BEGIN
+        {_RECOUNT_ABIERTOS}
+    END;""",
+)
+
+def _activo_counter_triggers(table, key):
+    """Triggers que mantienen el contador de filas activas (activo = 1) de `table`."""
+    return (
+        f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_{table}_insert AFTER INSERT ON {table}
+        BEGIN
+            UPDATE resumen_contadores SET valor = valor + (NEW.activo IS 1) WHERE clave = '{key}';
+        END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_{table}_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE resumen_contadores SET valor = valor - (OLD.activo IS 1) WHERE clave = '{key}';
+        END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_contadores_{table}_activo AFTER UPDATE OF activo ON {table}
+        WHEN OLD.activo IS NOT NEW.activo
+        BEGIN
+            UPDATE resumen_contadores SET valor = valor + (NEW.activo IS 1) - (OLD.activo IS 1) WHERE clave = '{key}';
+        END;""",
+    )
+
+COUNTER_TRIGGERS += _activo_counter_triggers('tecnicos', 'tecnicos_activos')
+COUNTER_TRIGGERS += _activo_counter_triggers('clientes', 'clientes_activos')
+
+def create_dashboard_counters(cursor):
+    """Crea la tabla de contadores y sus triggers; los contadores nuevos parten del recuento real."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS resumen_contadores (
+        clave VARCHAR(50) PRIMARY KEY,
+        valor INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    ''')
+    for key, query in DASHBOARD_COUNTERS.items():
+        cursor.execute(f"INSERT OR IGNORE INTO resumen_contadores (clave, valor) VALUES (?, ({query}))", (key,))
+    for trigger in COUNTER_TRIGGERS:
+        cursor.execute(trigger)
+
+def get_dashboard_counters():
+    """Devuelve {clave: valor} de los contadores del dashboard con una sola consulta."""
     conn = get_db_connection()
     if not conn: return {}
     try:
         cursor = conn.cursor()
-        cursor.execute(f"SELECT {id_column}, {name_column} FROM {table_name} WHERE activo = 1 ORDER BY {name_column}")
-        data = cursor.fetchall()
-        return {row[id_column]: row[name_column] for row in data}
+        cursor.execute("SELECT clave, valor FROM resumen_contadores")
+        return {row['clave']: row['valor'] for row in cursor.fetchall()}
     except sqlite3.Error as e:
-        print(f"Error al obtener datos del catálogo {table_name}: {e}")
+        print(f"Error al obtener contadores del dashboard: {e}")
         return {}
     finally:
         conn.close()
 
-def get_tipos_tarea_catalog():
-    return get_catalog_data('tipos_tarea', 'id_tipo_tarea', 'nombre')
+def verify_dashboard_counters():
+    """Compara cada contador con su recuento real. Devuelve {clave: (almacenado, real)} de los que difieren."""
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN") # Una sola instantánea para todos los recuentos
+        cursor.execute("SELECT clave, valor FROM resumen_contadores")
+        stored = {row['clave']: row['valor'] for row in cursor.fetchall()}
+        mismatches = {}
+        for key, query in DASHBOARD_COUNTERS.items():
+            actual = cursor.execute(query).fetchone()[0]
+            if stored.get(key) != actual:
+                mismatches[key] = (stored.get(key), actual)
+        return mismatches
+    except sqlite3.Error as e:
+        print(f"Error al verificar contadores del dashboard: {e}")
+        return None
+    finally:
+        conn.close()
 
-def get_tecnicos_catalog():
+def _fill_dashboard_counters(cursor):
+    for key, query in DASHBOARD_COUNTERS.items():
+        cursor.execute(f"INSERT OR REPLACE INTO resumen_contadores (clave, valor) VALUES (?, ({query}))", (key,))
+
+def rebuild_dashboard_counters():
+    """Recalcula todos los contadores a partir de las tablas, en una transacción."""
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        retry_transaction(conn, lambda conn: _fill_dashboard_counters(conn.cursor()), 'rebuild_dashboard_counters')
+        return True
+    except sqlite3.Error as e:
+        print(f"Error al reconstruir contadores del dashboard: {e}")
+        return False
+    finally:
+        conn.close()
+
+# --- Resúmenes por técnico y por cliente ---
+# Sustituyen a las vistas de sqlite.sql que reagregaban tecnicos/clientes -> tickets -> registros_actividad
+# en cada lectura (y multiplicaban COUNT(tk.id_ticket) por el número de registros de cada ticket).
+# Cada ticket aporta 1 ticket, 1 si está abierto, y sus horas y registros (de totales_ticket) al resumen
+# de su técnico y de su cliente; los triggers restan la aportación antigua y suman la nueva.
+
+# Horas y registros de cada ticket sin multiplicar filas: se agregan por ticket antes de unir
+_HORAS_POR_TICKET = """(SELECT id_ticket, SUM(tiempo_dedicado_horas) AS horas, COUNT(*) AS registros
+        FROM registros_actividad GROUP BY id_ticket)"""
+
+_ES_ABIERTO = "CASE WHEN tk.id_estado IN (SELECT id_estado FROM estados_ticket WHERE es_final = 1) THEN 0 ELSE 1 END"
+
+# Consultas de referencia: las usan rebuild/verify
+SUMMARY_QUERIES = {
+    'resumen_tecnico': f"""
+        SELECT tk.id_tecnico_asignado, COUNT(*), SUM({_ES_ABIERTO}), COALESCE(SUM(ra.horas), 0), COALESCE(SUM(ra.registros), 0)
+        FROM tickets tk LEFT JOIN {_HORAS_POR_TICKET} ra ON ra.id_ticket = tk.id_ticket
+        WHERE tk.id_tecnico_asignado IS NOT NULL
+        GROUP BY tk.id_tecnico_asignado""",
+    'resumen_cliente': f"""
+        SELECT tk.id_cliente, COUNT(*), SUM({_ES_ABIERTO}), COALESCE(SUM(ra.horas), 0), COALESCE(SUM(ra.registros), 0)
+        FROM tickets tk LEFT JOIN {_HORAS_POR_TICKET} ra ON ra.id_ticket = tk.id_ticket
+        GROUP BY tk.id_cliente""",
+    'resumen_cliente_tipo': """
+        SELECT id_cliente, id_tipo_tarea, COUNT(*) FROM tickets GROUP BY id_cliente, id_tipo_tarea""",
+}
+
+SUMMARY_COLUMNS = {
+    'resumen_tecnico': ('id_tecnico', 'total_tickets', 'tickets_abiertos', 'total_horas', 'num_registros'),
+    'resumen_cliente': ('id_cliente', 'total_tickets', 'tickets_abiertos', 'total_horas', 'num_registros'),
+    'resumen_cliente_tipo': ('id_cliente', 'id_tipo_tarea', 'total_tickets'),
+}
+
+def _horas_ticket(row):
+    return f"COALESCE((SELECT horas_dedicadas FROM totales_ticket WHERE id_ticket = {row}.id_ticket), 0)"
+
+def _registros_ticket(row):
+    return f"COALESCE((SELECT num_registros FROM totales_ticket WHERE id_ticket = {row}.id_ticket), 0)"
+
+def _ajustar_resumen(table, key, tickets, abiertos, horas, registros):
+    """UPSERT que suma las cantidades dadas (expresiones SQL) a la fila `key` del resumen."""
+    id_column = SUMMARY_COLUMNS[table][0]
+    return f"""INSERT INTO {table} ({id_column}, total_tickets, tickets_abiertos, total_horas, num_registros)
+            SELECT {key}, {tickets}, {abiertos}, {horas}, {registros} WHERE {key} IS NOT NULL
+            ON CONFLICT({id_column}) DO UPDATE SET
+                total_tickets = total_tickets + excluded.total_tickets,
+                tickets_abiertos = tickets_abiertos + excluded.tickets_abiertos,
+                total_horas = total_horas + excluded.total_horas,
+                num_registros = num_registros + excluded.num_registros;"""
+
+def _ajustar_cliente_tipo(row, sign):
+    return f"""INSERT INTO resumen_cliente_tipo (id_cliente, id_tipo_tarea, total_tickets)
+            VALUES ({row}.id_cliente, {row}.id_tipo_tarea, {sign})
+            ON CONFLICT(id_cliente, id_tipo_tarea) DO UPDATE SET total_tickets = total_tickets + excluded.total_tickets;"""
+
+def _aportacion_ticket(row, sign):
+    """Suma (sign=+1) o resta (sign=-1) la aportación del ticket NEW/OLD a los tres resúmenes."""
+    abierto = _TICKET_ABIERTO.format(row=row)
+    amounts = (f"{sign}", f"{sign} * {abierto}", f"{sign} * {_horas_ticket(row)}", f"{sign} * {_registros_ticket(row)}")
+    return "\n        ".join((
+        _ajustar_resumen('resumen_tecnico', f"{row}.id_tecnico_asignado", *amounts),
+        _ajustar_resumen('resumen_cliente', f"{row}.id_cliente", *amounts),
+        _ajustar_cliente_tipo(row, sign),
+    ))
+
+def _aportacion_horas(sign_old):
+    """Horas/registros nuevos de una fila de totales_ticket (menos los OLD si sign_old), para el técnico y cliente de su ticket."""
+    horas = "NEW.horas_dedicadas" + (" - OLD.horas_dedicadas" if sign_old else "")
+    registros = "NEW.num_registros" + (" - OLD.num_registros" if sign_old else "")
+    return "\n        ".join(
+        _ajustar_resumen(table, f"(SELECT {column} FROM tickets WHERE id_ticket = NEW.id_ticket)", "0", "0", horas, registros)
+        for table, column in (('resumen_tecnico', 'id_tecnico_asignado'), ('resumen_cliente', 'id_cliente'))
+    )
+
+_RECOUNT_ABIERTOS_RESUMEN = "\n        ".join(
+    f"""UPDATE {table} SET tickets_abiertos = (SELECT COUNT(*) FROM tickets tk WHERE tk.{column} = {table}.{key} AND {_ES_ABIERTO} = 1);"""
+    for table, column, key in (('resumen_tecnico', 'id_tecnico_asignado', 'id_tecnico'), ('resumen_cliente', 'id_cliente', 'id_cliente'))
+)
+
+SUMMARY_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_tickets_insert AFTER INSERT ON tickets
+    BEGIN
+        {_aportacion_ticket('NEW', +1)}
+    END;""",
+    # BEFORE: las horas del ticket se leen de totales_ticket antes de que trg_totales_tickets_delete borre su fila
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_tickets_delete BEFORE DELETE ON tickets
+    BEGIN
+        {_aportacion_ticket('OLD', -1)}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_tickets_update
+    AFTER UPDATE OF id_tecnico_asignado, id_cliente, id_tipo_tarea, id_estado ON tickets
+    WHEN OLD.id_tecnico_asignado IS NOT NEW.id_tecnico_asignado OR OLD.id_cliente IS NOT NEW.id_cliente
+      OR OLD.id_tipo_tarea IS NOT NEW.id_tipo_tarea OR OLD.id_estado IS NOT NEW.id_estado
+    BEGIN
+        {_aportacion_ticket('OLD', -1)}
+        {_aportacion_ticket('NEW', +1)}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_totales_insert AFTER INSERT ON totales_ticket
+    BEGIN
+        {_aportacion_horas(False)}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_totales_update AFTER UPDATE ON totales_ticket
+    BEGIN
+        {_aportacion_horas(True)}
+    END;""",
+    # Cambiar qué estados son finales es raro: se recuentan los abiertos de todos los resúmenes
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_estados_update AFTER UPDATE OF id_estado, es_final ON estados_ticket
+    BEGIN
+        {_RECOUNT_ABIERTOS_RESUMEN}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_estados_insert AFTER INSERT ON estados_ticket
+    BEGIN
+        {_RECOUNT_ABIERTOS_RESUMEN}
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_estados_delete AFTER DELETE ON estados_ticket
+    BEGIN
+        {_RECOUNT_ABIERTOS_RESUMEN}
+    END;""",
+)
+
+# Tablas de las que dependen los resúmenes (para las claves de caché de app.py)
+SUMMARY_SOURCE_TABLES = ('tickets', 'registros_actividad', 'tecnicos', 'clientes', 'tipos_tarea', 'estados_ticket')
+
+_TIPO_MAS_FRECUENTE = """(SELECT tt.nombre FROM resumen_cliente_tipo rt JOIN tipos_tarea tt ON tt.id_tipo_tarea = rt.id_tipo_tarea
+         WHERE rt.id_cliente = c.id_cliente AND rt.total_tickets > 0
+         ORDER BY rt.total_tickets DESC, tt.nombre LIMIT 1)"""
+
+# Las vistas de sqlite.sql, con las mismas columnas, leídas de los resúmenes
+SUMMARY_VIEWS = (
+    """CREATE VIEW vista_tickets_tecnico AS
+    SELECT
+        t.nombre || ' ' || t.apellido AS tecnico,
+        COALESCE(r.total_tickets, 0) AS total_tickets,
+        r.total_horas / NULLIF(r.num_registros, 0) AS promedio_horas,
+        COALESCE(r.total_horas, 0) AS total_horas
+    FROM tecnicos t
+    LEFT JOIN resumen_tecnico r ON r.id_tecnico = t.id_tecnico;""",
+    f"""CREATE VIEW vista_resumen_cliente AS
+    SELECT
+        c.nombre_empresa,
+        COALESCE(r.total_tickets, 0) AS total_tickets,
+        r.total_horas / NULLIF(r.total_tickets, 0) AS promedio_horas_ticket,
+        {_TIPO_MAS_FRECUENTE} AS tipo_tarea_mas_frecuente
+    FROM clientes c
+    LEFT JOIN resumen_cliente r ON r.id_cliente = c.id_cliente;""",
+)
+
+def _fill_summaries(cursor):
+    for table, query in SUMMARY_QUERIES.items():
+        columns = SUMMARY_COLUMNS[table]
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) {query}")
+
+def create_summaries(cursor):
+    """Crea los resúmenes por técnico/cliente, sus triggers y las vistas, y los rellena."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS resumen_tecnico (
+        id_tecnico INTEGER PRIMARY KEY,
+        total_tickets INTEGER NOT NULL DEFAULT 0,
+        tickets_abiertos INTEGER NOT NULL DEFAULT 0,
+        total_horas REAL NOT NULL DEFAULT 0,
+        num_registros INTEGER NOT NULL DEFAULT 0
+    );
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS resumen_cliente (
+        id_cliente INTEGER PRIMARY KEY,
+        total_tickets INTEGER NOT NULL DEFAULT 0,
+        tickets_abiertos INTEGER NOT NULL DEFAULT 0,
+        total_horas REAL NOT NULL DEFAULT 0,
+        num_registros INTEGER NOT NULL DEFAULT 0
+    );
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS resumen_cliente_tipo (
+        id_cliente INTEGER NOT NULL,
+        id_tipo_tarea INTEGER NOT NULL,
+        total_tickets INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (id_cliente, id_tipo_tarea)
+    ) WITHOUT ROWID;
+    ''')
+    for trigger in SUMMARY_TRIGGERS:
+        cursor.execute(trigger)
+    cursor.execute("DROP VIEW IF EXISTS vista_tickets_tecnico")
+    cursor.execute("DROP VIEW IF EXISTS vista_resumen_cliente")
+    for view in SUMMARY_VIEWS:
+        cursor.execute(view)
+    _fill_summaries(cursor)
+
+def get_resumen_tecnicos():
+    """Resumen por técnico (todos los técnicos, con ceros si no tienen tickets)."""
+    conn = get_db_connection()
+    if not conn: return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT t.id_tecnico, t.nombre || ' ' || t.apellido AS tecnico, t.activo,
+               COALESCE(r.total_tickets, 0) AS total_tickets,
+               COALESCE(r.tickets_abiertos, 0) AS tickets_abiertos,
+               COALESCE(r.total_horas, 0) AS total_horas,
+               COALESCE(r.num_registros, 0) AS num_registros
+        FROM tecnicos t
+        LEFT JOIN resumen_tecnico r ON r.id_tecnico = t.id_tecnico
+        ORDER BY t.nombre, t.apellido
+        """)
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error al obtener resumen por técnico: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_resumen_clientes():
+    """Resumen por cliente, con su tipo de tarea más frecuente."""
+    conn = get_db_connection()
+    if not conn: return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT c.id_cliente, c.nombre_empresa, c.activo,
+               COALESCE(r.total_tickets, 0) AS total_tickets,
+               COALESCE(r.tickets_abiertos, 0) AS tickets_abiertos,
+               COALESCE(r.total_horas, 0) AS total_horas,
+               COALESCE(r.num_registros, 0) AS num_registros,
+               {_TIPO_MAS_FRECUENTE} AS tipo_tarea_mas_frecuente
+        FROM clientes c
+        LEFT JOIN resumen_cliente r ON r.id_cliente = c.id_cliente
+        ORDER BY c.nombre_empresa
+        """)
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error al obtener resumen por cliente: {e}")
+        return []
+    finally:
+        conn.close()
+
+def verify_summaries():
+    """Compara cada resumen con su consulta de referencia. Devuelve {tabla: filas distintas} o None."""
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN") # Una sola instantánea para todas las comparaciones
+        mismatches = {}
+        for table, query in SUMMARY_QUERIES.items():
+            columns = SUMMARY_COLUMNS[table]
+            rounded = ', '.join(f"ROUND({c}, 6)" if c == 'total_horas' else c for c in columns)
+            # Una fila a cero (p. ej. técnico sin tickets tras reasignarlos) equivale a no tener fila
+            cursor.execute(f"""
+            WITH reales ({', '.join(columns)}) AS ({query}),
+            r AS (SELECT {rounded} FROM reales),
+            s AS (SELECT {rounded} FROM {table} WHERE total_tickets != 0)
+            SELECT (SELECT COUNT(*) FROM (SELECT * FROM r EXCEPT SELECT * FROM s))
+                 + (SELECT COUNT(*) FROM (SELECT * FROM s EXCEPT SELECT * FROM r))
+            """)
+            different = cursor.fetchone()[0]
+            if different:
+                mismatches[table] = different
+        return mismatches
+    except sqlite3.Error as e:
+        print(f"Error al verificar resúmenes: {e}")
+        return None
+    finally:
+        conn.close()
+
+def rebuild_summaries():
+    """Recalcula los resúmenes por técnico y por cliente, en una transacción."""
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        retry_transaction(conn, lambda conn: _fill_summaries(conn.cursor()), 'rebuild_summaries')
+        return True
+    except sqlite3.Error as e:
+        print(f"Error al reconstruir resúmenes: {e}")
+        return False
+    finally:
+        conn.close()
+
+# --- Búsqueda de texto completo ---
+# busqueda_tickets es un índice FTS5 con una fila por ticket (rowid = id_ticket): título y descripción.
+# busqueda_actividad tiene una fila por registro de actividad (rowid = id_registro): cada registro es
+# su propio documento, así insertar o borrar actividad solo toca su fila del índice. Los triggers
+# los mantienen al día, así buscar no recorre tickets.descripcion con LIKE '%...%'.
+
+# Peso de cada columna en bm25(): el título cuenta más que la descripción y esta más que la actividad
+SEARCH_COLUMN_WEIGHTS = (10.0, 4.0)
+SEARCH_ACTIVITY_WEIGHTS = (1.0, 1.0) # descripcion_trabajo, observaciones
+SEARCH_HIGHLIGHT = ('**', '**') # Marcas de resaltado (Markdown en app.py)
+SEARCH_RESULTS_LIMIT = 20
+
+# Triggers de la versión con un documento por ticket que reescribía toda su actividad en cada cambio
+OBSOLETE_SEARCH_TRIGGERS = ('trg_busqueda_actividad_insert', 'trg_busqueda_actividad_update', 'trg_busqueda_actividad_delete')
+
+SEARCH_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_busqueda_tickets_insert AFTER INSERT ON tickets
+    BEGIN
+        INSERT INTO busqueda_tickets (rowid, titulo, descripcion) VALUES (NEW.id_ticket, NEW.titulo, NEW.descripcion);
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_busqueda_tickets_update AFTER UPDATE OF titulo, descripcion ON tickets
+    BEGIN
+        UPDATE busqueda_tickets SET titulo = NEW.titulo, descripcion = NEW.descripcion WHERE rowid = NEW.id_ticket;
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_busqueda_tickets_delete AFTER DELETE ON tickets
+    BEGIN
+        DELETE FROM busqueda_tickets WHERE rowid = OLD.id_ticket;
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_busqueda_registro_insert AFTER INSERT ON registros_actividad
+    BEGIN
+        INSERT INTO busqueda_actividad (rowid, descripcion_trabajo, observaciones, id_ticket)
+        VALUES (NEW.id_registro, NEW.descripcion_trabajo, NEW.observaciones, NEW.id_ticket);
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_busqueda_registro_update
+    AFTER UPDATE OF id_ticket, descripcion_trabajo, observaciones ON registros_actividad
+    BEGIN
+        UPDATE busqueda_actividad
+        SET descripcion_trabajo = NEW.descripcion_trabajo, observaciones = NEW.observaciones, id_ticket = NEW.id_ticket
+        WHERE rowid = NEW.id_registro;
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_busqueda_registro_delete AFTER DELETE ON registros_actividad
+    BEGIN
+        DELETE FROM busqueda_actividad WHERE rowid = OLD.id_registro;
+    END;""",
+)
+
+# (tabla, columnas FTS5, relleno desde los datos existentes)
+SEARCH_INDEXES = (
+    ('busqueda_tickets', "titulo, descripcion",
+     "INSERT INTO busqueda_tickets (rowid, titulo, descripcion) SELECT id_ticket, titulo, descripcion FROM tickets"),
+    ('busqueda_actividad', "descripcion_trabajo, observaciones, id_ticket UNINDEXED",
+     "INSERT INTO busqueda_actividad (rowid, descripcion_trabajo, observaciones, id_ticket) "
+     "SELECT id_registro, descripcion_trabajo, observaciones, id_ticket FROM registros_actividad"),
+)
+
+def create_ticket_search(cursor):
+    """Crea los índices FTS5 y sus triggers. Los índices nuevos se rellenan con los datos existentes.
+
+    Un busqueda_tickets antiguo, con la columna `actividad`, se vuelve a crear sin ella.
+    """
+    for name in OBSOLETE_SEARCH_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    if 'actividad' in [row[1] for row in cursor.execute("PRAGMA table_info(busqueda_tickets)")]:
+        cursor.execute("DROP TABLE busqueda_tickets")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_busqueda_tickets_insert") # Insertaba también la columna actividad
+    created = []
+    for table, columns, backfill in SEARCH_INDEXES:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,))
+        if cursor.fetchone() is not None:
+            continue
+        # unicode61 sin diacríticos: "configuracion" encuentra "configuración"; prefix acelera las búsquedas "texto*"
+        cursor.execute(f"CREATE VIRTUAL TABLE {table} USING fts5({columns}, "
+                       "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+        created.append((table, backfill))
+    for trigger in SEARCH_TRIGGERS:
+        cursor.execute(trigger)
+    for table, backfill in created:
+        cursor.execute(backfill)
+        print(f"  -> {table}: {cursor.rowcount} filas indexadas")
+
+def _fill_ticket_search(cursor):
+    indexed = None
+    for table, _, backfill in SEARCH_INDEXES:
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(backfill)
+        indexed = cursor.rowcount if indexed is None else indexed
+        cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    return indexed
+
+def rebuild_ticket_search():
+    """Vacía y vuelve a rellenar los índices de búsqueda. Devuelve los tickets indexados o None."""
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        return retry_transaction(conn, lambda conn: _fill_ticket_search(conn.cursor()), 'rebuild_ticket_search')
+    except sqlite3.Error as e:
+        print(f"Error al reconstruir el índice de búsqueda: {e}")
+        return None
+    finally:
+        conn.close()
+
+def search_match_expression(text):
+    """Convierte el texto del usuario en una expresión MATCH segura: todas las palabras, como prefijo."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+def _search_matches(match):
+    """Subconsulta (id_ticket, titulo_resaltado, fragmento, relevancia) con el mejor documento de cada ticket.
+
+    Un ticket aparece si su título/descripción o alguno de sus registros contiene todas las palabras;
+    con MIN() la fila elegida de cada ticket es la de mejor bm25 (su fragmento y su resaltado).
+    """
+    start, end = SEARCH_HIGHLIGHT
+    weights = ", ".join(str(w) for w in SEARCH_COLUMN_WEIGHTS)
+    activity_weights = ", ".join(str(w) for w in SEARCH_ACTIVITY_WEIGHTS)
+    sql = f"""(
+        SELECT id_ticket, titulo_resaltado, fragmento, MIN(relevancia) AS relevancia
+        FROM (
+            SELECT rowid AS id_ticket, highlight(busqueda_tickets, 0, ?, ?) AS titulo_resaltado,
+                snippet(busqueda_tickets, -1, ?, ?, '…', 16) AS fragmento,
+                bm25(busqueda_tickets, {weights}) AS relevancia
+            FROM busqueda_tickets WHERE busqueda_tickets MATCH ?
+            UNION ALL
+            SELECT id_ticket, NULL, snippet(busqueda_actividad, -1, ?, ?, '…', 16),
+                bm25(busqueda_actividad, {activity_weights}, 0.0)
+            FROM busqueda_actividad WHERE busqueda_actividad MATCH ?
+        )
+        GROUP BY id_ticket
+    )"""
+    return sql, [start, end, start, end, match, start, end, match]
+
+def search_tickets(query, limit=SEARCH_RESULTS_LIMIT, filters=None):
+    """Busca tickets por título, descripción y actividad, ordenados por relevancia (bm25).
+
+    Cada fila incluye las columnas del listado más `titulo_resaltado` y `fragmento`, con los
+    términos encontrados entre las marcas de SEARCH_HIGHLIGHT. Admite los mismos filtros que
+    get_tickets_page().
+    """
+    match = search_match_expression(query)
+    if not match:
+        return []
+    conn = get_db_connection()
+    if not conn: return []
+    try:
+        clauses, params = ticket_filter_clauses(filters)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        matches, match_params = _search_matches(match)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT{TICKET_LIST_COLUMNS},
+            COALESCE(m.titulo_resaltado, tk.titulo) AS titulo_resaltado, m.fragmento, m.relevancia
+        FROM {matches} m
+        JOIN tickets tk ON tk.id_ticket = m.id_ticket{TICKET_LIST_JOINS}{where}
+        ORDER BY m.relevancia
+        LIMIT ?
+        """, match_params + params + [limit])
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error al buscar tickets: {e}")
+        return []
+    finally:
+        conn.close()
+
+# Selectores con búsqueda (app.py): pares (id, etiqueta) de las filas que coinciden con lo escrito
+PICKER_LIMIT = 50
+
+PICKER_QUERIES = {
+    'tecnicos': ("SELECT id_tecnico, nombre || ' ' || apellido || ' (ID: ' || id_tecnico || ')' FROM tecnicos",
+                 "(nombre || ' ' || apellido LIKE ? ESCAPE '\\' OR login LIKE ? ESCAPE '\\' OR email LIKE ? ESCAPE '\\')",
+                 "nombre, apellido, id_tecnico"),
+    'clientes': ("SELECT id_cliente, nombre_empresa FROM clientes",
+                 "(nombre_empresa LIKE ? ESCAPE '\\' OR contacto_principal LIKE ? ESCAPE '\\' OR email LIKE ? ESCAPE '\\')",
+                 "nombre_empresa, id_cliente"),
+}
+
+def _like_pattern(text):
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+def search_entities(kind, text, limit=PICKER_LIMIT, filters=None):
+    """Hasta `limit` pares (id, etiqueta) de tecnicos, clientes o tickets para un selector con búsqueda.
+
+    Técnicos y clientes se buscan por nombre, contacto, login o email (contiene, sin distinguir
+    mayúsculas) y admiten los filtros de listing_filter_clauses. Los tickets se buscan primero por
+    prefijo del número (índice de numero_ticket) y después en los índices de búsqueda; sin texto se devuelven
+    los más recientes.
+    """
+    text = (text or "").strip()
+    conn = get_db_connection()
+    if not conn: return []
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        if kind != 'tickets':
+            select, condition, order = PICKER_QUERIES[kind]
+            clauses, params = listing_filter_clauses(kind, filters)
+            if text:
+                clauses.append(condition)
+                params.extend([_like_pattern(text)] * condition.count('?'))
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            return cursor.execute(f"{select}{where} ORDER BY {order} LIMIT ?", params + [limit]).fetchall()
+        label = "tk.numero_ticket || ' - ' || tk.titulo"
+        if not text:
+            return cursor.execute(f"SELECT tk.id_ticket, {label} FROM tickets tk ORDER BY tk.fecha_creacion DESC, tk.id_ticket DESC LIMIT ?",
+                                  (limit,)).fetchall()
+        # Rango en lugar de LIKE 'x%': LIKE no usa el índice de una columna con collation BINARY
+        prefix = text.upper()
+        found = cursor.execute(f"SELECT tk.id_ticket, {label} FROM tickets tk WHERE tk.numero_ticket >= ? AND tk.numero_ticket < ? "
+                               "ORDER BY tk.numero_ticket LIMIT ?", (prefix, prefix + '\U0010ffff', limit)).fetchall()
+        match = search_match_expression(text)
+        if match and len(found) < limit:
+            seen = {row[0] for row in found}
+            matches, match_params = _search_matches(match)
+            found += [row for row in cursor.execute(f"""
+                SELECT tk.id_ticket, {label}
+                FROM {matches} m JOIN tickets tk ON tk.id_ticket = m.id_ticket
+                ORDER BY m.relevancia
+                LIMIT ?
+                """, match_params + [limit]) if row[0] not in seen][:limit - len(found)]
+        return found
+    except sqlite3.Error as e:
+        print(f"Error al buscar {kind}: {e}")
+        return []
+    finally:
+        conn.close()
+
+# --- Versiones de datos ---
+# versiones_datos lleva un contador por tabla que sube con cada escritura confirmada, venga de este
+# proceso o de otro. Las cachés de app.py usan estas versiones como clave: mientras no cambian, los
+# datos cacheados siguen siendo válidos. No hay triggers por fila: la cola de escritura sube una vez
+# por lote las tablas que declararon sus operaciones (execute_write(..., tables)) y las cargas masivas
+# llaman a bump_data_versions al terminar. Quien escriba por fuera de database.py (sqlite3 a mano)
+# debe hacer lo mismo. (PRAGMA data_version no sirve aquí: solo refleja los cambios hechos por otras
+# conexiones, no los de la propia conexión del pool que escribió.)
+DATA_VERSION_TABLES = ('tecnicos', 'clientes', 'tickets', 'registros_actividad',
+                       'tipos_tarea', 'prioridades', 'estados_ticket', 'modalidades_trabajo')
+
+# Tablas de las que depende el listado de tickets (TICKET_LIST_SELECT y search_tickets)
+TICKET_LIST_TABLES = ('tickets', 'clientes', 'tecnicos', 'tipos_tarea', 'prioridades', 'estados_ticket')
+
+# Triggers de la versión anterior, que incrementaban la versión una vez por cada fila escrita
+OBSOLETE_DATA_VERSION_TRIGGERS = tuple(f"trg_versiones_{table}_{event}" for table in DATA_VERSION_TABLES
+                                       for event in ('insert', 'update', 'delete'))
+
+def create_data_versions(cursor):
+    """Crea la tabla de versiones por tabla (una fila por tabla de DATA_VERSION_TABLES)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS versiones_datos (
+        tabla VARCHAR(50) PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    ''')
+    for table in DATA_VERSION_TABLES:
+        cursor.execute("INSERT OR IGNORE INTO versiones_datos (tabla, version) VALUES (?, 0)", (table,))
+
+def drop_data_version_triggers(cursor):
+    for name in OBSOLETE_DATA_VERSION_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+def bump_data_versions(conn, tables):
+    """Incrementa en uno la versión de `tables`, dentro de la transacción en curso de `conn`."""
+    conn.execute("UPDATE versiones_datos SET version = version + 1 WHERE tabla IN (SELECT value FROM json_each(?))",
+                 (json.dumps(sorted(tables)),))
+
+def get_data_versions():
+    """Devuelve {tabla: versión} con una sola consulta ({} si falla)."""
     conn = get_db_connection()
     if not conn: return {}
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT id_tecnico, nombre || ' ' || apellido AS full_name FROM tecnicos WHERE activo = 1 ORDER BY nombre")
-        data = cursor.fetchall()
-        return {row['id_tecnico']: row['full_name'] for row in data}
+        cursor.execute("SELECT tabla, version FROM versiones_datos")
+        return {row['tabla']: row['version'] for row in cursor.fetchall()}
     except sqlite3.Error as e:
-        print(f"Error al obtener catálogo de técnicos: {e}")
+        print(f"Error al obtener las versiones de datos: {e}")
         return {}
     finally:
         conn.close()
 
+# --- Cargas masivas ---
+# Los triggers de datos derivados (búsqueda, totales, contadores y resúmenes) ejecutan varias sentencias
+# por cada fila insertada. populate.py y bulk_import.py los retiran mientras cargan y al terminar
+# recalculan todo de una vez. Si el proceso muere a mitad de carga los triggers quedan sin crear:
+# initialize_database lo detecta al arrancar y los restaura.
+
+DERIVED_TRIGGERS = SEARCH_TRIGGERS + TOTALS_TRIGGERS + COUNTER_TRIGGERS + SUMMARY_TRIGGERS
+DERIVED_TRIGGER_NAMES = tuple(re.search(r"CREATE TRIGGER IF NOT EXISTS (\w+)", trigger).group(1)
+                              for trigger in DERIVED_TRIGGERS)
+
+def suspend_derived_triggers(conn):
+    """Elimina los triggers de datos derivados y confirma. Hay que terminar con restore_derived_data()."""
+    def drop(conn):
+        for name in DERIVED_TRIGGER_NAMES:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    retry_transaction(conn, drop, 'suspend_derived_triggers')
+
+def restore_derived_data(conn, tables=()):
+    """Recalcula búsqueda, totales, resúmenes y contadores, vuelve a crear sus triggers y sube la versión de `tables`.
+
+    Todo va en una sola transacción BEGIN IMMEDIATE: ninguna escritura concurrente queda entre el
+    recálculo y los triggers. Devuelve True o False.
+    """
+    def restore(conn):
+        cursor = conn.cursor()
+        _fill_ticket_search(cursor)
+        _fill_ticket_totals(cursor) # Sin triggers: los resúmenes se rellenan después, una vez
+        _fill_summaries(cursor)
+        _fill_dashboard_counters(cursor)
+        for trigger in DERIVED_TRIGGERS:
+            cursor.execute(trigger)
+        if tables:
+            bump_data_versions(conn, tables)
+    try:
+        if conn.in_transaction:
+            conn.rollback() # Lo que quedara a medias de la carga
+        retry_transaction(conn, restore, 'restore_derived_data')
+        return True
+    except sqlite3.Error as e:
+        print(f"Error al recalcular los datos derivados tras la carga: {e}")
+        return False
+
+def missing_derived_triggers(conn):
+    """Devuelve los nombres de DERIVED_TRIGGER_NAMES que no existen en la base de datos."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    return [name for name in DERIVED_TRIGGER_NAMES if name not in existing]
+
+# --- Historial de cambios ---
+# historial_cambios guarda, por cada UPDATE que cambia algún campo de tickets, tecnicos o clientes, una
+# fila con los campos modificados: {"campo": [antes, después], ...}. La escribe un trigger AFTER UPDATE
+# con una sola inserción y nunca se modifica. Sustituye a los triggers trg_*_updated de sqlite.sql, que
+# volvían a actualizar la fila: updated_at ya lo ponen las propias sentencias UPDATE.
+
+HISTORY_PAGE_SIZE = 50
+
+# Tabla auditada -> (clave primaria, campos cuyo cambio se registra). updated_at y created_at no cuentan.
+AUDITED_COLUMNS = {
+    'tickets': ('id_ticket', ('numero_ticket', 'id_cliente', 'id_tecnico_asignado', 'id_tipo_tarea', 'id_prioridad',
+                              'id_estado', 'titulo', 'descripcion', 'fecha_asignacion', 'fecha_cierre', 'tiempo_estimado_horas')),
+    'tecnicos': ('id_tecnico', ('nombre', 'apellido', 'email', 'login', 'password_hash', 'telefono', 'especialidad',
+                                'fecha_ingreso', 'activo')),
+    'clientes': ('id_cliente', ('nombre_empresa', 'contacto_principal', 'email', 'telefono', 'direccion', 'ciudad',
+                                'pais', 'activo')),
+}
+HIDDEN_AUDIT_COLUMNS = ('password_hash',) # Se registra que cambió, no su valor
+
+OBSOLETE_TRIGGERS = ('trg_tecnicos_updated', 'trg_clientes_updated', 'trg_tickets_updated')
+
+def _audit_value(row, column):
+    return "'***'" if column in HIDDEN_AUDIT_COLUMNS else f"{row}.{column}"
+
+def _audit_trigger(table):
+    key, columns = AUDITED_COLUMNS[table]
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+    diffs = "\n                UNION ALL ".join(
+        f"SELECT '{c}' AS campo, {_audit_value('OLD', c)} AS antes, {_audit_value('NEW', c)} AS despues WHERE OLD.{c} IS NOT NEW.{c}"
+        for c in columns)
+    return f"""CREATE TRIGGER IF NOT EXISTS trg_historial_{table} AFTER UPDATE ON {table}
+    WHEN {changed}
+    BEGIN
+        INSERT INTO historial_cambios (tabla, id_fila, cambios)
+        SELECT '{table}', NEW.{key}, json_group_object(campo, json_array(antes, despues)) FROM (
+                {diffs}
+        );
+    END;"""
+
+HISTORY_TRIGGERS = tuple(_audit_trigger(table) for table in AUDITED_COLUMNS)
+
+def create_change_history(cursor):
+    """Crea historial_cambios y sus triggers, y elimina los triggers trg_*_updated si existen."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS historial_cambios (
+        id_cambio INTEGER PRIMARY KEY,
+        tabla VARCHAR(50) NOT NULL,
+        id_fila INTEGER NOT NULL,
+        fecha DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        cambios TEXT NOT NULL -- JSON {"campo": [antes, después]}
+    );
+    ''')
+    # La línea de tiempo de una fila es una búsqueda en este índice, ya en orden
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_historial_fila ON historial_cambios(tabla, id_fila, id_cambio)")
+    for name in OBSOLETE_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for trigger in HISTORY_TRIGGERS:
+        cursor.execute(trigger)
+
+def get_change_history(table, id_fila, before=None, limit=HISTORY_PAGE_SIZE):
+    """Cambios de una fila, del más reciente al más antiguo, con `cambios` ya decodificado.
+
+    `before` es el id_cambio a partir del cual seguir (keyset). Devuelve (filas, cursor_siguiente).
+    """
+    conn = get_db_connection()
+    if not conn: return [], None
+    try:
+        cursor = conn.cursor()
+        params = [table, id_fila]
+        keyset = ""
+        if before is not None:
+            keyset = "AND id_cambio < ?"
+            params.append(before)
+        cursor.execute(f"""
+        SELECT id_cambio, fecha, cambios FROM historial_cambios
+        WHERE tabla = ? AND id_fila = ? {keyset}
+        ORDER BY id_cambio DESC
+        LIMIT ?
+        """, params + [limit + 1])
+        rows = [{'id_cambio': row['id_cambio'], 'fecha': row['fecha'], 'cambios': json.loads(row['cambios'])}
+                for row in cursor.fetchall()]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]['id_cambio']
+        return rows, next_cursor
+    except sqlite3.Error as e:
+        print(f"Error al obtener el historial de cambios: {e}")
+        return [], None
+    finally:
+        conn.close()
+
+def get_ticket_timeline(id_ticket, limit=HISTORY_PAGE_SIZE):
+    """Línea de tiempo de un ticket: una fila por campo cambiado (fecha, campo, antes, después)."""
+    rows, _ = get_change_history('tickets', id_ticket, limit=limit)
+    return [{'id_cambio': row['id_cambio'], 'fecha': row['fecha'], 'campo': campo, 'antes': antes, 'despues': despues}
+            for row in rows for campo, (antes, despues) in row['cambios'].items()]
+
+# --- Caché de catálogos ---
+# Los catálogos casi nunca cambian: se sirven desde memoria durante CATALOG_CACHE_TTL segundos
+# y las funciones de escritura invalidan solo el catálogo afectado.
+CATALOG_CACHE_TTL = float(os.environ.get('TICKETS_CATALOG_TTL', '300'))
+
+_catalog_cache = {} # (base de datos, catálogo) -> (instante de caducidad, valor)
+_catalog_cache_stats = {} # catálogo -> {'hits', 'misses', 'invalidations'}
+_catalog_cache_lock = threading.Lock()
+
+def _catalog_stats(name):
+    return _catalog_cache_stats.setdefault(name, {'hits': 0, 'misses': 0, 'invalidations': 0})
+
+def cached_catalog(name, loader, default):
+    """Devuelve el catálogo `name` desde la caché o lo carga con `loader(conn)`.
+
+    El valor devuelto se comparte entre llamadas: no debe modificarse.
+    Los errores de carga no se cachean; se devuelve `default`.
+    """
+    key = (DATABASE_NAME, name)
+    with _catalog_cache_lock:
+        entry = _catalog_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            _catalog_stats(name)['hits'] += 1
+            return entry[1]
+        _catalog_stats(name)['misses'] += 1
+    conn = get_db_connection()
+    if not conn: return default
+    try:
+        value = loader(conn)
+    except sqlite3.Error as e:
+        print(f"Error al obtener el catálogo {name}: {e}")
+        return default
+    finally:
+        conn.close()
+    with _catalog_cache_lock:
+        _catalog_cache[key] = (time.monotonic() + CATALOG_CACHE_TTL, value)
+    return value
+
+def invalidate_catalog(*names):
+    """Descarta de la caché los catálogos indicados (todos si no se indica ninguno)."""
+    with _catalog_cache_lock:
+        for key in list(_catalog_cache):
+            if not names or key[1] in names:
+                del _catalog_cache[key]
+        for name in names or list(_catalog_cache_stats):
+            _catalog_stats(name)['invalidations'] += 1
+
+def get_catalog_cache_stats():
+    """Aciertos, fallos e invalidaciones por catálogo, y si está cacheado ahora mismo."""
+    now = time.monotonic()
+    with _catalog_cache_lock:
+        stats = {name: dict(values) for name, values in _catalog_cache_stats.items()}
+        for (database, name), (expires, _) in _catalog_cache.items():
+            if database == DATABASE_NAME and expires > now:
+                stats.setdefault(name, {'hits': 0, 'misses': 0, 'invalidations': 0})['cached'] = True
+    for values in stats.values():
+        values.setdefault('cached', False)
+    return stats
+
+# --- Funciones para obtener datos de catálogos ---
+def get_catalog_data(table_name, id_column, name_column, active_only=True, order_column=None):
+    def load(conn):
+        where = "WHERE activo = 1" if active_only else ""
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {id_column}, {name_column} FROM {table_name} {where} ORDER BY {order_column or name_column}")
+        return {row[id_column]: row[name_column] for row in cursor.fetchall()}
+    return cached_catalog(table_name, load, {})
+
+def get_tipos_tarea_catalog():
+    return get_catalog_data('tipos_tarea', 'id_tipo_tarea', 'nombre')
+
+def get_tecnicos_catalog():
+    def load(conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT id_tecnico, nombre || ' ' || apellido AS full_name FROM tecnicos WHERE activo = 1 ORDER BY nombre")
+        return {row['id_tecnico']: row['full_name'] for row in cursor.fetchall()}
+    return cached_catalog('tecnicos', load, {})
+
+def get_clientes_catalog():
+    def load(conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT id_cliente, nombre_empresa FROM clientes ORDER BY nombre_empresa")
+        return {row['id_cliente']: row['nombre_empresa'] for row in cursor.fetchall()}
+    return cached_catalog('clientes', load, {})
+
+def get_modalidades_catalog():
+    return get_catalog_data('modalidades_trabajo', 'id_modalidad', 'nombre')
+
+# prioridades y estados_ticket no tienen columna `activo`
 def get_prioridades_catalog():
-    return get_catalog_data('prioridades', 'id_prioridad', 'nombre')
+    return get_catalog_data('prioridades', 'id_prioridad', 'nombre', active_only=False, order_column='nivel')
 
 def get_estados_ticket_catalog():
-    return get_catalog_data('estados_ticket', 'id_estado', 'nombre')
\ No newline at end of file
+    return get_catalog_data('estados_ticket', 'id_estado', 'nombre', active_only=False, order_column='orden_flujo')
+
+
+# --- Migraciones del esquema ---
+# PRAGMA user_version guarda la última migración aplicada. Cada paso recibe un cursor dentro de la
+# transacción de su migración y debe ser idempotente: las bases creadas antes de que existieran las
+# migraciones (user_version = 0) ya tienen parte del esquema.
+
+def _migration_base_schema(cursor):
+    create_base_schema(cursor)
+    insert_master_data_if_empty(cursor.connection)
+
+def _migration_ticket_totals(cursor):
+    create_ticket_totals(cursor)
+    migrate_indexes(cursor) # idx_registros_tecnico -> (id_tecnico, fecha_actividad) para el historial por técnico
+
+def migrate_indexes(cursor):
+    """Sustituye los índices de una columna por los compuestos de INDEXES y actualiza las estadísticas."""
+    for name in OBSOLETE_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    for _, index_sql in INDEXES:
+        cursor.execute(index_sql)
+    cursor.execute("ANALYZE")
+
+MIGRATIONS = (
+    (1, "Tablas, índices y datos maestros", _migration_base_schema),
+    (2, "Contadores del dashboard (resumen_contadores)", create_dashboard_counters),
+    (3, "Búsqueda de texto completo (busqueda_tickets)", create_ticket_search),
+    (4, "Versiones de datos por tabla (versiones_datos)", create_data_versions),
+    (5, "Índices compuestos; retirada de los redundantes", migrate_indexes),
+    (6, "Totales de actividad por ticket (totales_ticket)", _migration_ticket_totals),
+    (7, "Resúmenes por técnico y por cliente (resumen_tecnico, resumen_cliente)", create_summaries),
+    (8, "Historial de cambios (historial_cambios) en lugar de los triggers trg_*_updated", create_change_history),
+    (9, "Actividad indexada por registro (busqueda_actividad)", create_ticket_search),
+    (10, "Versiones de datos por lote de escritura, sin triggers por fila", drop_data_version_triggers),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn=None):
+    """Versión del esquema (PRAGMA user_version) de la base de datos actual."""
+    borrowed = conn is None
+    if borrowed:
+        conn = get_db_connection()
+    if not conn: return None
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Error al leer la versión del esquema: {e}")
+        return None
+    finally:
+        if borrowed:
+            conn.close()
+
+def migrate_database(conn):
+    """Aplica en orden las migraciones pendientes, cada una en su propia transacción.
+
+    BEGIN IMMEDIATE serializa a los procesos que arrancan a la vez: la versión se vuelve a leer
+    con el bloqueo tomado y una migración ya aplicada por otro proceso se salta; si el bloqueo no
+    llega a tiempo se reintenta (retry_transaction). Devuelve la lista de versiones aplicadas; los
+    errores se propagan con la migración en curso deshecha.
+    """
+    def apply(conn, version, description, step):
+        cursor = conn.cursor()
+        if cursor.execute("PRAGMA user_version").fetchone()[0] >= version:
+            return False
+        print(f"Aplicando migración {version}: {description}...")
+        step(cursor)
+        cursor.execute(f"PRAGMA user_version = {int(version)}")
+        return True
+
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            continue
+        if retry_transaction(conn, lambda conn: apply(conn, version, description, step), 'migrate_database'):
+            applied.append(version)
+    return applied
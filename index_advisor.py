@@ -0,0 +1,216 @@
+"""Asesor de índices: revisa los planes de las consultas habituales y prueba índices candidatos.
+
+Ejecuta las formas de consulta que usan database.py y app.py con EXPLAIN QUERY PLAN sobre la base
+de datos actual (conviene una de tamaño realista, p. ej. generada con populate.py), marca los
+recorridos completos de tabla y los B-tree temporales, y prueba cada índice candidato dentro de un
+SAVEPOINT que se deshace al terminar: la base de datos no se modifica.
+
+Uso:
+    python manage.py --db .bench_data/tickets_100000.db indexes [--try-candidates] [--repeat 5]
+"""
+import re
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import database as db
+
+SLOW_QUERY_MS = 5.0 # Por encima de esto se prueban candidatos aunque el plan no tenga avisos
+MIN_SPEEDUP = 1.5 # Mejora mínima para recomendar un candidato
+
+SMALL_TABLE_ROWS = 1000 # Recorrer tablas más pequeñas (catálogos) no se considera un problema
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+# Índices candidatos que el asesor compara con los actuales. No hace falta añadir id_ticket al final:
+# es el rowid y SQLite ya lo guarda en cada entrada de índice, así que (x, fecha_creacion) sirve para
+# ORDER BY fecha_creacion DESC, id_ticket DESC y para el cursor (fecha_creacion, id_ticket) < (?, ?).
+CANDIDATE_INDEXES = {
+    'cand_tickets_cliente_fecha': "CREATE INDEX cand_tickets_cliente_fecha ON tickets(id_cliente, fecha_creacion)",
+    'cand_tickets_tecnico_fecha': "CREATE INDEX cand_tickets_tecnico_fecha ON tickets(id_tecnico_asignado, fecha_creacion)",
+    'cand_tickets_estado_fecha': "CREATE INDEX cand_tickets_estado_fecha ON tickets(id_estado, fecha_creacion)",
+    'cand_tickets_prioridad_fecha': "CREATE INDEX cand_tickets_prioridad_fecha ON tickets(id_prioridad, fecha_creacion)",
+    'cand_tickets_tipo_fecha': "CREATE INDEX cand_tickets_tipo_fecha ON tickets(id_tipo_tarea, fecha_creacion)",
+    'cand_tickets_sin_tecnico': "CREATE INDEX cand_tickets_sin_tecnico ON tickets(fecha_creacion) WHERE id_tecnico_asignado IS NULL",
+    'cand_registros_ticket_fecha': "CREATE INDEX cand_registros_ticket_fecha ON registros_actividad(id_ticket, fecha_actividad)",
+}
+
+
+def _open_tickets_candidate(conn):
+    """Índice parcial de tickets abiertos, construido con los estados finales actuales.
+
+    Depende de los datos de estados_ticket: si cambian los estados finales deja de servir, por eso
+    solo se propone y no forma parte de INDEXES.
+    """
+    finals = [row[0] for row in conn.execute("SELECT id_estado FROM estados_ticket WHERE es_final = 1 ORDER BY id_estado")]
+    if not finals:
+        return {}
+    return {'cand_tickets_abiertos': "CREATE INDEX cand_tickets_abiertos ON tickets(fecha_creacion) "
+                                     f"WHERE id_estado NOT IN ({', '.join(str(int(f)) for f in finals)})"}
+
+
+def _most_common(conn, column, least=False):
+    order = 'ASC' if least else 'DESC'
+    row = conn.execute(f"SELECT {column} FROM tickets WHERE {column} IS NOT NULL GROUP BY 1 ORDER BY COUNT(*) {order} LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def query_shapes(conn):
+    """Formas de consulta habituales como (nombre, sql, parámetros), con valores tomados de los datos."""
+    cliente = _most_common(conn, 'id_cliente')
+    tecnico = _most_common(conn, 'id_tecnico_asignado')
+    estado = _most_common(conn, 'id_estado')
+    prioridad = _most_common(conn, 'id_prioridad')
+    tipo = _most_common(conn, 'id_tipo_tarea')
+    abiertos = [row[0] for row in conn.execute("SELECT id_estado FROM estados_ticket WHERE es_final = 0")]
+    newest = conn.execute("SELECT MAX(fecha_creacion) FROM tickets").fetchone()[0] or datetime.now().isoformat(' ')
+    middle = conn.execute("SELECT fecha_creacion, id_ticket FROM tickets ORDER BY id_ticket LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM tickets)").fetchone()
+    hasta = datetime.fromisoformat(str(newest)[:19]).date()
+    ticket = conn.execute("SELECT id_ticket FROM registros_actividad GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+
+    shapes = [
+        ('listado', db.ticket_page_query()),
+        ('listado (página intermedia)', db.ticket_page_query(after=tuple(middle) if middle else None)),
+        ('listado por cliente', db.ticket_page_query(filters={'id_cliente': cliente})),
+        ('listado por técnico', db.ticket_page_query(filters={'id_tecnico': tecnico})),
+        ('listado por estado', db.ticket_page_query(filters={'id_estado': estado})),
+        ('listado por estado poco frecuente', db.ticket_page_query(filters={'id_estado': _most_common(conn, 'id_estado', least=True)})),
+        ('listado por prioridad', db.ticket_page_query(filters={'id_prioridad': prioridad})),
+        ('listado por tipo de tarea', db.ticket_page_query(filters={'id_tipo_tarea': tipo})),
+        ('listado estados abiertos', db.ticket_page_query(filters={'id_estado': abiertos})),
+        ('listado cliente + estado', db.ticket_page_query(filters={'id_cliente': cliente, 'id_estado': estado})),
+        ('listado sin técnico', db.ticket_page_query(filters={'sin_tecnico': True})),
+        ('listado últimos 30 días', db.ticket_page_query(filters={'fecha_desde': hasta - timedelta(days=30), 'fecha_hasta': hasta})),
+        ('contador tickets abiertos', (db.DASHBOARD_COUNTERS['tickets_abiertos'], [])),
+        ('actividad de un ticket', ("SELECT * FROM registros_actividad WHERE id_ticket = ? ORDER BY fecha_actividad DESC", [ticket[0] if ticket else 0])),
+        ('ticket por número', ("SELECT * FROM tickets WHERE numero_ticket = ?", ['TK-0001'])),
+        ('catálogo de clientes', ("SELECT id_cliente, nombre_empresa FROM clientes WHERE activo = 1 ORDER BY nombre_empresa", [])),
+    ]
+    return [(name, sql, list(params)) for name, (sql, params) in shapes]
+
+
+def explain(conn, sql, params):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def plan_issues(plan, small_tables=()):
+    """Avisos de un plan: recorridos completos de tabla (salvo las pequeñas) y B-trees temporales."""
+    issues = []
+    for detail in plan:
+        match = _FULL_SCAN.match(detail)
+        if match and match.group(1) in small_tables:
+            continue
+        if match:
+            issues.append(f"recorrido completo de {match.group(1)}")
+        elif 'USE TEMP B-TREE' in detail:
+            issues.append(detail.replace('USE TEMP B-TREE FOR', 'B-tree temporal para').lower())
+    return issues
+
+
+def time_query(conn, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _tables(conn):
+    return [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE 'CREATE VIRTUAL%'")]
+
+
+def _small_tables(conn):
+    small = set()
+    for table in _tables(conn):
+        try:
+            if conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT {SMALL_TABLE_ROWS})").fetchone()[0] < SMALL_TABLE_ROWS:
+                small.add(table)
+        except db.sqlite3.Error:
+            continue # Tablas internas de FTS5 y similares
+    return small
+
+
+def redundant_indexes(conn):
+    """Índices cuyas columnas son prefijo de otro índice de la misma tabla (incluidos los UNIQUE automáticos)."""
+    found = []
+    for table in _tables(conn):
+        indexes = {}
+        for row in conn.execute(f"PRAGMA index_list({table})"):
+            name, partial = row[1], row[4]
+            if partial:
+                continue
+            indexes[name] = tuple(info[2] for info in conn.execute(f"PRAGMA index_info({name})"))
+        for name, columns in indexes.items():
+            if name.startswith('sqlite_autoindex'):
+                continue
+            for other, other_columns in indexes.items():
+                if other != name and other_columns[:len(columns)] == columns and (len(other_columns) > len(columns) or other.startswith('sqlite_autoindex')):
+                    found.append((name, other, columns))
+                    break
+    return found
+
+
+def _try_candidate(conn, ddl, sql, params, repeat):
+    conn.execute("SAVEPOINT asesor_indices")
+    try:
+        conn.execute(ddl)
+        conn.execute(f"ANALYZE {ddl.split()[2]}") # Estadísticas solo del índice nuevo
+        return explain(conn, sql, params), time_query(conn, sql, params, repeat)
+    finally:
+        conn.execute("ROLLBACK TO asesor_indices")
+        conn.execute("RELEASE asesor_indices")
+
+
+def advise(try_candidates=False, repeat=5):
+    """Analiza las consultas habituales; con try_candidates prueba los índices candidatos.
+
+    Devuelve una lista de dicts por consulta (nombre, ms, plan, avisos y, si se probaron,
+    la mejor recomendación) más la lista de índices redundantes, o None si hay un error.
+    """
+    conn = db.get_db_connection()
+    if not conn: return None
+    try:
+        candidates = dict(CANDIDATE_INDEXES, **_open_tickets_candidate(conn))
+        small_tables = _small_tables(conn)
+        report = []
+        for name, sql, params in query_shapes(conn):
+            plan = explain(conn, sql, params)
+            entry = {'consulta': name, 'ms': time_query(conn, sql, params, repeat), 'plan': plan,
+                     'avisos': plan_issues(plan, small_tables), 'recomendacion': None}
+            if try_candidates and (entry['avisos'] or entry['ms'] >= SLOW_QUERY_MS):
+                best = None
+                for index_name, ddl in candidates.items():
+                    table = ddl.split(' ON ')[1].split('(')[0]
+                    if not re.search(rf"\b{table}\b", sql):
+                        continue
+                    new_plan, ms = _try_candidate(conn, ddl, sql, params, repeat)
+                    if index_name in ' '.join(new_plan) and (best is None or ms < best['ms']):
+                        best = {'indice': index_name, 'ddl': ddl, 'ms': ms, 'plan': new_plan}
+                if best and entry['ms'] / max(best['ms'], 1e-6) >= MIN_SPEEDUP:
+                    entry['recomendacion'] = best
+            report.append(entry)
+        return report, redundant_indexes(conn)
+    except db.sqlite3.Error as e:
+        print(f"Error en el asesor de índices: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def print_report(report, redundant):
+    for entry in report:
+        marker = '!!' if entry['avisos'] else 'ok'
+        print(f"[{marker}] {entry['consulta']}: {entry['ms']:.2f} ms")
+        for detail in entry['plan']:
+            print(f"       {detail}")
+        for issue in entry['avisos']:
+            print(f"     -> {issue}")
+        best = entry['recomendacion']
+        if best:
+            print(f"     => {best['indice']}: {entry['ms']:.2f} ms -> {best['ms']:.2f} ms (x{entry['ms'] / max(best['ms'], 1e-6):.1f})")
+            print(f"        {best['ddl']}")
+    if redundant:
+        print("\nÍndices redundantes:")
+        for name, other, columns in redundant:
+            print(f"  -> {name} ({', '.join(columns)}) ya está cubierto por {other}")
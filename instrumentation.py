@@ -0,0 +1,330 @@
+"""Instrumentación de las sentencias SQL ejecutadas a través del pool de database.py.
+
+Cada sentencia se agrupa por su huella (el SQL con los literales sustituidos por '?') y se
+registra duración, filas devueltas y función que la lanzó. Las duraciones se acumulan en un
+histograma en memoria y las que superan SLOW_QUERY_MS se escriben en SLOW_QUERY_LOG (JSONL)
+junto con su EXPLAIN QUERY PLAN. El EXPLAIN y la escritura los hace un hilo aparte: la consulta
+lenta no espera por ellos ni bloquea a los demás hilos que registran estadísticas.
+"""
+import atexit
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from itertools import chain
+from datetime import datetime
+from functools import lru_cache
+
+ENABLED = os.environ.get('TICKETS_QUERY_STATS', '1') != '0'
+SLOW_QUERY_MS = float(os.environ.get('TICKETS_SLOW_QUERY_MS', '100'))
+SLOW_QUERY_LOG = os.environ.get('TICKETS_SLOW_QUERY_LOG', 'consultas_lentas.jsonl')
+
+# Límites superiores (ms) de los cubos del histograma; el último cubo es "> 1000 ms"
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Módulos cuyas funciones no cuentan como "llamante" (envoltorios y librerías intermedias)
+_SKIPPED_MODULES = ('instrumentation', 'sqlite3', 'pandas')
+_wrapper_codes = set()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_ATTACH = re.compile(r"^\s*ATTACH\b.*\bAS\s+(\w+)", re.IGNORECASE | re.DOTALL)
+
+_lock = threading.Lock()
+_stats = {}
+_attached_schemas = set() # Esquemas adjuntados alguna vez con ATTACH a través de un InstrumentedCursor
+
+_slow_queue = queue.Queue() # Consultas lentas pendientes de EXPLAIN y de escribir en SLOW_QUERY_LOG
+_slow_lock = threading.Lock() # Solo protege el arranque del hilo que las atiende
+_slow_thread = None
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Normaliza una sentencia para agrupar las ejecuciones que solo difieren en los valores."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip().rstrip(';')
+
+
+def register_wrapper(func):
+    """Marca una función como envoltorio: el llamante registrado será quien la invoque."""
+    _wrapper_codes.add(func.__code__)
+    return func
+
+
+def _caller():
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if frame.f_code not in _wrapper_codes and module.split('.')[0] not in _SKIPPED_MODULES:
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return '?'
+
+
+def _bucket(elapsed_ms):
+    for i, limit in enumerate(HISTOGRAM_BUCKETS_MS):
+        if elapsed_ms <= limit:
+            return i
+    return len(HISTOGRAM_BUCKETS_MS)
+
+
+def record(sql, elapsed_ms, rows, caller, error=None):
+    """Acumula una ejecución en las estadísticas de su huella."""
+    key = fingerprint(sql)
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = {
+                'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                'histogram': [0] * (len(HISTOGRAM_BUCKETS_MS) + 1), 'callers': Counter(),
+            }
+        entry['count'] += 1
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+        entry['rows'] += rows
+        entry['histogram'][_bucket(elapsed_ms)] += 1
+        entry['callers'][caller] += 1
+        if error is not None:
+            entry['errors'] += 1
+    return key
+
+
+def _histogram_percentile(histogram, fraction):
+    """Límite superior del cubo donde cae el percentil (None si cae en el cubo abierto)."""
+    target = fraction * sum(histogram)
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if count and seen >= target:
+            return HISTOGRAM_BUCKETS_MS[i] if i < len(HISTOGRAM_BUCKETS_MS) else None
+    return None
+
+
+def get_query_stats():
+    """Estadísticas por huella, de la más costosa (tiempo total) a la menos."""
+    with _lock:
+        entries = [(key, dict(entry, histogram=list(entry['histogram']), callers=Counter(entry['callers'])))
+                   for key, entry in _stats.items()]
+    result = []
+    for key, entry in sorted(entries, key=lambda item: item[1]['total_ms'], reverse=True):
+        result.append({
+            'sql': key,
+            'count': entry['count'],
+            'errors': entry['errors'],
+            'total_ms': entry['total_ms'],
+            'avg_ms': entry['total_ms'] / entry['count'],
+            'p50_ms': _histogram_percentile(entry['histogram'], 0.50),
+            'p95_ms': _histogram_percentile(entry['histogram'], 0.95),
+            'max_ms': entry['max_ms'],
+            'rows': entry['rows'],
+            'callers': ', '.join(name for name, _ in entry['callers'].most_common(3)),
+            'histogram': entry['histogram'],
+        })
+    return result
+
+
+def reset_query_stats():
+    with _lock:
+        _stats.clear()
+
+
+def explain_query_plan(database, sql, params=(), attached=None):
+    """EXPLAIN QUERY PLAN en una conexión de solo lectura aparte (no toca la conexión del pool).
+
+    `attached` ({esquema: archivo}) son las bases adjuntas que usa la sentencia, p. ej. el archivo
+    de tickets cerrados; se adjuntan también en solo lectura.
+    """
+    try:
+        conn = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return [f"No disponible: {e}"]
+    try:
+        for name, path in (attached or {}).items():
+            conn.execute(f'ATTACH DATABASE ? AS "{name}"', (f"file:{path}?mode=ro",))
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    except sqlite3.Error as e:
+        return [f"No disponible: {e}"]
+    finally:
+        conn.close()
+
+
+def log_slow_query(database, sql, params, elapsed_ms, rows, caller, attached=None):
+    """Encola una entrada para el registro de consultas lentas; el hilo de fondo añade el plan y la escribe."""
+    entry = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'duracion_ms': round(elapsed_ms, 3),
+        'filas': rows,
+        'llamante': caller,
+        'sql': fingerprint(sql),
+    }
+    _ensure_slow_thread()
+    _slow_queue.put((database, sql, params, attached, entry))
+
+
+def _ensure_slow_thread():
+    global _slow_thread
+    with _slow_lock:
+        if _slow_thread is None or not _slow_thread.is_alive():
+            _slow_thread = threading.Thread(target=_slow_query_worker, name='consultas-lentas', daemon=True)
+            _slow_thread.start()
+
+
+def _slow_query_worker():
+    while True:
+        database, sql, params, attached, entry = _slow_queue.get()
+        try:
+            entry['plan'] = explain_query_plan(database, sql, params, attached)
+            with open(SLOW_QUERY_LOG, 'a', encoding='utf-8') as f: # Único escritor: no hace falta bloqueo
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"Error al escribir el registro de consultas lentas: {e}")
+        finally:
+            _slow_queue.task_done()
+
+
+def flush_slow_queries(timeout=5.0):
+    """Espera (como mucho `timeout` segundos) a que se escriban las consultas lentas pendientes."""
+    deadline = time.monotonic() + timeout
+    while _slow_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+atexit.register(flush_slow_queries) # Un script corto no pierde las entradas aún en cola
+
+
+def read_slow_queries(limit=50):
+    """Últimas `limit` entradas del registro de consultas lentas (la más reciente primero)."""
+    try:
+        with open(SLOW_QUERY_LOG, encoding='utf-8') as f:
+            lines = f.readlines()[-limit:]
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return entries
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mide cada sentencia desde execute() hasta que se terminan de leer sus filas.
+
+    Una sentencia se da por terminada al agotar las filas, al ejecutar la siguiente, al cerrar
+    el cursor o cuando el cursor se libera.
+    """
+
+    database = None
+
+    def _finish(self):
+        pending = self.__dict__.pop('_pending', None)
+        if pending is None:
+            return
+        sql, params, caller, elapsed, rows, error, attached = pending
+        elapsed_ms = elapsed * 1000
+        record(sql, elapsed_ms, rows, caller, error)
+        if elapsed_ms >= SLOW_QUERY_MS and error is None and self.database:
+            log_slow_query(self.database, sql, params, elapsed_ms, rows, caller, attached)
+
+    def _attached(self, sql):
+        """Bases adjuntas a la conexión que nombra la sentencia ({esquema: archivo}), para su EXPLAIN.
+
+        Se consulta al ejecutar la sentencia, con la conexión aún en uso (_finish puede llegar desde
+        __del__, con la conexión ya devuelta al pool), y solo si la sentencia nombra un esquema adjunto.
+        """
+        if not any(re.search(rf"\b{re.escape(name)}\.", sql) for name in _attached_schemas):
+            return {}
+        try:
+            databases = self.connection.execute("PRAGMA database_list").fetchall()
+        except sqlite3.Error:
+            return {}
+        return {row[1]: row[2] for row in databases
+                if row[1] not in ('main', 'temp') and row[2] and re.search(rf"\b{re.escape(row[1])}\.", sql)}
+
+    def _run(self, method, sql, params, explain_params):
+        self._finish()
+        caller = _caller()
+        attached = self._attached(sql)
+        started = time.perf_counter()
+        try:
+            method(self, sql, params)
+        except sqlite3.Error as e:
+            self._pending = [sql, explain_params, caller, time.perf_counter() - started, 0, e, attached]
+            self._finish()
+            raise
+        elapsed = time.perf_counter() - started
+        attach = _ATTACH.match(sql)
+        if attach:
+            _attached_schemas.add(attach.group(1))
+        # Las sentencias sin filas (INSERT/UPDATE/DDL) cuentan las filas afectadas y terminan ya
+        if self.description is None:
+            self._pending = [sql, explain_params, caller, elapsed, max(self.rowcount, 0), None, attached]
+            self._finish()
+        else:
+            self._pending = [sql, explain_params, caller, elapsed, 0, None, attached]
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(sqlite3.Cursor.execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # El EXPLAIN de una consulta lenta usa la primera tupla de parámetros: todas tienen la misma forma
+        if isinstance(seq_of_parameters, (list, tuple)):
+            first = seq_of_parameters[0] if seq_of_parameters else None
+        else: # Generador: se lee el primero y se vuelve a poner delante
+            iterator = iter(seq_of_parameters)
+            first = next(iterator, None)
+            seq_of_parameters = iterator if first is None else chain([first], iterator)
+        return self._run(sqlite3.Cursor.executemany, sql, seq_of_parameters, () if first is None else first)
+
+    def _fetch(self, method, *args):
+        pending = self.__dict__.get('_pending')
+        started = time.perf_counter()
+        result = method(self, *args)
+        if pending is not None:
+            pending[3] += time.perf_counter() - started
+            if isinstance(result, list):
+                pending[4] += len(result)
+                if method is sqlite3.Cursor.fetchall or len(result) < (args[0] if args else self.arraysize):
+                    self._finish()
+            elif result is None:
+                self._finish()
+            else:
+                pending[4] += 1
+        return result
+
+    def fetchone(self):
+        return self._fetch(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(sqlite3.Cursor.fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(sqlite3.Cursor.fetchall)
+
+    def __next__(self):
+        row = self._fetch(sqlite3.Cursor.fetchone)
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
@@ -0,0 +1,306 @@
+"""Tareas de mantenimiento de la base de datos del sistema de tickets.
+
+Uso:
+    python manage.py schema
+    python manage.py counters --verify
+    python manage.py counters --rebuild
+    python manage.py totals [--rebuild]
+    python manage.py summaries [--rebuild]
+    python manage.py import tickets.csv [--format csv|jsonl] [--batch-size 5000] [--rejects archivo] [--rebuild-indexes]
+    python manage.py search "texto a buscar" [--limit 20]
+    python manage.py search --rebuild
+    python manage.py indexes [--try-candidates] [--repeat 5]
+    python manage.py optimize
+    python manage.py assign [--limit 500] [--dry-run]
+    python manage.py bulk (--ids 1,2,3 | --cliente N | --tecnico N | --estado N | --sin-tecnico | --abiertos ...)
+                          [--set-estado N] [--set-tecnico N|ninguno] [--set-prioridad N]
+    python manage.py archive [--days 180] [--batch-size 500] [--limit N] [--dry-run]
+    python manage.py archive --stats
+    python manage.py export (tecnicos|clientes) [--columns a,b,c] [--activo 0|1] [--especialidad X]
+                            [--ciudad X] [--pais X] [--output archivo.csv]
+"""
+import argparse
+import csv
+import sys
+from collections import Counter
+
+import asignacion
+import bulk_import
+import database as db
+import index_advisor
+
+
+def schema_command(args):
+    version = db.get_schema_version()
+    if version is None:
+        return 1
+    print(f"Versión del esquema: {version} (última disponible: {db.SCHEMA_VERSION})")
+    for number, description, _ in db.MIGRATIONS:
+        print(f"  {'[x]' if number <= version else '[ ]'} {number}: {description}")
+    return 0
+
+
+def counters_command(args):
+    if args.rebuild:
+        if not db.rebuild_dashboard_counters():
+            return 1
+        print("Contadores del dashboard reconstruidos.")
+    mismatches = db.verify_dashboard_counters()
+    if mismatches is None:
+        return 1
+    for key, value in sorted(db.get_dashboard_counters().items()):
+        print(f"  -> {key} = {value}")
+    if mismatches:
+        for key, (stored, actual) in mismatches.items():
+            print(f"DESCUADRE en {key}: almacenado={stored}, real={actual}")
+        print("Ejecuta 'python manage.py counters --rebuild' para corregirlos.")
+        return 1
+    print("Contadores del dashboard verificados: coinciden con los recuentos reales.")
+    return 0
+
+
+def totals_command(args):
+    if args.rebuild:
+        if not db.rebuild_ticket_totals():
+            return 1
+        print("Totales de actividad por ticket reconstruidos.")
+    mismatches = db.verify_ticket_totals()
+    if mismatches is None:
+        return 1
+    if mismatches:
+        shown = ', '.join(str(id_ticket) for id_ticket in mismatches[:20])
+        print(f"DESCUADRE en {len(mismatches)} tickets (id_ticket: {shown}{'...' if len(mismatches) > 20 else ''})")
+        print("Ejecuta 'python manage.py totals --rebuild' para corregirlos.")
+        return 1
+    print("Totales de actividad verificados: coinciden con registros_actividad.")
+    return 0
+
+
+def summaries_command(args):
+    if args.rebuild:
+        if not db.rebuild_summaries():
+            return 1
+        print("Resúmenes por técnico y por cliente reconstruidos.")
+    mismatches = db.verify_summaries()
+    if mismatches is None:
+        return 1
+    if mismatches:
+        for table, different in mismatches.items():
+            print(f"DESCUADRE en {table}: {different} filas distintas")
+        print("Ejecuta 'python manage.py summaries --rebuild' para corregirlos.")
+        return 1
+    print("Resúmenes verificados: coinciden con tickets y registros_actividad.")
+    return 0
+
+
+def import_command(args):
+    print(f"Importando tickets desde {args.path}...")
+    stats = bulk_import.import_tickets(args.path, fmt=args.format, batch_size=args.batch_size,
+                                       reject_path=args.rejects, rebuild_indexes=args.rebuild_indexes)
+    if stats is None:
+        return 1
+    print(f"Leídas: {stats['leidas']}, insertadas: {stats['insertadas']}, rechazadas: {stats['rechazadas']}")
+    print(f"Tiempo: {stats['segundos']:.1f}s ({stats['filas_por_segundo']:.0f} filas/s)")
+    if stats['archivo_rechazos']:
+        print(f"Filas rechazadas guardadas en {stats['archivo_rechazos']}")
+    return 0
+
+
+def search_command(args):
+    if args.rebuild:
+        indexed = db.rebuild_ticket_search()
+        if indexed is None:
+            return 1
+        print(f"Índice de búsqueda reconstruido: {indexed} tickets indexados.")
+    if not args.query:
+        return 0
+    results = db.search_tickets(args.query, limit=args.limit)
+    for row in results:
+        print(f"  -> [{row['numero_ticket']}] {row['titulo_resaltado']} ({row['relevancia']:.2f})")
+        print(f"     {row['fragmento']}")
+    print(f"{len(results)} tickets encontrados.")
+    return 0
+
+
+def indexes_command(args):
+    result = index_advisor.advise(try_candidates=args.try_candidates, repeat=args.repeat)
+    if result is None:
+        return 1
+    index_advisor.print_report(*result)
+    return 0
+
+
+def optimize_command(args):
+    if not db.optimize_database(full_analyze=True):
+        return 1
+    print("Estadísticas del planificador actualizadas (ANALYZE + PRAGMA optimize).")
+    return 0
+
+
+def assign_command(args):
+    plan = asignacion.assign_backlog(limit=args.limit, dry_run=args.dry_run)
+    if plan is None:
+        return 1
+    nombres = db.get_tecnicos_catalog()
+    for id_tecnico, tickets in Counter(id_tecnico for _, id_tecnico in plan).most_common():
+        print(f"  -> {nombres.get(id_tecnico, id_tecnico)}: {tickets} tickets")
+    print(f"{len(plan)} tickets {'se asignarían' if args.dry_run else 'asignados'}.")
+    return 0
+
+
+def _id_list(value):
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def bulk_command(args):
+    changes = {}
+    if args.set_estado is not None:
+        changes['id_estado'] = args.set_estado
+    if args.set_tecnico is not None:
+        changes['id_tecnico_asignado'] = None if args.set_tecnico.lower() == 'ninguno' else int(args.set_tecnico)
+    if args.set_prioridad is not None:
+        changes['id_prioridad'] = args.set_prioridad
+    filters = {'id_cliente': args.cliente, 'id_tecnico': args.tecnico, 'id_estado': args.estado,
+               'id_prioridad': args.prioridad, 'sin_tecnico': args.sin_tecnico, 'abiertos': args.abiertos}
+    result = db.bulk_update_tickets(changes, ids=args.ids, filters=filters)
+    if result is None:
+        return 1
+    print(f"{result['modificados']} de {result['seleccionados']} tickets seleccionados modificados.")
+    return 0
+
+
+def archive_command(args):
+    if not args.stats:
+        result = db.archive_closed_tickets(older_than_days=args.days, batch_size=args.batch_size, limit=args.limit, dry_run=args.dry_run)
+        if result is None:
+            return 1
+        if args.dry_run:
+            print(f"Se archivarían {result['tickets']} tickets y {result['registros']} registros de actividad.")
+            return 0
+        print(f"{result['tickets']} tickets y {result['registros']} registros de actividad archivados en {result['lotes']} lotes.")
+    stats = db.get_archive_stats(args.days)
+    if stats is None:
+        return 1
+    print(f"Archivo {stats['ruta']}: {stats['tickets']} tickets, {stats['registros']} registros (último archivado: {stats['ultimo_archivado'] or '—'})")
+    print(f"Pendientes de archivar (estado final, cerrados hace más de {args.days} días): {stats['pendientes']}")
+    return 0
+
+
+def export_command(args):
+    """Vuelca técnicos o clientes a CSV leyendo el cursor por bloques (memoria constante)."""
+    filters = {'activo': args.activo}
+    if args.table == 'tecnicos':
+        filters['especialidad'] = args.especialidad
+    else:
+        filters.update(ciudad=args.ciudad, pais=args.pais)
+    columns = [column.strip() for column in args.columns.split(',')] if args.columns else None
+    rows = db.iter_tecnicos(columns, filters) if args.table == 'tecnicos' else db.iter_clientes(columns, filters)
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        writer = None
+        count = 0
+        for row in rows:
+            if writer is None:
+                writer = csv.writer(output)
+                writer.writerow(row.keys())
+            writer.writerow(tuple(row))
+            count += 1
+    except ValueError as e:
+        print(f"Error al exportar {args.table}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        rows.close()
+        if args.output:
+            output.close()
+    if args.output:
+        print(f"{count} filas de {args.table} exportadas a {args.output}.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la base de datos del sistema de tickets.")
+    parser.add_argument('--db', default=db.DATABASE_NAME, help="Archivo de base de datos (por defecto: %(default)s)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    schema = subparsers.add_parser('schema', help="Muestra la versión del esquema y las migraciones aplicadas.")
+    schema.set_defaults(func=schema_command)
+
+    counters = subparsers.add_parser('counters', help="Verifica o reconstruye los contadores del dashboard.")
+    counters.add_argument('--rebuild', action='store_true', help="Recalcula los contadores antes de verificarlos.")
+    counters.add_argument('--verify', action='store_true', help="Solo verifica (acción por defecto).")
+    counters.set_defaults(func=counters_command)
+
+    totals = subparsers.add_parser('totals', help="Verifica o reconstruye los totales de actividad por ticket.")
+    totals.add_argument('--rebuild', action='store_true', help="Recalcula los totales antes de verificarlos.")
+    totals.set_defaults(func=totals_command)
+
+    summaries = subparsers.add_parser('summaries', help="Verifica o reconstruye los resúmenes por técnico y por cliente.")
+    summaries.add_argument('--rebuild', action='store_true', help="Recalcula los resúmenes antes de verificarlos.")
+    summaries.set_defaults(func=summaries_command)
+
+    importer = subparsers.add_parser('import', help="Importa tickets en masa desde CSV o JSONL.")
+    importer.add_argument('path')
+    importer.add_argument('--format', choices=['csv', 'jsonl'], help="Por defecto se deduce de la extensión.")
+    importer.add_argument('--batch-size', type=int, default=bulk_import.IMPORT_BATCH_SIZE)
+    importer.add_argument('--rejects', help="Archivo JSONL de filas rechazadas (por defecto: <archivo>.rechazados.jsonl)")
+    importer.add_argument('--rebuild-indexes', action='store_true', help="Elimina los índices de tickets durante la carga y los recrea al final.")
+    importer.set_defaults(func=import_command)
+
+    search = subparsers.add_parser('search', help="Busca tickets por texto o reconstruye el índice de búsqueda.")
+    search.add_argument('query', nargs='?')
+    search.add_argument('--limit', type=int, default=db.SEARCH_RESULTS_LIMIT)
+    search.add_argument('--rebuild', action='store_true', help="Vuelve a indexar todos los tickets y sus registros de actividad.")
+    search.set_defaults(func=search_command)
+
+    indexes = subparsers.add_parser('indexes', help="Revisa los planes de las consultas habituales y propone índices.")
+    indexes.add_argument('--try-candidates', action='store_true', help="Prueba cada índice candidato en un SAVEPOINT que se deshace.")
+    indexes.add_argument('--repeat', type=int, default=5, help="Ejecuciones por consulta para medir la mediana.")
+    indexes.set_defaults(func=indexes_command)
+
+    optimize = subparsers.add_parser('optimize', help="Ejecuta ANALYZE y PRAGMA optimize.")
+    optimize.set_defaults(func=optimize_command)
+
+    assign = subparsers.add_parser('assign', help="Asigna los tickets abiertos sin técnico al técnico menos cargado de su especialidad.")
+    assign.add_argument('--limit', type=int, help="Máximo de tickets a asignar (por prioridad y antigüedad).")
+    assign.add_argument('--dry-run', action='store_true', help="Muestra el reparto sin guardarlo.")
+    assign.set_defaults(func=assign_command)
+
+    bulk = subparsers.add_parser('bulk', help="Cambia estado, técnico o prioridad de varios tickets en una sola transacción.")
+    bulk.add_argument('--ids', type=_id_list, help="Lista de id_ticket separados por comas (ignora los filtros).")
+    bulk.add_argument('--cliente', type=_id_list, help="Filtro: id_cliente (uno o varios, separados por comas).")
+    bulk.add_argument('--tecnico', type=_id_list, help="Filtro: id_tecnico_asignado.")
+    bulk.add_argument('--estado', type=_id_list, help="Filtro: id_estado.")
+    bulk.add_argument('--prioridad', type=_id_list, help="Filtro: id_prioridad.")
+    bulk.add_argument('--sin-tecnico', action='store_true', help="Filtro: tickets sin técnico asignado.")
+    bulk.add_argument('--abiertos', action='store_true', help="Filtro: tickets en un estado no final.")
+    bulk.add_argument('--set-estado', type=int, help="Nuevo id_estado (un estado final rellena fecha_cierre).")
+    bulk.add_argument('--set-tecnico', help="Nuevo id_tecnico_asignado, o 'ninguno' para dejarlos sin asignar.")
+    bulk.add_argument('--set-prioridad', type=int, help="Nuevo id_prioridad.")
+    bulk.set_defaults(func=bulk_command)
+
+    archive = subparsers.add_parser('archive', help="Mueve los tickets cerrados antiguos y su actividad al archivo.")
+    archive.add_argument('--days', type=int, default=db.ARCHIVE_AFTER_DAYS, help="Antigüedad mínima del cierre en días (por defecto: %(default)s).")
+    archive.add_argument('--batch-size', type=int, default=db.ARCHIVE_BATCH_SIZE, help="Tickets por transacción.")
+    archive.add_argument('--limit', type=int, help="Máximo de tickets a archivar en esta ejecución.")
+    archive.add_argument('--dry-run', action='store_true', help="Solo cuenta lo que se archivaría.")
+    archive.add_argument('--stats', action='store_true', help="Solo muestra el estado del archivo.")
+    archive.set_defaults(func=archive_command)
+
+    export = subparsers.add_parser('export', help="Exporta técnicos o clientes a CSV (nunca incluye password_hash).")
+    export.add_argument('table', choices=sorted(db.LISTINGS))
+    export.add_argument('--columns', help="Columnas separadas por comas (por defecto: todas las disponibles).")
+    export.add_argument('--activo', type=int, choices=[0, 1], help="Filtro: activos (1) o inactivos (0).")
+    export.add_argument('--especialidad', help="Filtro de técnicos: especialidad.")
+    export.add_argument('--ciudad', help="Filtro de clientes: ciudad.")
+    export.add_argument('--pais', help="Filtro de clientes: país.")
+    export.add_argument('--output', help="Archivo CSV (por defecto: salida estándar).")
+    export.set_defaults(func=export_command)
+
+    args = parser.parse_args()
+    db.DATABASE_NAME = args.db
+    if not db.initialize_database():
+        return 1
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,151 +1,129 @@
+import argparse
 import sqlite3
 import random
 from datetime import datetime, timedelta
+from itertools import islice
 import hashlib
 
 # Importamos las funciones de base de datos
-import database as db 
+import database as db
+import bulk_import
+
+ESPECIALIDADES = ["Redes", "Sistemas", "Bases de Datos", "Seguridad", "Soporte"]
+CIUDADES = ["Madrid", "Barcelona", "Valencia", "Sevilla", "Bilbao", "Zaragoza", "Málaga", "Murcia", "Palma", "Las Palmas"]
+TRABAJOS = [
+    "Diagnóstico inicial del problema", "Revisión de logs del sistema", "Reinstalación del controlador",
+    "Actualización de firmware", "Configuración de red inalámbrica", "Mantenimiento preventivo de servidores",
+    "Restauración de copia de seguridad", "Llamada de seguimiento con el usuario", "Documentación de la solución",
+]
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S" # Mismo formato que CURRENT_TIMESTAMP
+LOTE_POR_DEFECTO = 10000
 
 # --- Generación de datos sintéticos ---
-def generate_synthetic_data():
-    """Genera datos sintéticos para técnicos, clientes y tickets."""
-
-    # --- Generar Técnicos ---
-    print("Generando 10 técnicos...")
-    tecnicos_data = []
-    for i in range(1, 11):
-        nombre = f"Tecnico{i}"
-        apellido = chr(65 + (i % 26)) # Letras A-Z para apellidos
-        email = f"tecnico{i}@ejemplo.com"
-        login = f"login_tec{i}"
-        password_hash = hashlib.sha256("password123".encode()).hexdigest() # Contraseña simple y NO segura
-        telefono = f"+34 600 000 {i:03d}"
-        especialidad = random.choice(["Redes", "Sistemas", "Bases de Datos", "Seguridad", "Soporte"])
-        fecha_ingreso = (datetime.now() - timedelta(days=random.randint(365, 365*5))).strftime("%Y-%m-%d")
-        
-        tecnicos_data.append({
-            "nombre": nombre, "apellido": apellido, "email": email, "login": login,
-            "password_hash": password_hash, "telefono": telefono, "especialidad": especialidad, "fecha_ingreso": fecha_ingreso
-        })
-    print("  -> Técnicos generados.")
-
-    # --- Generar Clientes ---
-    print("Generando 20 clientes...")
-    clientes_data = []
-    for i in range(1, 21):
-        nombre_empresa = f"Empresa Cliente {i}"
-        contacto_principal = f"Contacto {chr(65 + (i % 26))} {chr(66 + ((i+1) % 26))}"
-        email = f"contacto{i}@empresa{i}.com"
-        telefono = f"+34 910 000 {i:03d}"
-        direccion = f"Calle Ficticia {i}, Piso {random.randint(1, 10)}"
-        ciudad = random.choice(["Madrid", "Barcelona", "Valencia", "Sevilla", "Bilbao", "Zaragoza", "Málaga", "Murcia", "Palma", "Las Palmas"])
-        pais = "España"
-        
-        clientes_data.append({
-            "nombre_empresa": nombre_empresa, "contacto_principal": contacto_principal, "email": email,
-            "telefono": telefono, "direccion": direccion, "ciudad": ciudad, "pais": pais
-        })
-    print("  -> Clientes generados.")
-
-    # --- Obtener IDs de catálogos ---
-    # Estas consultas se hacen después de que initialize_database haya intentado crear las tablas
-    # y las inserciones maestras hayan tenido lugar.
-    print("Obteniendo IDs de catálogos...")
-    tecnico_ids, cliente_ids, tipo_tarea_ids, prioridad_ids, estado_ids = [], [], [], [], []
-    estados_finales_ids_actuales = [] # Inicializar la lista para la lógica de fecha de cierre
+# Los generadores producen tuplas listas para executemany, de una en una, para poder generar
+# millones de filas con memoria acotada.
+
+def pesos_acumulados(n, sesgo):
+    """Pesos acumulados tipo Zipf (1/rango^sesgo) para random.choices; sesgo=0 es uniforme."""
+    acumulado, pesos = 0.0, []
+    for rango in range(1, n + 1):
+        acumulado += 1.0 / rango ** sesgo
+        pesos.append(acumulado)
+    return pesos
+
+def generate_tecnicos(cantidad, rng, inicio=1):
+    password_hash = hashlib.sha256("password123".encode()).hexdigest() # Contraseña simple y NO segura
+    for i in range(inicio, inicio + cantidad):
+        fecha_ingreso = (datetime.now() - timedelta(days=rng.randint(365, 365*5))).strftime("%Y-%m-%d")
+        yield (f"Tecnico{i}", chr(65 + (i % 26)), f"tecnico{i}@ejemplo.com", f"login_tec{i}", password_hash,
+               f"+34 600 {i:06d}", rng.choice(ESPECIALIDADES), fecha_ingreso)
+
+def generate_clientes(cantidad, rng, inicio=1):
+    for i in range(inicio, inicio + cantidad):
+        yield (f"Empresa Cliente {i}", f"Contacto {chr(65 + (i % 26))} {chr(66 + ((i+1) % 26))}", f"contacto{i}@empresa{i}.com",
+               f"+34 910 {i:06d}", f"Calle Ficticia {i}, Piso {rng.randint(1, 10)}", rng.choice(CIUDADES), "España")
+
+def generate_tickets(cantidad, ids, rng, primer_id, dias, sesgo):
+    """Genera tickets con id_ticket explícito; clientes y técnicos siguen una distribución con sesgo."""
+    ahora = datetime.now()
+    clientes, tecnicos = list(ids['clientes']), list(ids['tecnicos'])
+    rng.shuffle(clientes) # El cliente "más popular" no es siempre el de menor ID
+    rng.shuffle(tecnicos)
+    pesos_clientes = pesos_acumulados(len(clientes), sesgo)
+    pesos_tecnicos = pesos_acumulados(len(tecnicos), sesgo)
+    for id_ticket in range(primer_id, primer_id + cantidad):
+        id_cliente = rng.choices(clientes, cum_weights=pesos_clientes)[0]
+        id_tecnico_asignado = rng.choices(tecnicos, cum_weights=pesos_tecnicos)[0] if rng.random() > 0.1 else None # ~10% sin asignar
+        id_estado = rng.choice(ids['estados'])
+        fecha_creacion = ahora - timedelta(seconds=rng.uniform(0, dias * 86400))
 
-    conn = db.get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            print("  - Obteniendo IDs de técnicos...")
-            cursor.execute("SELECT id_tecnico FROM tecnicos")
-            tecnico_ids = [row[0] for row in cursor.fetchall()]
-            print(f"    Encontrados {len(tecnico_ids)} técnicos.")
-            
-            print("  - Obteniendo IDs de clientes...")
-            cursor.execute("SELECT id_cliente FROM clientes")
-            cliente_ids = [row[0] for row in cursor.fetchall()]
-            print(f"    Encontrados {len(cliente_ids)} clientes.")
-
-            print("  - Obteniendo IDs de tipos de tarea...")
-            cursor.execute("SELECT id_tipo_tarea FROM tipos_tarea")
-            tipo_tarea_ids = [row[0] for row in cursor.fetchall()]
-            print(f"    Encontrados {len(tipo_tarea_ids)} tipos de tarea.")
-
-            print("  - Obteniendo IDs de prioridades...")
-            cursor.execute("SELECT id_prioridad FROM prioridades")
-            prioridad_ids = [row[0] for row in cursor.fetchall()]
-            print(f"    Encontrados {len(prioridad_ids)} prioridades.")
-
-            print("  - Obteniendo IDs de estados de ticket...")
-            cursor.execute("SELECT id_estado FROM estados_ticket")
-            estado_ids = [row[0] for row in cursor.fetchall()]
-            print(f"    Encontrados {len(estado_ids)} estados de ticket.")
-            
-            # Obtener IDs de estados finales para la lógica de fecha de cierre
-            print("  - Obteniendo IDs de estados finales...")
-            cursor.execute("SELECT id_estado FROM estados_ticket WHERE es_final = 1")
-            estados_finales_ids_actuales = [row[0] for row in cursor.fetchall()]
-            print(f"    Encontrados {len(estados_finales_ids_actuales)} estados finales.")
-            
-        except sqlite3.Error as e:
-            print(f"ERROR obteniendo IDs de catálogos: {e}")
-            return None, None, None # Indicar fallo
-        finally:
-            conn.close()
-    else:
-        print("ERROR: No se pudo obtener la conexión a la DB para obtener IDs de catálogos.")
-        return None, None, None # Indicar fallo
-
-    # --- Verificación crucial: Si alguna lista de IDs está vacía, significa que la inserción maestra falló ---
-    if not (tecnico_ids and cliente_ids and tipo_tarea_ids and prioridad_ids and estado_ids):
-        print("Error crítico: Faltan datos maestros después de intentar obtener IDs.")
-        print("Esto generalmente significa que la función `insert_master_data_if_empty` en database.py no insertó los datos correctamente.")
-        print("Revisa los mensajes de error anteriores de `database.py` para identificar qué tabla falló al insertar.")
-        return None, None, None # Indicar fallo
-
-    # --- Generar Tickets ---
-    print("Generando 30 tickets...")
-    tickets_data = []
-    for i in range(1, 31):
-        numero_ticket = f"SYN-{i:04d}"
-        # Usamos random.choice() solo si las listas NO están vacías (ya verificado arriba)
-        id_cliente = random.choice(cliente_ids)
-        id_tecnico_asignado = random.choice(tecnico_ids + [None]) # Permitir que no tenga técnico asignado
-        id_tipo_tarea = random.choice(tipo_tarea_ids)
-        id_prioridad = random.choice(prioridad_ids)
-        id_estado = random.choice(estado_ids)
-        
-        titulo = f"Ticket Sintético de Prueba #{i}"
-        descripcion = f"Esta es la descripción del ticket sintético número {i}. Se generó automáticamente."
-        tiempo_estimado_horas = round(random.uniform(0.5, 8.0), 2)
-        
-        fecha_creacion = datetime.now() - timedelta(days=random.randint(1, 30))
-        
         fecha_asignacion = None
         if id_tecnico_asignado is not None:
-            fecha_asignacion = fecha_creacion + timedelta(hours=random.randint(1, 24))
-        
+            fecha_asignacion = fecha_creacion + timedelta(hours=rng.uniform(0.1, 24))
+
         fecha_cierre = None
-        if id_estado in estados_finales_ids_actuales: # Comprueba si el estado asignado es final
-            fecha_cierre = fecha_asignacion if fecha_asignacion else fecha_creacion
-            fecha_cierre += timedelta(days=random.randint(0, 7), hours=random.randint(0, 23))
-
-        tickets_data.append({
-            "numero_ticket": numero_ticket, "id_cliente": id_cliente, "id_tecnico_asignado": id_tecnico_asignado,
-            "id_tipo_tarea": id_tipo_tarea, "id_prioridad": id_prioridad, "id_estado": id_estado,
-            "titulo": titulo, "descripcion": descripcion, "fecha_creacion": fecha_creacion,
-            "fecha_asignacion": fecha_asignacion, "fecha_cierre": fecha_cierre,
-            "tiempo_estimado_horas": tiempo_estimado_horas
-        })
-    print("  -> Tickets generados.")
-    return tecnicos_data, clientes_data, tickets_data
-
-def populate_database():
-    """Inserta los datos sintéticos generados en la base de datos."""
-    
+        if id_estado in ids['estados_finales']: # Comprueba si el estado asignado es final
+            fecha_cierre = (fecha_asignacion or fecha_creacion) + timedelta(hours=rng.uniform(0.5, 24 * 7))
+
+        yield (
+            id_ticket, f"SYN-{id_ticket:08d}", id_cliente, id_tecnico_asignado, rng.choice(ids['tipos_tarea']),
+            rng.choice(ids['prioridades']), id_estado, f"Ticket Sintético de Prueba #{id_ticket}",
+            f"Esta es la descripción del ticket sintético número {id_ticket}. Se generó automáticamente.",
+            fecha_creacion.strftime(FORMATO_FECHA),
+            fecha_asignacion.strftime(FORMATO_FECHA) if fecha_asignacion else None,
+            fecha_cierre.strftime(FORMATO_FECHA) if fecha_cierre else None,
+            round(rng.uniform(0.5, 8.0), 2),
+        )
+
+def generate_actividades(ticket, media, ids, rng):
+    """Genera entre 0 y 2*media registros de actividad para un ticket, entre su creación y su cierre."""
+    id_ticket, id_tecnico, fecha_creacion, fecha_cierre = ticket[0], ticket[3], ticket[9], ticket[11]
+    inicio = datetime.strptime(fecha_creacion, FORMATO_FECHA)
+    fin = datetime.strptime(fecha_cierre, FORMATO_FECHA) if fecha_cierre else datetime.now()
+    segundos = max((fin - inicio).total_seconds(), 0)
+    for _ in range(rng.randint(0, 2 * media)):
+        fecha_actividad = inicio + timedelta(seconds=rng.uniform(0, segundos))
+        yield (
+            id_ticket, id_tecnico or rng.choice(ids['tecnicos']), rng.choice(ids['modalidades']),
+            fecha_actividad.strftime("%Y-%m-%d"), round(rng.uniform(0.25, 4.0), 2),
+            rng.choice(TRABAJOS), None if rng.random() < 0.7 else "Pendiente de confirmación por parte del cliente.",
+        )
+
+def obtener_ids_catalogos(cursor):
+    """Devuelve las listas de IDs de cada catálogo, o None si falta algún dato maestro."""
+    consultas = {
+        'tecnicos': "SELECT id_tecnico FROM tecnicos",
+        'clientes': "SELECT id_cliente FROM clientes",
+        'tipos_tarea': "SELECT id_tipo_tarea FROM tipos_tarea",
+        'prioridades': "SELECT id_prioridad FROM prioridades",
+        'estados': "SELECT id_estado FROM estados_ticket",
+        'estados_finales': "SELECT id_estado FROM estados_ticket WHERE es_final = 1",
+        'modalidades': "SELECT id_modalidad FROM modalidades_trabajo",
+    }
+    ids = {}
+    for clave, consulta in consultas.items():
+        ids[clave] = [row[0] for row in cursor.execute(consulta).fetchall()]
+        print(f"  - {clave}: {len(ids[clave])}")
+    if not all(ids[clave] for clave in consultas if clave != 'estados_finales'):
+        print("Error crítico: Faltan datos maestros después de intentar obtener IDs.")
+        print("Esto generalmente significa que la función `insert_master_data_if_empty` en database.py no insertó los datos correctamente.")
+        return None
+    return ids
+
+def insertar_en_lotes(conn, sql, filas, lote):
+    """Inserta las filas de un iterable con executemany, confirmando cada `lote` filas."""
+    total = 0
+    while True:
+        bloque = list(islice(filas, lote))
+        if not bloque:
+            return total
+        db.retry_transaction(conn, lambda conn: conn.executemany(sql, bloque), 'populate_database')
+        total += len(bloque)
+
+def populate_database(tecnicos=10, clientes=20, tickets=30, actividades_por_ticket=2, dias=30, sesgo=0.0,
+                      semilla=None, lote=LOTE_POR_DEFECTO, reconstruir_indices=False):
+    """Genera e inserta datos sintéticos en streaming, por lotes, con memoria acotada."""
+
     print("--- Iniciando proceso de población ---")
     # Paso 1: Inicializar la Base de Datos. Esto crea el archivo DB y las tablas maestras.
     initialization_successful = db.initialize_database()
@@ -154,70 +132,78 @@ def populate_database():
         print("Error fatal: Falló la inicialización de la base de datos. No se puede continuar con la población.")
         return
 
-    # Paso 2: Generar Datos Sintéticos. Esta función ahora también verifica si los IDs maestros están disponibles.
-    generated_data = generate_synthetic_data()
-
-    # Si generate_synthetic_data devolvió None, significa que faltan datos maestros o hubo un error.
-    if generated_data is None or any(d is None for d in generated_data):
-        print("Error fatal: No se pudieron generar datos sintéticos debido a la falta de datos maestros o a un error previo.")
-        print("Revisa los mensajes de error anteriores.")
-        return
-        
-    tecnicos_data, clientes_data, tickets_data = generated_data
-
-    # Paso 3: Insertar Datos en la DB
+    rng = random.Random(semilla)
     conn = db.get_db_connection()
     if not conn:
         print("Error fatal: No se pudo obtener la conexión a la base de datos para la inserción. Terminando script.")
         return
 
     try:
-        cursor = conn.cursor()
-
-        # Insertar Técnicos
-        print("Insertando técnicos...")
-        for tecnico in tecnicos_data:
-            try:
-                cursor.execute('''
-                    INSERT INTO tecnicos (nombre, apellido, email, login, password_hash, telefono, especialidad, fecha_ingreso)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (tecnico['nombre'], tecnico['apellido'], tecnico['email'], tecnico['login'], tecnico['password_hash'], tecnico['telefono'], tecnico['especialidad'], tecnico['fecha_ingreso']))
-            except sqlite3.IntegrityError:
-                print(f"Advertencia: Técnico {tecnico['email']} ya existe, omitiendo inserción.")
-            except sqlite3.Error as e:
-                print(f"Error insertando técnico {tecnico['email']}: {e}")
-        print("  -> Técnicos insertados.")
-
-        # Insertar Clientes
-        print("Insertando clientes...")
-        for cliente in clientes_data:
-            try:
-                cursor.execute('''
-                    INSERT INTO clientes (nombre_empresa, contacto_principal, email, telefono, direccion, ciudad, pais)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (cliente['nombre_empresa'], cliente['contacto_principal'], cliente['email'], cliente['telefono'], cliente['direccion'], cliente['ciudad'], cliente['pais']))
-            except sqlite3.Error as e:
-                print(f"Error insertando cliente {cliente['nombre_empresa']}: {e}")
-        print("  -> Clientes insertados.")
-
-        # Insertar Tickets
-        print("Insertando tickets...")
-        for ticket in tickets_data:
-            try:
-                cursor.execute('''
-                    INSERT INTO tickets (numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, fecha_creacion, fecha_asignacion, fecha_cierre, tiempo_estimado_horas)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    ticket['numero_ticket'], ticket['id_cliente'], ticket['id_tecnico_asignado'], ticket['id_tipo_tarea'], ticket['id_prioridad'], ticket['id_estado'],
-                    ticket['titulo'], ticket['descripcion'], ticket['fecha_creacion'], ticket['fecha_asignacion'], ticket['fecha_cierre'], ticket['tiempo_estimado_horas']
-                ))
-            except sqlite3.IntegrityError:
-                print(f"Advertencia: Ticket con número {ticket['numero_ticket']} ya existe, omitiendo inserción.")
-            except sqlite3.Error as e:
-                print(f"Error insertando ticket {ticket['numero_ticket']}: {e}")
-        print("  -> Tickets insertados.")
-
-        conn.commit()
+        # Búsqueda, totales, resúmenes y contadores no se mantienen fila a fila durante la carga:
+        # se recalculan una vez al final, también si la carga falla a medias.
+        db.suspend_derived_triggers(conn)
+        indices_borrados = False
+        try:
+            cursor = conn.cursor()
+            inicio_tecnicos = cursor.execute("SELECT COALESCE(MAX(id_tecnico), 0) + 1 FROM tecnicos").fetchone()[0]
+            inicio_clientes = cursor.execute("SELECT COALESCE(MAX(id_cliente), 0) + 1 FROM clientes").fetchone()[0]
+
+            print(f"Insertando {tecnicos} técnicos...")
+            insertar_en_lotes(conn, '''
+                INSERT INTO tecnicos (nombre, apellido, email, login, password_hash, telefono, especialidad, fecha_ingreso)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', generate_tecnicos(tecnicos, rng, inicio_tecnicos), lote)
+
+            print(f"Insertando {clientes} clientes...")
+            insertar_en_lotes(conn, '''
+                INSERT INTO clientes (nombre_empresa, contacto_principal, email, telefono, direccion, ciudad, pais)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', generate_clientes(clientes, rng, inicio_clientes), lote)
+
+            print("Obteniendo IDs de catálogos...")
+            ids = obtener_ids_catalogos(cursor)
+            if ids is None:
+                return
+
+            def indices(conn, crear):
+                for nombre, sql in bulk_import.ticket_indexes():
+                    conn.execute(sql if crear else f"DROP INDEX IF EXISTS {nombre}")
+
+            if reconstruir_indices:
+                db.retry_transaction(conn, lambda conn: indices(conn, False), 'populate_database')
+                indices_borrados = True
+
+            print(f"Insertando {tickets} tickets (~{actividades_por_ticket} registros de actividad por ticket)...")
+            primer_id = cursor.execute("SELECT COALESCE(MAX(id_ticket), 0) + 1 FROM tickets").fetchone()[0]
+            generador = generate_tickets(tickets, ids, rng, primer_id, dias, sesgo)
+            total_tickets = total_actividades = 0
+            while True:
+                bloque = list(islice(generador, lote))
+                if not bloque:
+                    break
+                actividades = [a for ticket in bloque for a in generate_actividades(ticket, actividades_por_ticket, ids, rng)]
+                def insertar(conn):
+                    conn.executemany('''
+                        INSERT INTO tickets (id_ticket, numero_ticket, id_cliente, id_tecnico_asignado, id_tipo_tarea, id_prioridad, id_estado, titulo, descripcion, fecha_creacion, fecha_asignacion, fecha_cierre, tiempo_estimado_horas)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', bloque)
+                    conn.executemany('''
+                        INSERT INTO registros_actividad (id_ticket, id_tecnico, id_modalidad, fecha_actividad, tiempo_dedicado_horas, descripcion_trabajo, observaciones)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', actividades)
+                db.retry_transaction(conn, insertar, 'populate_database')
+                total_tickets += len(bloque)
+                total_actividades += len(actividades)
+                print(f"  -> {total_tickets} tickets, {total_actividades} registros de actividad")
+        finally:
+            if indices_borrados: # También tras un fallo: no dejar la tabla sin índices
+                print("Recreando índices de tickets...")
+                db.retry_transaction(conn, lambda conn: indices(conn, True), 'populate_database')
+            print("Recalculando búsqueda, totales, resúmenes y contadores...")
+            restaurado = db.restore_derived_data(conn, ('tecnicos', 'clientes', 'tickets', 'registros_actividad'))
+        if not restaurado:
+            return
+        db.retry_transaction(conn, lambda conn: conn.execute("ANALYZE"), 'populate_database')
         print("\n--- ¡Datos sintéticos insertados correctamente! ---")
 
     except sqlite3.Error as e:
@@ -227,5 +213,23 @@ def populate_database():
         if conn:
             conn.close()
 
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos para el sistema de tickets.")
+    parser.add_argument('--db', default=db.DATABASE_NAME, help="Archivo de base de datos (por defecto: %(default)s)")
+    parser.add_argument('--tecnicos', type=int, default=10)
+    parser.add_argument('--clientes', type=int, default=20)
+    parser.add_argument('--tickets', type=int, default=30)
+    parser.add_argument('--actividades', type=int, default=2, help="Media de registros de actividad por ticket.")
+    parser.add_argument('--dias', type=int, default=30, help="Los tickets se reparten en los últimos N días.")
+    parser.add_argument('--sesgo', type=float, default=0.0, help="Exponente Zipf del reparto entre clientes y técnicos (0 = uniforme).")
+    parser.add_argument('--semilla', type=int, help="Semilla para obtener siempre los mismos datos.")
+    parser.add_argument('--lote', type=int, default=LOTE_POR_DEFECTO, help="Filas por transacción.")
+    parser.add_argument('--reconstruir-indices', action='store_true', help="Elimina los índices de tickets durante la carga y los recrea al final.")
+    args = parser.parse_args()
+
+    db.DATABASE_NAME = args.db
+    populate_database(args.tecnicos, args.clientes, args.tickets, args.actividades, args.dias, args.sesgo,
+                      args.semilla, args.lote, args.reconstruir_indices)
+
 if __name__ == "__main__":
-    populate_database()
\ No newline at end of file
+    main()
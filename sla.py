@@ -0,0 +1,238 @@
+"""Métricas de SLA: tiempo hasta la asignación y hasta la resolución de los tickets.
+
+Las fechas de `tickets` se leen por bloques como segundos (strftime('%s')) y se pasan a arrays
+datetime64 de NumPy; los percentiles y las tasas de incumplimiento por prioridad, cliente y técnico
+se calculan con operaciones vectorizadas sobre esos arrays, sin recorrer los tickets en Python.
+
+Uso desde código:
+    metricas = sla.compute_sla_metrics()
+    metricas['prioridad']  # lista de dicts, una fila por prioridad
+"""
+import itertools
+from datetime import datetime, timezone
+
+import numpy as np
+
+import database as db
+
+CHUNK_SIZE = 100000 # Filas por fetchmany al cargar los tickets
+
+# Plazo de resolución (horas) por nivel de prioridad, según la descripción de cada una en `prioridades`
+OBJETIVOS_RESOLUCION_HORAS = {
+    1: 4,    # Crítica: requiere atención inmediata
+    2: 8,    # Alta: debe resolverse en el día
+    3: 72,   # Media: resolución en 2-3 días
+    4: 168,  # Baja: puede esperar hasta una semana
+    5: None, # Muy baja: sin urgencia específica
+}
+
+PERCENTILES = (50, 90, 95)
+
+# Dimensión -> (columna de tickets, consulta de nombres)
+DIMENSIONES = {
+    'prioridad': ('id_prioridad', "SELECT id_prioridad, nombre FROM prioridades"),
+    'cliente': ('id_cliente', "SELECT id_cliente, nombre_empresa FROM clientes"),
+    'tecnico': ('id_tecnico_asignado', "SELECT id_tecnico, nombre || ' ' || apellido FROM tecnicos"),
+}
+
+# Tablas de las que dependen las métricas (para las claves de caché de app.py)
+SLA_TABLES = ('tickets', 'prioridades', 'clientes', 'tecnicos')
+
+_HORA = np.timedelta64(1, 'h')
+
+_LOAD_COLUMNS = ('id_prioridad', 'id_cliente', 'id_tecnico_asignado', 'creacion', 'asignacion', 'cierre')
+
+# Sin JOIN con prioridades: el nivel se obtiene después con una tabla de traducción en NumPy
+_LOAD_QUERY = f"""
+    SELECT COALESCE(tk.id_prioridad, 0), COALESCE(tk.id_cliente, 0), COALESCE(tk.id_tecnico_asignado, 0),
+           {db.epoch_sql('tk.fecha_creacion')}, {db.epoch_sql('tk.fecha_asignacion')}, {db.epoch_sql('tk.fecha_cierre')}
+    FROM tickets tk
+"""
+
+def load_ticket_times(filters=None, chunk_size=CHUNK_SIZE):
+    """Carga los tickets como arrays: ids y nivel de prioridad en int64 y las fechas en datetime64[s] (NaT si son NULL).
+
+    `filters` admite los mismos filtros que el listado (db.ticket_filter_clauses), p. ej. fecha_desde.
+    Devuelve None si hay un error.
+    """
+    conn = db.get_db_connection()
+    if not conn: return None
+    try:
+        clauses, params = db.ticket_filter_clauses(filters)
+        sql = _LOAD_QUERY + (f" WHERE {' AND '.join(clauses)}" if clauses else "")
+        cursor = conn.execute(sql, params)
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            # fromiter sobre las filas aplanadas evita que NumPy inspeccione cada tupla
+            flat = itertools.chain.from_iterable(rows)
+            chunks.append(np.fromiter(flat, dtype=np.int64, count=len(rows) * len(_LOAD_COLUMNS)).reshape(-1, len(_LOAD_COLUMNS)))
+        data = np.concatenate(chunks) if chunks else np.empty((0, len(_LOAD_COLUMNS)), dtype=np.int64)
+        niveles = dict(conn.execute("SELECT id_prioridad, nivel FROM prioridades").fetchall())
+    except db.sqlite3.Error as e:
+        print(f"Error al cargar las fechas de los tickets: {e}")
+        return None
+    finally:
+        conn.close()
+    times = {name: data[:, i] for i, name in enumerate(_LOAD_COLUMNS)}
+    for name in ('creacion', 'asignacion', 'cierre'):
+        times[name] = times[name].astype('datetime64[s]')
+    lookup = np.zeros(max(niveles, default=0) + 1, dtype=np.int64) # id_prioridad -> nivel (0 si no existe)
+    for id_prioridad, nivel in niveles.items():
+        lookup[id_prioridad] = nivel or 0
+    ids = times['id_prioridad']
+    times['nivel'] = np.where(ids < len(lookup), lookup[np.minimum(ids, len(lookup) - 1)], 0)
+    return times
+
+def _objetivos(niveles):
+    """Plazo en horas de cada ticket según su nivel de prioridad (NaN si no tiene plazo)."""
+    table = np.full(max(max(OBJETIVOS_RESOLUCION_HORAS), int(niveles.max(initial=0))) + 1, np.nan)
+    for nivel, horas in OBJETIVOS_RESOLUCION_HORAS.items():
+        if horas is not None:
+            table[nivel] = horas
+    return table[niveles]
+
+def group_percentiles(groups, values, n_groups, order=None, percentiles=PERCENTILES):
+    """Percentiles (interpolación lineal, como np.percentile) de `values` por grupo, ignorando NaN.
+
+    `groups` son índices 0..n_groups-1 y `order` un np.argsort(values) ya calculado (se reutiliza entre
+    dimensiones: reordenar por grupo con un argsort estable de enteros es mucho más barato que volver
+    a ordenar los valores). Devuelve un array (len(percentiles), n_groups) con NaN en los grupos sin valores.
+    """
+    if order is None:
+        order = np.argsort(values)
+    order = order[~np.isnan(values[order])]
+    order = order[np.argsort(groups[order], kind='stable')]
+    ordered = values[order]
+    counts = np.bincount(groups[order], minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    result = np.full((len(percentiles), n_groups), np.nan)
+    has_values = counts > 0
+    if not has_values.any():
+        return result
+    starts, counts = starts[has_values], counts[has_values]
+    for i, q in enumerate(percentiles):
+        position = starts + (counts - 1) * (q / 100)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, starts + counts - 1)
+        result[i, has_values] = ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+    return result
+
+def compute_ticket_metrics(times, ahora=None):
+    """Duraciones y banderas de incumplimiento por ticket, todas como arrays."""
+    ahora = np.datetime64(ahora or datetime.now(timezone.utc).replace(tzinfo=None), 's')
+    objetivo = _objetivos(times['nivel'])
+    asignacion = (times['asignacion'] - times['creacion']) / _HORA # NaN si falta alguna fecha
+    resolucion = (times['cierre'] - times['creacion']) / _HORA
+    cerrado = ~np.isnat(times['cierre'])
+    edad = (ahora - times['creacion']) / _HORA
+    con_objetivo = ~np.isnan(objetivo)
+    # Las comparaciones con NaN son False: sin plazo no hay incumplimiento
+    incumplido = cerrado & (resolucion > objetivo)
+    vencido = ~cerrado & (edad > objetivo)
+    return {
+        'asignacion_h': asignacion, 'resolucion_h': resolucion, 'cerrado': cerrado,
+        'con_objetivo': con_objetivo, 'incumplido': incumplido, 'vencido': vencido,
+        # Orden de las duraciones, compartido por todas las agrupaciones
+        'orden_asignacion': np.argsort(asignacion), 'orden_resolucion': np.argsort(resolucion),
+    }
+
+def _group_index(keys):
+    """(ids distintos, índice de grupo de cada fila, filas por grupo), como np.unique(..., return_inverse).
+
+    Las claves son ids no negativos: con bincount y una tabla de traducción no hace falta ordenar.
+    El índice sale como uint16 cuando cabe, porque el argsort estable de enteros de 16 bits es un radix sort.
+    """
+    if len(keys) == 0 or keys.min() < 0:
+        ids, groups, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    else:
+        counts = np.bincount(keys)
+        ids = np.flatnonzero(counts)
+        lookup = np.zeros(len(counts), dtype=np.int64)
+        lookup[ids] = np.arange(len(ids))
+        groups, counts = lookup[keys], counts[ids]
+    if len(ids) <= np.iinfo(np.uint16).max:
+        groups = groups.astype(np.uint16)
+    return ids, groups, counts
+
+def summarize_by(keys, metrics, names=None):
+    """Una fila por valor de `keys` con recuentos, percentiles (horas) y tasa de incumplimiento."""
+    ids, groups, tickets = _group_index(keys)
+    n_groups = len(ids)
+    def total(flags):
+        return np.bincount(groups, weights=flags, minlength=n_groups).astype(np.int64)
+    cerrados = total(metrics['cerrado'])
+    incumplidos = total(metrics['incumplido'])
+    vencidos = total(metrics['vencido'])
+    evaluados = total(metrics['cerrado'] & metrics['con_objetivo']) + vencidos # Tickets con resultado de SLA conocido
+    asignacion = group_percentiles(groups, metrics['asignacion_h'], n_groups, metrics['orden_asignacion'])
+    resolucion = group_percentiles(groups, metrics['resolucion_h'], n_groups, metrics['orden_resolucion'])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tasa = (incumplidos + vencidos) / evaluados
+
+    columns = {
+        'id': ids, 'tickets': tickets, 'cerrados': cerrados,
+        'incumplidos': incumplidos, 'abiertos_vencidos': vencidos, 'tasa_incumplimiento': tasa,
+    }
+    for i, q in enumerate(PERCENTILES):
+        columns[f'asignacion_p{q}_h'] = asignacion[i]
+    for i, q in enumerate(PERCENTILES):
+        columns[f'resolucion_p{q}_h'] = resolucion[i]
+    columns = {name: values.tolist() for name, values in columns.items()}
+    rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    for row in rows:
+        row['nombre'] = (names or {}).get(row['id'], 'Sin asignar' if row['id'] == 0 else f"#{row['id']}")
+        for name, value in row.items():
+            if isinstance(value, float) and np.isnan(value):
+                row[name] = None
+    return rows
+
+def _names(query):
+    conn = db.get_db_connection()
+    if not conn: return {}
+    try:
+        return {row[0]: row[1] for row in conn.execute(query)}
+    except db.sqlite3.Error as e:
+        print(f"Error al obtener nombres para las métricas de SLA: {e}")
+        return {}
+    finally:
+        conn.close()
+
+def compute_sla_metrics(filters=None, ahora=None, chunk_size=CHUNK_SIZE):
+    """Métricas de SLA agrupadas por prioridad, cliente y técnico, más el total.
+
+    Devuelve {'tickets', 'referencia', 'global', 'prioridad', 'cliente', 'tecnico'}: cada grupo es una
+    lista de dicts ordenada por número de tickets. `ahora` es la hora UTC (como CURRENT_TIMESTAMP) con
+    la que se decide si un ticket abierto ya superó su plazo. None si no se pudieron cargar los tickets.
+    """
+    times = load_ticket_times(filters, chunk_size)
+    if times is None:
+        return None
+    ahora = ahora or datetime.now(timezone.utc).replace(tzinfo=None)
+    metrics = compute_ticket_metrics(times, ahora)
+    result = {
+        'tickets': len(times['creacion']),
+        'referencia': ahora.isoformat(sep=' ', timespec='seconds'),
+        'global': summarize_by(np.zeros(len(times['creacion']), dtype=np.int64), metrics, {0: 'Total'}),
+    }
+    for dimension, (column, names_query) in DIMENSIONES.items():
+        rows = summarize_by(times[column], metrics, _names(names_query))
+        result[dimension] = sorted(rows, key=lambda row: row['tickets'], reverse=True)
+    objetivos = _prioridad_objetivos()
+    for row in result['prioridad']:
+        row['objetivo_h'] = objetivos.get(row['id'])
+    return result
+
+def _prioridad_objetivos():
+    """{id_prioridad: plazo en horas} a partir del nivel de cada prioridad."""
+    conn = db.get_db_connection()
+    if not conn: return {}
+    try:
+        return {row[0]: OBJETIVOS_RESOLUCION_HORAS.get(row[1]) for row in conn.execute("SELECT id_prioridad, nivel FROM prioridades")}
+    except db.sqlite3.Error as e:
+        print(f"Error al obtener los plazos de las prioridades: {e}")
+        return {}
+    finally:
+        conn.close()
@@ -124,19 +124,19 @@ CREATE TABLE registros_actividad (
 -- ÍNDICES PARA OPTIMIZACIÓN
 -- =====================================================
 
--- Índices en claves foráneas
-CREATE INDEX idx_tickets_cliente ON tickets(id_cliente);
-CREATE INDEX idx_tickets_tecnico ON tickets(id_tecnico_asignado);
+-- Índices compuestos (filtro + orden del listado por fecha de creación).
+-- Cubren también las claves foráneas: la primera columna sirve de índice simple.
+CREATE INDEX idx_tickets_cliente_fecha ON tickets(id_cliente, fecha_creacion);
+CREATE INDEX idx_tickets_tecnico_fecha ON tickets(id_tecnico_asignado, fecha_creacion);
+CREATE INDEX idx_tickets_estado_fecha ON tickets(id_estado, fecha_creacion);
 CREATE INDEX idx_tickets_tipo_tarea ON tickets(id_tipo_tarea);
-CREATE INDEX idx_tickets_estado ON tickets(id_estado);
-CREATE INDEX idx_registros_ticket ON registros_actividad(id_ticket);
-CREATE INDEX idx_registros_tecnico ON registros_actividad(id_tecnico);
+CREATE INDEX idx_registros_ticket_fecha ON registros_actividad(id_ticket, fecha_actividad);
+CREATE INDEX idx_registros_tecnico_fecha ON registros_actividad(id_tecnico, fecha_actividad);
 
 -- Índices en campos de búsqueda frecuente
-CREATE INDEX idx_tickets_numero ON tickets(numero_ticket);
-CREATEINDEX idx_tickets_fecha_creacion ON tickets(fecha_creacion);
+-- (numero_ticket y login ya tienen el índice automático de su restricción UNIQUE)
+CREATE INDEX idx_tickets_fecha_creacion ON tickets(fecha_creacion);
 CREATE INDEX idx_registros_fecha ON registros_actividad(fecha_actividad);
-CREATE INDEX idx_tecnicos_login ON tecnicos(login);
 CREATE INDEX idx_clientes_nombre ON clientes(nombre_empresa);
 
 -- =====================================================
@@ -158,31 +158,69 @@ ALTER TABLE tickets ADD CONSTRAINT chk_fechas_logicas
 -- TRIGGERS PARA AUDITORÍA
 -- =====================================================
 
--- SQLite no tiene el concepto de funciones almacenadas como PostgreSQL.
--- Los triggers se definen directamente.
+-- Historial de cambios: una fila por UPDATE que modifica algún campo, con los campos cambiados
+-- en JSON {"campo": [antes, después]}. Solo se inserta (nunca se actualiza la fila auditada):
+-- updated_at lo ponen las propias sentencias UPDATE de database.py.
+CREATE TABLE historial_cambios (
+    id_cambio INTEGER PRIMARY KEY,
+    tabla VARCHAR(50) NOT NULL,
+    id_fila INTEGER NOT NULL,
+    fecha DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    cambios TEXT NOT NULL
+);
+
+CREATE INDEX idx_historial_fila ON historial_cambios(tabla, id_fila, id_cambio);
 
--- Trigger para actualizar el campo 'updated_at' en la tabla 'tecnicos'
-CREATE TRIGGER trg_tecnicos_updated
-AFTER UPDATE ON tecnicos
-FOR EACH ROW
+CREATE TRIGGER trg_historial_tickets AFTER UPDATE ON tickets
+WHEN OLD.numero_ticket IS NOT NEW.numero_ticket OR OLD.id_cliente IS NOT NEW.id_cliente OR OLD.id_tecnico_asignado IS NOT NEW.id_tecnico_asignado OR OLD.id_tipo_tarea IS NOT NEW.id_tipo_tarea OR OLD.id_prioridad IS NOT NEW.id_prioridad OR OLD.id_estado IS NOT NEW.id_estado OR OLD.titulo IS NOT NEW.titulo OR OLD.descripcion IS NOT NEW.descripcion OR OLD.fecha_asignacion IS NOT NEW.fecha_asignacion OR OLD.fecha_cierre IS NOT NEW.fecha_cierre OR OLD.tiempo_estimado_horas IS NOT NEW.tiempo_estimado_horas
 BEGIN
-    UPDATE tecnicos SET updated_at = CURRENT_TIMESTAMP WHERE id_tecnico = OLD.id_tecnico;
+    INSERT INTO historial_cambios (tabla, id_fila, cambios)
+    SELECT 'tickets', NEW.id_ticket, json_group_object(campo, json_array(antes, despues)) FROM (
+            SELECT 'numero_ticket' AS campo, OLD.numero_ticket AS antes, NEW.numero_ticket AS despues WHERE OLD.numero_ticket IS NOT NEW.numero_ticket
+            UNION ALL SELECT 'id_cliente' AS campo, OLD.id_cliente AS antes, NEW.id_cliente AS despues WHERE OLD.id_cliente IS NOT NEW.id_cliente
+            UNION ALL SELECT 'id_tecnico_asignado' AS campo, OLD.id_tecnico_asignado AS antes, NEW.id_tecnico_asignado AS despues WHERE OLD.id_tecnico_asignado IS NOT NEW.id_tecnico_asignado
+            UNION ALL SELECT 'id_tipo_tarea' AS campo, OLD.id_tipo_tarea AS antes, NEW.id_tipo_tarea AS despues WHERE OLD.id_tipo_tarea IS NOT NEW.id_tipo_tarea
+            UNION ALL SELECT 'id_prioridad' AS campo, OLD.id_prioridad AS antes, NEW.id_prioridad AS despues WHERE OLD.id_prioridad IS NOT NEW.id_prioridad
+            UNION ALL SELECT 'id_estado' AS campo, OLD.id_estado AS antes, NEW.id_estado AS despues WHERE OLD.id_estado IS NOT NEW.id_estado
+            UNION ALL SELECT 'titulo' AS campo, OLD.titulo AS antes, NEW.titulo AS despues WHERE OLD.titulo IS NOT NEW.titulo
+            UNION ALL SELECT 'descripcion' AS campo, OLD.descripcion AS antes, NEW.descripcion AS despues WHERE OLD.descripcion IS NOT NEW.descripcion
+            UNION ALL SELECT 'fecha_asignacion' AS campo, OLD.fecha_asignacion AS antes, NEW.fecha_asignacion AS despues WHERE OLD.fecha_asignacion IS NOT NEW.fecha_asignacion
+            UNION ALL SELECT 'fecha_cierre' AS campo, OLD.fecha_cierre AS antes, NEW.fecha_cierre AS despues WHERE OLD.fecha_cierre IS NOT NEW.fecha_cierre
+            UNION ALL SELECT 'tiempo_estimado_horas' AS campo, OLD.tiempo_estimado_horas AS antes, NEW.tiempo_estimado_horas AS despues WHERE OLD.tiempo_estimado_horas IS NOT NEW.tiempo_estimado_horas
+    );
 END;
 
--- Trigger para actualizar el campo 'updated_at' en la tabla 'clientes'
-CREATE TRIGGER trg_clientes_updated
-AFTER UPDATE ON clientes
-FOR EACH ROW
+CREATE TRIGGER trg_historial_tecnicos AFTER UPDATE ON tecnicos
+WHEN OLD.nombre IS NOT NEW.nombre OR OLD.apellido IS NOT NEW.apellido OR OLD.email IS NOT NEW.email OR OLD.login IS NOT NEW.login OR OLD.password_hash IS NOT NEW.password_hash OR OLD.telefono IS NOT NEW.telefono OR OLD.especialidad IS NOT NEW.especialidad OR OLD.fecha_ingreso IS NOT NEW.fecha_ingreso OR OLD.activo IS NOT NEW.activo
 BEGIN
-    UPDATE clientes SET updated_at = CURRENT_TIMESTAMP WHERE id_cliente = OLD.id_cliente;
+    INSERT INTO historial_cambios (tabla, id_fila, cambios)
+    SELECT 'tecnicos', NEW.id_tecnico, json_group_object(campo, json_array(antes, despues)) FROM (
+            SELECT 'nombre' AS campo, OLD.nombre AS antes, NEW.nombre AS despues WHERE OLD.nombre IS NOT NEW.nombre
+            UNION ALL SELECT 'apellido' AS campo, OLD.apellido AS antes, NEW.apellido AS despues WHERE OLD.apellido IS NOT NEW.apellido
+            UNION ALL SELECT 'email' AS campo, OLD.email AS antes, NEW.email AS despues WHERE OLD.email IS NOT NEW.email
+            UNION ALL SELECT 'login' AS campo, OLD.login AS antes, NEW.login AS despues WHERE OLD.login IS NOT NEW.login
+            UNION ALL SELECT 'password_hash' AS campo, '***' AS antes, '***' AS despues WHERE OLD.password_hash IS NOT NEW.password_hash
+            UNION ALL SELECT 'telefono' AS campo, OLD.telefono AS antes, NEW.telefono AS despues WHERE OLD.telefono IS NOT NEW.telefono
+            UNION ALL SELECT 'especialidad' AS campo, OLD.especialidad AS antes, NEW.especialidad AS despues WHERE OLD.especialidad IS NOT NEW.especialidad
+            UNION ALL SELECT 'fecha_ingreso' AS campo, OLD.fecha_ingreso AS antes, NEW.fecha_ingreso AS despues WHERE OLD.fecha_ingreso IS NOT NEW.fecha_ingreso
+            UNION ALL SELECT 'activo' AS campo, OLD.activo AS antes, NEW.activo AS despues WHERE OLD.activo IS NOT NEW.activo
+    );
 END;
 
--- Trigger para actualizar el campo 'updated_at' en la tabla 'tickets'
-CREATE TRIGGER trg_tickets_updated
-AFTER UPDATE ON tickets
-FOR EACH ROW
+CREATE TRIGGER trg_historial_clientes AFTER UPDATE ON clientes
+WHEN OLD.nombre_empresa IS NOT NEW.nombre_empresa OR OLD.contacto_principal IS NOT NEW.contacto_principal OR OLD.email IS NOT NEW.email OR OLD.telefono IS NOT NEW.telefono OR OLD.direccion IS NOT NEW.direccion OR OLD.ciudad IS NOT NEW.ciudad OR OLD.pais IS NOT NEW.pais OR OLD.activo IS NOT NEW.activo
 BEGIN
-    UPDATE tickets SET updated_at = CURRENT_TIMESTAMP WHERE id_ticket = OLD.id_ticket;
+    INSERT INTO historial_cambios (tabla, id_fila, cambios)
+    SELECT 'clientes', NEW.id_cliente, json_group_object(campo, json_array(antes, despues)) FROM (
+            SELECT 'nombre_empresa' AS campo, OLD.nombre_empresa AS antes, NEW.nombre_empresa AS despues WHERE OLD.nombre_empresa IS NOT NEW.nombre_empresa
+            UNION ALL SELECT 'contacto_principal' AS campo, OLD.contacto_principal AS antes, NEW.contacto_principal AS despues WHERE OLD.contacto_principal IS NOT NEW.contacto_principal
+            UNION ALL SELECT 'email' AS campo, OLD.email AS antes, NEW.email AS despues WHERE OLD.email IS NOT NEW.email
+            UNION ALL SELECT 'telefono' AS campo, OLD.telefono AS antes, NEW.telefono AS despues WHERE OLD.telefono IS NOT NEW.telefono
+            UNION ALL SELECT 'direccion' AS campo, OLD.direccion AS antes, NEW.direccion AS despues WHERE OLD.direccion IS NOT NEW.direccion
+            UNION ALL SELECT 'ciudad' AS campo, OLD.ciudad AS antes, NEW.ciudad AS despues WHERE OLD.ciudad IS NOT NEW.ciudad
+            UNION ALL SELECT 'pais' AS campo, OLD.pais AS antes, NEW.pais AS despues WHERE OLD.pais IS NOT NEW.pais
+            UNION ALL SELECT 'activo' AS campo, OLD.activo AS antes, NEW.activo AS despues WHERE OLD.activo IS NOT NEW.activo
+    );
 END;
 
 
@@ -727,16 +765,24 @@ Esse accusamus at sequi. Autem ex quidem.'),
 -- CONSULTAS DE EJEMPLO PARA VERIFICAR NORMALIZACIÓN
 -- =====================================================
 
+-- Las horas se agregan por ticket antes de unir: unir tickets con registros_actividad directamente
+-- repite cada ticket una vez por registro e infla COUNT(tk.id_ticket).
+-- La aplicación (database.py, migración 7) sustituye estas vistas por otras con las mismas columnas
+-- que leen de resumen_tecnico / resumen_cliente / resumen_cliente_tipo, mantenidas por triggers.
+
 -- 1. Vista resumen de tickets por técnico
 CREATE VIEW vista_tickets_tecnico AS
 SELECT
     t.nombre || ' ' || t.apellido as tecnico,
     COUNT(tk.id_ticket) as total_tickets,
-    AVG(ra.tiempo_dedicado_horas) as promedio_horas,
-    SUM(ra.tiempo_dedicado_horas) as total_horas
+    SUM(ra.horas) / NULLIF(SUM(ra.registros), 0) as promedio_horas,
+    COALESCE(SUM(ra.horas), 0) as total_horas
 FROM tecnicos t
 LEFT JOIN tickets tk ON t.id_tecnico = tk.id_tecnico_asignado
-LEFT JOIN registros_actividad ra ON tk.id_ticket = ra.id_ticket
+LEFT JOIN (
+    SELECT id_ticket, SUM(tiempo_dedicado_horas) as horas, COUNT(*) as registros
+    FROM registros_actividad GROUP BY id_ticket
+) ra ON tk.id_ticket = ra.id_ticket
 GROUP BY t.id_tecnico, t.nombre, t.apellido;
 
 -- 2. Vista resumen por cliente
@@ -744,13 +790,17 @@ CREATE VIEW vista_resumen_cliente AS
 SELECT
     c.nombre_empresa,
     COUNT(tk.id_ticket) as total_tickets,
-    AVG(ra.tiempo_dedicado_horas) as promedio_horas_ticket,
-    tt.nombre as tipo_tarea_mas_frecuente
+    SUM(ra.horas) / NULLIF(COUNT(tk.id_ticket), 0) as promedio_horas_ticket,
+    (SELECT tt.nombre FROM tickets t2 JOIN tipos_tarea tt ON tt.id_tipo_tarea = t2.id_tipo_tarea
+     WHERE t2.id_cliente = c.id_cliente
+     GROUP BY tt.id_tipo_tarea, tt.nombre ORDER BY COUNT(*) DESC, tt.nombre LIMIT 1) as tipo_tarea_mas_frecuente
 FROM clientes c
 LEFT JOIN tickets tk ON c.id_cliente = tk.id_cliente
-LEFT JOIN registros_actividad ra ON tk.id_ticket = ra.id_ticket
-LEFT JOIN tipos_tarea tt ON tk.id_tipo_tarea = tt.id_tipo_tarea
-GROUP BY c.id_cliente, c.nombre_empresa, tt.nombre;
+LEFT JOIN (
+    SELECT id_ticket, SUM(tiempo_dedicado_horas) as horas
+    FROM registros_actividad GROUP BY id_ticket
+) ra ON tk.id_ticket = ra.id_ticket
+GROUP BY c.id_cliente, c.nombre_empresa;
 
 -- 3. Consulta de verificación de integridad referencial
 SELECT 'Verificación completada - Base de datos normalizada correctamente' as resultado;